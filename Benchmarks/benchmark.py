@@ -0,0 +1,173 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+from Benchmarks.synthetic import generate_universe
+from EarningsPairs.earningspairs import EarningsPairs
+from FilingStore.filingstore import FilingStore, write_store
+from Scraper.returns import csv_columns
+from Scraper.scraper import StockScraper
+
+
+
+class Stage:
+    '''
+    Times one stage of the pipeline. The stage can be entered several times, Ex: once per ticker, and the totals are reported.
+    '''
+    def __init__(self, name: str, unit: str, track_memory: bool = True) -> None:
+        self.name = name
+        self.unit = unit
+        self.track_memory = track_memory
+        self.seconds = 0.0
+        self.items = 0
+        self.peak_bytes = 0
+
+    '''-----------------------------------'''
+    def __enter__(self):
+        if self.track_memory:
+            tracemalloc.reset_peak()
+            self.start_bytes = tracemalloc.get_traced_memory()[0]
+        self.start = time.perf_counter()
+        return self
+
+    '''-----------------------------------'''
+    def __exit__(self, *exc) -> None:
+        self.seconds += time.perf_counter() - self.start
+        if self.track_memory:
+            # Memory allocated by the stage on top of what was already in use when it started.
+            self.peak_bytes = max(self.peak_bytes, tracemalloc.get_traced_memory()[1] - self.start_bytes)
+
+    '''-----------------------------------'''
+    def report(self) -> dict:
+        return {"stage": self.name,
+                "seconds": round(self.seconds, 6),
+                "peak_bytes": self.peak_bytes if self.track_memory else None,
+                "items": self.items,
+                "unit": self.unit,
+                "throughput": round(self.items / self.seconds, 2) if self.seconds > 0 else None}
+
+
+
+'''----------------------------------- Pipeline -----------------------------------'''
+'''-----------------------------------'''
+def run_pipeline(num_tickers: int, years: int, seed: int, workdir: str, track_memory: bool = True) -> list:
+    '''
+    :return: The report of each stage, in pipeline order.
+    '''
+    stages = {name: Stage(name, unit, track_memory) for name, unit in [("returns", "filings"),
+                                                                     ("csv_write", "filings"),
+                                                                     ("csv_load", "filings"),
+                                                                     ("store_write", "filings"),
+                                                                     ("store_load", "filings"),
+                                                                     ("pair_generation", "pairs"),
+                                                                     ("marker_matching", "pairs"),
+                                                                     ("relationship_scoring", "markers"),
+                                                                     ("ranking_dedup", "pairs")]}
+    csv_dir = os.path.join(workdir, "csv")
+    os.makedirs(csv_dir, exist_ok=True)
+
+    records = {}
+    for ticker, filings, prices in generate_universe(num_tickers, years, seed=seed):
+        scraper = StockScraper(ticker)
+        scraper.file_path = os.path.join(csv_dir, ticker + ".csv")
+
+        with stages["returns"] as stage:
+            scraper.add_filings(filings, prices)
+            scraper.sort_filing_data()
+            stage.items += len(filings)
+
+        with stages["csv_write"] as stage:
+            scraper.write_to_csv()
+            stage.items += len(filings)
+
+        records[ticker] = [f for year in scraper.filing_data.values() for f in year]
+
+        reader = StockScraper(ticker)
+        reader.file_path = scraper.file_path
+        with stages["csv_load"] as stage:
+            reader.read_from_csv()
+            stage.items += len(filings)
+
+    num_filings = sum(len(f) for f in records.values())
+    store_dir = os.path.join(workdir, "store")
+    with stages["store_write"] as stage:
+        write_store(store_dir, records, csv_columns()[2:])
+        stage.items = num_filings
+    del records
+
+    with stages["store_load"] as stage:
+        store = FilingStore(store_dir)
+        # The zero-copy histories the pipeline reads, not the filing dicts of earnings_data.
+        earnings_pairs = EarningsPairs.from_store(store)
+        stage.items = num_filings
+    with stages["pair_generation"] as stage:
+        earnings_pairs.generate_pairs()
+        stage.items = len(earnings_pairs.pairs)
+
+    with stages["marker_matching"] as stage:
+        for pair in earnings_pairs.pairs:
+            pair.generate_markers()
+        stage.items = len(earnings_pairs.pairs)
+
+    with stages["relationship_scoring"] as stage:
+        for pair in earnings_pairs.pairs:
+            pair.calculate_relationship()
+            # The matches, since pair_markers would build the marker dicts and time that instead of the scoring.
+            stage.items += len(pair.matches)
+
+    with stages["ranking_dedup"] as stage:
+        earnings_pairs.organize_pairs()
+        earnings_pairs.delete_duplicates()
+        stage.items = len(earnings_pairs.pairs)
+
+    return [s.report() for s in stages.values()]
+
+'''-----------------------------------'''
+def code_version() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+'''-----------------------------------'''
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the scrape-to-ranking pipeline on a synthetic universe.")
+    parser.add_argument("--tickers", type=int, nargs="+", default=[100, 1000], help="Universe sizes to run. Ex: --tickers 100 1000 10000")
+    parser.add_argument("--years", type=int, default=30, help="Years of filings and prices per ticker.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-memory", action="store_true", help="Skip peak memory tracking, which slows every stage down.")
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout.")
+    args = parser.parse_args()
+
+    track_memory = not args.no_memory
+    if track_memory:
+        tracemalloc.start()
+
+    runs = []
+    for num_tickers in args.tickers:
+        with tempfile.TemporaryDirectory() as workdir:
+            runs.append({"tickers": num_tickers,
+                         "years": args.years,
+                         "stages": run_pipeline(num_tickers, args.years, args.seed, workdir, track_memory)})
+
+    report = {"version": code_version(),
+              "python": platform.python_version(),
+              "machine": platform.machine(),
+              "seed": args.seed,
+              "runs": runs}
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+
+
+# Days after the end of a quarter that companies usually file. 10-Ks are given more time than 10-Qs.
+QUARTERLY_FILING_DAYS = (20, 45)
+ANNUAL_FILING_DAYS = (45, 75)
+
+
+
+'''----------------------------------- Universe -----------------------------------'''
+'''-----------------------------------'''
+def ticker_names(num_tickers: int) -> list:
+    # Ex: T00001, T00002, ...
+    width = max(5, len(str(num_tickers)))
+    return [f"T{i:0{width}d}" for i in range(1, num_tickers + 1)]
+
+'''-----------------------------------'''
+def trading_sessions(years: int, end_year: int = 2023) -> pd.DatetimeIndex:
+    # Weekdays only. Holidays are left out on purpose so filings still land on non-trading days now and then.
+    return pd.bdate_range(f"{end_year - years}-01-01", f"{end_year}-12-31")
+
+'''----------------------------------- Prices -----------------------------------'''
+'''-----------------------------------'''
+def generate_prices(ticker_index: int, sessions: pd.DatetimeIndex, seed: int = 0) -> pd.DataFrame:
+    '''
+    :param ticker_index: The position of the ticker in the universe. Each ticker gets its own reproducible series.
+    :param sessions: The trading sessions to generate bars for.
+    :param seed: The seed of the whole universe.
+    :return: A frame with an "Adj Close" column, laid out like the frame yf.download returns.
+    '''
+    rng = np.random.default_rng([seed, ticker_index])
+    # Geometric Brownian motion with a small market factor, so tickers are mildly correlated.
+    market = np.random.default_rng([seed, 0, 0]).normal(0.0003, 0.01, len(sessions))
+    daily = 0.8 * market + rng.normal(0.0, 0.015, len(sessions))
+    closes = 50 * np.exp(np.cumsum(daily))
+    return pd.DataFrame({"Adj Close": closes}, index=sessions)
+
+'''----------------------------------- Filings -----------------------------------'''
+'''-----------------------------------'''
+def generate_filing_dates(ticker_index: int, years: int, end_year: int = 2023, seed: int = 0) -> list:
+    '''
+    :return: [{"Filing Type": ..., "Filing Date": ...}] for three 10-Qs and one 10-K a year, newest first. Each ticker files around
+             the same day of each season every year, with a couple of days of jitter, like real reporting calendars.
+    '''
+    rng = np.random.default_rng([seed, ticker_index, 1])
+    quarterly_day = int(rng.integers(*QUARTERLY_FILING_DAYS))
+    annual_day = int(rng.integers(*ANNUAL_FILING_DAYS))
+
+    filings = []
+    for year in range(end_year - years, end_year + 1):
+        for quarter_end in (f"{year}-03-31", f"{year}-06-30", f"{year}-09-30", f"{year}-12-31"):
+            annual = quarter_end.endswith("12-31")
+            offset = (annual_day if annual else quarterly_day) + int(rng.integers(-2, 3))
+            date = np.datetime64(quarter_end) + np.timedelta64(offset, "D")
+            if date.astype(object).year > end_year:
+                continue
+            filings.append({"Filing Type": "10-K" if annual else "10-Q",
+                            "Filing Date": str(date)})
+
+    return sorted(filings, key=lambda x: x["Filing Date"], reverse=True)
+
+'''-----------------------------------'''
+def generate_universe(num_tickers: int, years: int, end_year: int = 2023, seed: int = 0):
+    '''
+    :return: A generator of (ticker, filings, prices), one ticker at a time, so large universes never need to be held in memory at once.
+    '''
+    sessions = trading_sessions(years, end_year)
+    for i, ticker in enumerate(ticker_names(num_tickers), start=1):
+        yield ticker, generate_filing_dates(i, years, end_year, seed), generate_prices(i, sessions, seed)
@@ -0,0 +1,73 @@
+from collections import defaultdict
+
+import numpy as np
+
+
+class CalendarIndex:
+    '''
+    An inverted index of filing days -> tickers that filed on that day.
+
+    Pairs of tickers are only ever looked at when they actually report within the window of each other, so
+    the work done scales with the number of co-reporting events instead of with the number of ticker pairs.
+    '''
+    def __init__(self, days: dict, max_days: int = 1, min_days: int = 0) -> None:
+        '''
+        :param days: Ticker -> day numbers of its filings. Ex: FilingHistory.days
+        :param max_days: The largest number of days allowed between two filings.
+        :param min_days: The smallest number of days allowed between two filings.
+        '''
+        self.max_days = max_days
+        self.min_days = min_days
+
+        # The order of the tickers. Each unordered pair is reported with the earlier ticker first.
+        self.rank = {ticker: i for i, ticker in enumerate(days.keys())}
+
+        # Day number -> tickers that filed that day. A ticker is listed once for each filing it made that day.
+        self.buckets = defaultdict(list)
+        for ticker, ticker_days in days.items():
+            for day in np.asarray(ticker_days).tolist():
+                self.buckets[day].append(ticker)
+
+    '''-----------------------------------'''
+    def co_reporting_counts(self) -> dict:
+        '''
+        :return: (ticker1, ticker2) -> number of filing pairs reported within the window of each other.
+        '''
+        counts = defaultdict(int)
+
+        for day, tickers in self.buckets.items():
+            for offset in range(self.min_days, self.max_days + 1):
+                if offset == 0:
+                    # Same day filings. Each unordered pair of filings in the bucket is counted once.
+                    for a in range(len(tickers)):
+                        for b in range(a + 1, len(tickers)):
+                            self.count(counts, tickers[a], tickers[b])
+                else:
+                    # Only look forward in time, so each pair of filings is counted once.
+                    later = self.buckets.get(day + offset)
+                    if later is None:
+                        continue
+                    for t1 in tickers:
+                        for t2 in later:
+                            self.count(counts, t1, t2)
+
+        return counts
+
+    '''-----------------------------------'''
+    def count(self, counts: dict, t1: str, t2: str) -> None:
+        # A company reporting twice inside the window is not a pair.
+        if t1 == t2:
+            return
+        if self.rank[t1] > self.rank[t2]:
+            t1, t2 = t2, t1
+        counts[(t1, t2)] += 1
+
+    '''-----------------------------------'''
+    def pairs(self, min_count: int = 1) -> list:
+        '''
+        :param min_count: The fewest co-reporting events a pair needs to be returned.
+        :return: (ticker1, ticker2) for every unordered pair that co-reported at least min_count times, in ticker order.
+        '''
+        counts = self.co_reporting_counts()
+        pairs = [pair for pair, count in counts.items() if count >= min_count]
+        return sorted(pairs, key=lambda x: (self.rank[x[0]], self.rank[x[1]]))
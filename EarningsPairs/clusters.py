@@ -0,0 +1,196 @@
+import numpy as np
+
+from EarningsPairs.comovement import comovement_matrix
+
+
+# The number of set bits of every byte, to count the bits of packed membership rows.
+POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.int64)
+
+
+
+class Cluster:
+    '''
+    A group of tickers that repeatedly reported within a few days of each other, with how their prices moved on those occasions.
+    '''
+    def __init__(self, tickers: list, days: np.ndarray, returns: np.ndarray) -> None:
+        '''
+        :param tickers: The tickers of the cluster, in the order they joined it.
+        :param days: The day (days since 1970-01-01) of the first ticker's filing each time the whole cluster reported together.
+        :param returns: Tickers x occurrences matrix of the % change of each ticker's filing. NaN where it is "N/A".
+        '''
+        self.tickers = tickers
+        # The title of the cluster. Ex: "KO - PEP - MDLZ"
+        self.name = " - ".join(tickers)
+        self.days = days
+        self.returns = returns
+        self.occurrences = len(days)
+
+        # Occurrences where every ticker has a value, split by whether they all moved the same way.
+        valid = ~np.isnan(returns).any(axis=0)
+        up = (returns[:, valid] >= 0).all(axis=0)
+        down = (returns[:, valid] < 0).all(axis=0)
+        self.total_markers = int(valid.sum())
+        self.total_same = int((up | down).sum())
+        self.total_mixed = self.total_markers - self.total_same
+        self.perc_same = round(self.total_same / self.total_markers * 100, 2) if self.total_markers else 0
+        # The mean return of the cluster's filings, Ex: to size a position for the whole group.
+        self.mean_change = round(float(np.nanmean(returns)), 2) if np.isfinite(returns).any() else None
+
+        # The % positive and Pearson correlation of every pair in the cluster, over its occurrences, averaged.
+        # A cluster of one ticker has no pairs, so both are None.
+        stats = comovement_matrix(returns, "pearson")
+        pairs = np.triu_indices(len(tickers), 1)
+        self.mean_perc_pos = round(float(stats["perc_pos"][pairs].mean()), 2) if len(pairs[0]) else None
+        pearson = stats["pearson"][pairs]
+        self.mean_pearson = round(float(np.nanmean(pearson)), 4) if np.isfinite(pearson).any() else None
+
+        dates = np.datetime_as_string(days.astype("datetime64[D]"))
+        self.years_searched = f"{dates[0][:4]} - {dates[-1][:4]}" if len(dates) else ""
+
+    '''-----------------------------------'''
+    def dates(self) -> np.ndarray:
+        # "YYYY-MM-DD" strings of the first ticker's filing each time the cluster reported together.
+        return np.datetime_as_string(self.days.astype("datetime64[D]"))
+
+
+
+'''----------------------------------- Sweep -----------------------------------'''
+'''-----------------------------------'''
+def merge_events(days: dict) -> tuple:
+    '''
+    :param days: Ticker -> day numbers of its filings.
+    :return: (day, ticker, filing) arrays over every filing of every ticker, sorted by day. ticker is the position of the ticker in days,
+             filing the position of the filing in its ticker's arrays.
+    '''
+    if not days:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    arrays = [np.asarray(d, dtype=np.int64) for d in days.values()]
+    counts = [len(a) for a in arrays]
+    all_days = np.concatenate(arrays)
+    tickers = np.repeat(np.arange(len(arrays)), counts)
+    filings = np.arange(len(all_days)) - np.repeat(np.concatenate([[0], np.cumsum(counts)[:-1]]).astype(np.int64), counts)
+
+    # A stable sort, so events of the same day stay in ticker order.
+    order = np.argsort(all_days, kind="stable")
+    return all_days[order], tickers[order], filings[order]
+
+'''-----------------------------------'''
+def event_windows(days: np.ndarray, window_days: int) -> tuple:
+    '''
+    :param days: Sorted day numbers of every event.
+    :param window_days: The most days apart two filings can be to count as reported together.
+    :return: (start, end). The events within window_days of event i, before or after it, are the events start[i]:end[i].
+    '''
+    # Both edges of the window only move forward as the events do, so they are found for every event at once.
+    return np.searchsorted(days, days - window_days, side="left"), np.searchsorted(days, days + window_days, side="right")
+
+'''-----------------------------------'''
+def gather_ranges(starts: np.ndarray, ends: np.ndarray) -> tuple:
+    '''
+    :return: (rows, positions). Every position of every range, and the range it came from, without a Python loop.
+    '''
+    lengths = ends - starts
+    rows = np.repeat(np.arange(len(starts)), lengths)
+    offsets = np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return rows, np.arange(lengths.sum()) - offsets + np.repeat(starts, lengths)
+
+'''----------------------------------- Growth -----------------------------------'''
+'''-----------------------------------'''
+def grow_cluster(member: np.ndarray, min_occurrences: int, max_size: int = None) -> tuple:
+    '''
+    :param member: Candidates x seed filings boolean matrix. True when the candidate reported within the window of the seed's filing.
+    :param min_occurrences: The fewest seed filings every ticker of the cluster must have reported around together.
+    :param max_size: The most tickers the cluster can have, the seed included. None means no limit.
+    :return: (rows, shared). The rows of the candidates that joined, in the order they joined, and the mask of the seed filings the
+             whole cluster reported around.
+    '''
+    num_filings = member.shape[1]
+    # Each candidate's filings as a bitset, so the overlap of every candidate with the cluster is an AND and a popcount.
+    bits = np.packbits(member, axis=1)
+    shared = np.packbits(np.ones(num_filings, dtype=bool))
+    candidates = np.arange(len(member))
+    rows = []
+
+    while candidates.size and (max_size is None or len(rows) + 1 < max_size):
+        overlap = POPCOUNT[bits[candidates] & shared].sum(axis=1)
+        keep = overlap >= min_occurrences
+        candidates = candidates[keep]
+        if not candidates.size:
+            break
+        # The candidate sharing the most filings joins. argmax keeps the first on ties.
+        best = int(np.argmax(overlap[keep]))
+        rows.append(int(candidates[best]))
+        shared = shared & bits[candidates[best]]
+        candidates = np.delete(candidates, best)
+
+    return rows, np.unpackbits(shared)[:num_filings].astype(bool)
+
+'''----------------------------------- Clusters -----------------------------------'''
+'''-----------------------------------'''
+def find_clusters(days: dict, values: dict, window_days: int = 2, min_occurrences: int = 4, min_size: int = 2,
+                  max_size: int = None) -> list:
+    '''
+    Finds groups of tickers that keep reporting within a few days of each other, from one sorted sweep over the filings of every ticker.
+
+    Tickers that filed more often are tried as seeds first. The tickers that reported within window_days of enough of the seed's
+    filings are its candidates, and the one sharing the most of them with the cluster joins until none shares min_occurrences.
+    Each ticker is in at most one cluster. The work grows with the filings near each seed's filings, not with the pairs of tickers.
+
+    :param days: Ticker -> day numbers of its filings. Ex: FilingHistory.days
+    :param values: Ticker -> the % change of each filing, aligned with days. Ex: FilingHistory.values["1d % Change"]
+    :param window_days: The most days a filing can be from the seed's filing to count as reported together. Two other members
+                        can be up to 2 * window_days apart, one on each side of the seed's filing.
+    :param min_occurrences: The fewest times every ticker of a cluster must have reported together.
+    :param min_size: The fewest tickers a cluster needs.
+    :param max_size: The most tickers a cluster can have. None means no limit.
+    :return: The clusters, most occurrences first.
+    '''
+    tickers = list(days.keys())
+    if not tickers:
+        return []
+    event_days, event_tickers, event_filings = merge_events(days)
+    starts, ends = event_windows(event_days, window_days)
+    # The % change of each event. The values of every ticker end to end, then put in event order.
+    all_values = np.concatenate([np.asarray(values[t], dtype=np.float64) for t in tickers] or [np.empty(0)])
+    offsets = np.concatenate([[0], np.cumsum([len(days[t]) for t in tickers])]).astype(np.int64)
+    event_values = all_values[offsets[event_tickers] + event_filings]
+
+    # The events of each ticker, in date order.
+    by_ticker = np.argsort(event_tickers, kind="stable")
+    bounds = np.searchsorted(event_tickers[by_ticker], np.arange(len(tickers) + 1))
+    filing_counts = np.diff(bounds)
+
+    assigned = np.zeros(len(tickers), dtype=bool)
+    clusters = []
+    # Tickers that filed more often are tried as seeds first. Ties keep the ticker order.
+    for seed in np.argsort(-filing_counts, kind="stable"):
+        if assigned[seed] or filing_counts[seed] < min_occurrences:
+            continue
+
+        # Every event near each of the seed's filings.
+        seed_events = by_ticker[bounds[seed]:bounds[seed + 1]]
+        rows, near = gather_ranges(starts[seed_events], ends[seed_events])
+        near_tickers = event_tickers[near]
+        available = (near_tickers != seed) & ~assigned[near_tickers]
+        rows, near, near_tickers = rows[available], near[available], near_tickers[available]
+
+        candidates, candidate_rows = np.unique(near_tickers, return_inverse=True)
+        member = np.zeros((len(candidates), len(seed_events)), dtype=bool)
+        member[candidate_rows, rows] = True
+        joined, shared = grow_cluster(member, min_occurrences, max_size)
+        if len(joined) + 1 < min_size:
+            continue
+
+        members = [int(seed)] + [int(candidates[j]) for j in joined]
+        assigned[members] = True
+
+        # The % change of each ticker around each shared filing. If a ticker filed twice in the window, the later filing is kept.
+        returns = np.full((len(members), len(seed_events)), np.nan)
+        returns[0] = event_values[seed_events]
+        for row, j in enumerate(joined, start=1):
+            found = candidate_rows == j
+            returns[row, rows[found]] = event_values[near[found]]
+
+        clusters.append(Cluster([tickers[m] for m in members], event_days[seed_events[shared]], returns[:, shared]))
+
+    return sorted(clusters, key=lambda x: x.occurrences, reverse=True)
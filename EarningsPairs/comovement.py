@@ -0,0 +1,247 @@
+import numpy as np
+
+
+'''----------------------------------- Event Matrix -----------------------------------'''
+'''-----------------------------------'''
+def event_return_matrix(histories: dict, column: str = "1d % Change", bucket_days: int = 1) -> tuple:
+    '''
+    :param histories: Ticker -> FilingHistory.
+    :param column: The return column to place in the matrix.
+    :param bucket_days: The width, in days, of each event column. Filings in the same bucket are treated as reported together.
+    :return: (tickers, buckets, returns). returns is a tickers x buckets float64 matrix with NaN where a ticker did not report,
+             or its return is "N/A". If a ticker reported twice in one bucket, the later filing is kept.
+    '''
+    tickers = list(histories.keys())
+    buckets = np.unique(np.concatenate([h.days // bucket_days for h in histories.values()] or [np.empty(0, dtype=np.int32)]))
+
+    returns = np.full((len(tickers), len(buckets)), np.nan)
+    for row, ticker in enumerate(tickers):
+        history = histories[ticker]
+        columns = np.searchsorted(buckets, history.days // bucket_days)
+        # The filings are in date order, so the later filing of a bucket is written last.
+        returns[row, columns] = history.values[column]
+
+    return tickers, buckets * bucket_days, returns
+
+'''-----------------------------------'''
+def matched_events(histories: dict, max_days: int = 1, min_days: int = 0) -> tuple:
+    '''
+    Lines up the filings of every pair of tickers with the same window Pair.generate_markers uses, for the whole universe at once.
+
+    :param histories: Ticker -> FilingHistory.
+    :param max_days: The largest number of days allowed between two filings.
+    :param min_days: The smallest number of days allowed between two filings.
+    :return: (tickers, rows1, rows2, filings1, filings2). One entry per marker of every pair: the rows of the two tickers, the earlier
+             one in tickers first, and the positions of their filings in the histories laid end to end, in the order of tickers.
+             The markers of a pair are the ones match_filings finds for it.
+    '''
+    tickers = list(histories.keys())
+    days = np.concatenate([histories[t].days.astype(np.int64) for t in tickers] or [np.empty(0, dtype=np.int64)])
+    rows = np.repeat(np.arange(len(tickers)), [len(histories[t]) for t in tickers])
+
+    # Every filing, in date order. Each unordered pair of filings is looked at once, from the earlier one, as in CalendarIndex.
+    order = np.argsort(days, kind="stable")
+    sorted_days = days[order]
+    ends = np.searchsorted(sorted_days, sorted_days + max_days, side="right")
+    lengths = ends - np.arange(len(order)) - 1
+    first = np.repeat(np.arange(len(order)), lengths)
+    second = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths) + first + 1
+    first, second = order[first], order[second]
+
+    # A company reporting twice inside the window is not a pair.
+    keep = (rows[first] != rows[second]) & (np.abs(days[second] - days[first]) >= min_days)
+    first, second = first[keep], second[keep]
+
+    swap = rows[first] > rows[second]
+    first, second = np.where(swap, second, first), np.where(swap, first, second)
+    return tickers, rows[first], rows[second], first, second
+
+'''-----------------------------------'''
+def window_comovement(histories: dict, column: str = "1d % Change", max_days: int = 1, min_days: int = 0, correlation: str = None) -> dict:
+    '''
+    :param histories: Ticker -> FilingHistory.
+    :param column: The return column to compare.
+    :param max_days: The largest number of days allowed between two filings.
+    :param min_days: The smallest number of days allowed between two filings.
+    :param correlation: None, "pearson", "spearman" or "both".
+    :return: The same tickers x tickers arrays as comovement_matrix, plus "tickers". They are counted over the markers of
+             matched_events, so every pair gets the counts compare_pairs prints for it. The diagonal is 0, and NaN for correlations.
+    '''
+    if correlation not in (None, "pearson", "spearman", "both"):
+        raise ValueError(f"Unknown correlation: {correlation}")
+
+    tickers, rows1, rows2, filings1, filings2 = matched_events(histories, max_days, min_days)
+    values = [np.asarray(histories[t].values[column], dtype=np.float64) for t in tickers]
+    changes = np.concatenate(values or [np.empty(0)])
+    changes1 = changes[filings1]
+    changes2 = changes[filings2]
+    size = len(tickers)
+    # The pairs that have markers, and the pair of each marker. The sums are taken over these pairs only, and each result is
+    # placed in a tickers x tickers matrix once, instead of every sum being a tickers x tickers array. The counts of each cell
+    # are reused as the lookup from a cell to its pair, so the markers are never sorted.
+    index = rows1.astype(np.int64) * size + rows2
+    lookup = np.bincount(index, minlength=size * size)
+    pairs = np.flatnonzero(lookup)
+    lookup[pairs] = np.arange(len(pairs))
+    pair_of = lookup[index]
+    del lookup
+    pair_rows = np.divmod(pairs, size)
+
+    # Only markers where both tickers have a value are counted.
+    valid = ~(np.isnan(changes1) | np.isnan(changes2))
+    pair_of, filings1, filings2 = pair_of[valid], filings1[valid], filings2[valid]
+    changes1, changes2 = changes1[valid], changes2[valid]
+
+    def pair_sums(weights: np.ndarray = None) -> np.ndarray:
+        # Sums over the valid markers of each pair. Without weights, their number.
+        return np.bincount(pair_of, weights, minlength=len(pairs))
+
+    def matrix(pair_values: np.ndarray, fill, dtype) -> np.ndarray:
+        # The pairs' values in both triangles of a tickers x tickers matrix. Pairs without markers get fill.
+        result = np.full((size, size), fill, dtype=dtype)
+        result[pair_rows] = pair_values
+        result[pair_rows[::-1]] = pair_values
+        return result
+
+    # The same classification as count_relationships: a change of 0 counts as moving up.
+    total_markers = pair_sums()
+    total_pos = pair_sums((changes1 >= 0) == (changes2 >= 0))
+    total_neg = total_markers - total_pos
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        perc_pos = np.where(total_markers > 0, np.round(total_pos / total_markers * 100, 2), 0.0)
+        perc_neg = np.where(total_markers > 0, np.round(total_neg / total_markers * 100, 2), 0.0)
+
+    results = {"tickers": tickers,
+               "total_pos": matrix(total_pos, 0, np.int64),
+               "total_neg": matrix(total_neg, 0, np.int64),
+               "total_markers": matrix(total_markers, 0, np.int64),
+               "perc_pos": matrix(perc_pos, 0.0, np.float64),
+               "perc_neg": matrix(perc_neg, 0.0, np.float64)}
+
+    if correlation in ("pearson", "both"):
+        results["pearson"] = matrix(matched_pearson(pair_sums, changes1, changes2), np.nan, np.float64)
+    if correlation in ("spearman", "both"):
+        # Ranked over all of each ticker's filings, the same approximation as rank_rows.
+        ranks = np.concatenate([rank_values(v) for v in values] or [np.empty(0)])
+        results["spearman"] = matrix(matched_pearson(pair_sums, ranks[filings1], ranks[filings2]), np.nan, np.float64)
+
+    return results
+
+'''-----------------------------------'''
+def matched_pearson(pair_sums, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    '''
+    :param pair_sums: Sums over the valid markers of each pair. See window_comovement.
+    :param x: The value of the earlier ticker at each marker.
+    :param y: The value of the later ticker at each marker.
+    :return: The Pearson correlation of each pair over its valid markers. NaN when there are fewer than 2 or no variance.
+    '''
+    n = pair_sums()
+    sum_x = pair_sums(x)
+    sum_y = pair_sums(y)
+    sum_xx = pair_sums(x * x)
+    sum_yy = pair_sums(y * y)
+    sum_xy = pair_sums(x * y)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cov = sum_xy - sum_x * sum_y / n
+        var_x = sum_xx - sum_x ** 2 / n
+        var_y = sum_yy - sum_y ** 2 / n
+        # Rounding leaves a tiny variance where the values are all the same, which would give a correlation of +-1.
+        flat = (var_x <= 1e-12 * sum_xx) | (var_y <= 1e-12 * sum_yy)
+        r = cov / np.sqrt(var_x * var_y)
+
+    r[(n < 2) | flat | ~np.isfinite(r)] = np.nan
+    return np.clip(r, -1.0, 1.0)
+
+'''----------------------------------- Co-movement -----------------------------------'''
+'''-----------------------------------'''
+def comovement_matrix(returns: np.ndarray, correlation: str = None) -> dict:
+    '''
+    :param returns: Tickers x events matrix of % changes, aligned on the events. NaN marks a missing value.
+    :param correlation: None, "pearson", "spearman" or "both". Adds the return correlation of every pair to the results.
+    :return: Dict of tickers x tickers arrays: "total_pos", "total_neg", "total_markers", "perc_pos", "perc_neg",
+             plus "pearson" and/or "spearman" when requested. Each cell uses the events both tickers have a value for.
+    '''
+    returns = np.asarray(returns, dtype=np.float64)
+    valid = ~np.isnan(returns)
+
+    # The same classification as count_relationships: a change of 0 counts as moving up.
+    up = (valid & (returns >= 0)).astype(np.float64)
+    down = (valid & (returns < 0)).astype(np.float64)
+
+    # Every pair is scored at once. Ex: up @ up.T counts the events where both tickers moved up.
+    total_pos = up @ up.T + down @ down.T
+    total_neg = up @ down.T + down @ up.T
+    total_markers = total_pos + total_neg
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        perc_pos = np.where(total_markers > 0, np.round(total_pos / total_markers * 100, 2), 0.0)
+        perc_neg = np.where(total_markers > 0, np.round(total_neg / total_markers * 100, 2), 0.0)
+
+    results = {"total_pos": total_pos.astype(np.int64),
+               "total_neg": total_neg.astype(np.int64),
+               "total_markers": total_markers.astype(np.int64),
+               "perc_pos": perc_pos,
+               "perc_neg": perc_neg}
+
+    if correlation in ("pearson", "both"):
+        results["pearson"] = pairwise_pearson(returns, valid)
+    if correlation in ("spearman", "both"):
+        results["spearman"] = pairwise_pearson(rank_rows(returns, valid), valid)
+    if correlation not in (None, "pearson", "spearman", "both"):
+        raise ValueError(f"Unknown correlation: {correlation}")
+
+    return results
+
+'''-----------------------------------'''
+def pairwise_pearson(values: np.ndarray, valid: np.ndarray) -> np.ndarray:
+    '''
+    :param values: Tickers x events matrix.
+    :param valid: Mask of the cells that hold a value.
+    :return: Tickers x tickers Pearson correlation over the events both tickers have. NaN when there are fewer than 2 or no variance.
+    '''
+    mask = valid.astype(np.float64)
+    x = np.where(valid, values, 0.0)
+
+    # Sums over the overlapping events of every pair, as matrix products.
+    n = mask @ mask.T
+    sum_x = x @ mask.T
+    sum_y = sum_x.T
+    sum_xx = (x * x) @ mask.T
+    sum_yy = sum_xx.T
+    sum_xy = x @ x.T
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cov = sum_xy - sum_x * sum_y / n
+        var_x = sum_xx - sum_x ** 2 / n
+        var_y = sum_yy - sum_y ** 2 / n
+        r = cov / np.sqrt(var_x * var_y)
+
+    r[(n < 2) | ~np.isfinite(r)] = np.nan
+    return np.clip(r, -1.0, 1.0)
+
+'''-----------------------------------'''
+def rank_rows(values: np.ndarray, valid: np.ndarray) -> np.ndarray:
+    '''
+    :return: The values replaced by their rank within each row, with ties given their average rank. Ranks are taken over all of a
+             ticker's events, so the Spearman correlation of a pair is an approximation when their events only partly overlap.
+    '''
+    ranks = np.full(values.shape, np.nan)
+    for row in range(values.shape[0]):
+        ranks[row] = rank_values(np.where(valid[row], values[row], np.nan))
+    return ranks
+
+'''-----------------------------------'''
+def rank_values(values: np.ndarray) -> np.ndarray:
+    # The rank of each value, with ties given their average 1 based rank. NaN stays NaN.
+    ranks = np.full(values.shape, np.nan)
+    present = np.flatnonzero(~np.isnan(values))
+    if len(present) == 0:
+        return ranks
+    unique, inverse, counts = np.unique(values[present], return_inverse=True, return_counts=True)
+    # The average of the 1 based ranks each group of tied values covers.
+    upper = np.cumsum(counts)
+    average = upper - (counts - 1) / 2
+    ranks[present] = average[inverse]
+    return ranks
@@ -1,20 +1,48 @@
-import datetime as dt
+import heapq
+
+import numpy as np
+
+from EarningsPairs.filinghistory import FilingHistory
+from EarningsPairs.historycache import HistoryCache, DEFAULT_CACHE_BYTES, blocked_order
+from EarningsPairs.resultcache import ResultCache
+from EarningsPairs.matching import match_filings
+from EarningsPairs.calendarindex import CalendarIndex
+from EarningsPairs.scoring import count_relationships
+from EarningsPairs.parallel import evaluate_pairs
+from EarningsPairs.comovement import event_return_matrix, comovement_matrix, window_comovement
+from EarningsPairs.results import RANKINGS, write_results
+from EarningsPairs.rolling import rolling_relationships
+from EarningsPairs.clusters import find_clusters
+from EarningsPairs.significance import binomial_p_values, wilson_lower_bounds, permutation_p_values, bootstrap_lower_bounds
+from Scraper.eventreturns import compute_event_returns
+from Instrumentation.instrumentation import tracer, stage, count
 
 
 class Pair:
-    def __init__(self, t1: str, t2: str, d1: dict, d2: dict) -> None:
+    def __init__(self, t1: str, t2: str, d1, d2, max_days: int = 1, min_days: int = 0, h1: FilingHistory = None, h2: FilingHistory = None,
+                 column: str = "1d % Change") -> None:
         # First ticker.
         self.t1 = t1
         # Second ticker.
         self.t2 = t2
-        # First data related to ticker1.
-        self.d1 = d1
-        # Second data related to ticker2.
-        self.d2 = d2
+        # The filings of each ticker as arrays. EarningsPairs passes these in so each ticker is only converted once.
+        self.h1 = as_history(d1) if h1 is None else h1
+        self.h2 = as_history(d2) if h2 is None else h2
+        # The year -> list of filings layout of each ticker, when it was passed in. See d1 and d2.
+        self.data1 = None if isinstance(d1, FilingHistory) else d1
+        self.data2 = None if isinstance(d2, FilingHistory) else d2
         # The title of the pair. Ex: "KO" - "PEP"
         self.pair = f"{self.t1} - {self.t2}"
-        # The markers between the pairs. Markers are when earnings are within 1 day of eachother. 
-        self.pair_markers = []
+        # The markers between the pairs. Markers are when earnings are between min_days and max_days of eachother.
+        # Each marker is stored as an (i, j) row of positions into h1 and h2. pair_markers builds the marker dicts from them when asked.
+        self.matches = np.empty((0, 2), dtype=np.int32)
+        self.markers = None
+        # Set once calculate_relationship has run.
+        self.scored = False
+        self.max_days = max_days
+        self.min_days = min_days
+        # The % change compared during each marker. Ex: "1d Abnormal % Change" once EarningsPairs.add_event_returns has run.
+        self.column = column
 
         # The relationship in price between companies during a marker period.
         self.total_pos = 0
@@ -23,46 +51,100 @@ class Pair:
         self.perc_neg = 0
         self.total_markers = 0
 
-        # Lenghts of the data.
-        d1_length = len(list(self.d1.keys()))
-        d2_length = len(list(self.d2.keys()))
+        # How likely the relationship is to be luck. Set by EarningsPairs.score_significance.
+        # p_value is the binomial p-value, lower_bound the lower end of the % positive confidence interval.
+        self.p_value = None
+        self.lower_bound = None
+        self.permutation_p_value = None
+
+        # The years of the ticker that has filed for fewer years. Found the first time they are asked for.
+        self.compared_years = None
+
+    '''-----------------------------------'''
+    @property
+    def d1(self):
+        # First data related to ticker1. The year -> list of filings layout, built as a lazy view when the data came in as arrays.
+        if self.data1 is None:
+            self.data1 = self.h1.years()
+        return self.data1
+
+    '''-----------------------------------'''
+    @property
+    def d2(self):
+        # Second data related to ticker2.
+        if self.data2 is None:
+            self.data2 = self.h2.years()
+        return self.data2
+
+    '''-----------------------------------'''
+    @property
+    def years_to_compare(self) -> list:
+        if self.compared_years is None:
+            years1 = list(self.data1.keys()) if self.data1 is not None else np.unique(self.h1.years_of()).astype(str)
+            years2 = list(self.data2.keys()) if self.data2 is not None else np.unique(self.h2.years_of()).astype(str)
+            # Sometimes there will be cases where one company has been around for more years. 
+            # Therefore we compare how long each one has traded for. We take the shorter length so we can compare both fully. 
+            shorter = years2 if len(years1) > len(years2) else years1
+            # Sort the years so they are in order.
+            self.compared_years = sorted(str(y) for y in shorter)
+        return self.compared_years
 
-        # Sometimes there will be cases where one company has been around for more years. 
-        # Therefore we compare how long each one has traded for. We take the shorter length so we can compare both fully. 
-        if d1_length > d2_length:
-            self.years_to_compare = list(self.d2.keys())
-        elif d1_length < d2_length:
-            self.years_to_compare = list(self.d1.keys())
-        elif d1_length == d2_length:
-            self.years_to_compare = list(self.d1.keys())
+    '''-----------------------------------'''
+    @property
+    def years_searched(self) -> str:
+        return f"{self.years_to_compare[0]} - {self.years_to_compare[-1]}"
 
-        # Sort the years so they are in order.
-        self.years_to_compare = sorted(self.years_to_compare)
-        self.years_searched = f"{self.years_to_compare[0]} - {self.years_to_compare[-1]}"
-        self.num_of_years = len(self.years_to_compare)
+    '''-----------------------------------'''
+    @property
+    def num_of_years(self) -> int:
+        return len(self.years_to_compare)
 
     '''-----------------------------------'''
     def generate_markers(self):
-        
-        for y in self.years_to_compare:
-
-            for i in range(len(self.d1[y])):
-                try:
-                    date1 = self.d1[y][i]["Filing Date"]
-                    date2 = self.d2[y][i]["Filing Date"]
-
-                    difference = self.date_differences(date1, date2)
-
-                    if difference == 1:
-                        
-                        marker = {"Date1": date1,
-                                  "Date2": date2,
-                                  "Data1": self.d1[y][i],
-                                  "Data2": self.d2[y][i]}
-                        self.pair_markers.append(marker)
-                except IndexError:
-                    pass
-            
+
+        # Walk both date ordered filing lists together, so quarters that are misaligned across a year boundary are still matched.
+        self.set_markers(match_filings(self.h1.days.tolist(), self.h2.days.tolist(), self.max_days, self.min_days))
+
+    '''-----------------------------------'''
+    def set_markers(self, matches):
+        '''
+        :param matches: (i, j) index pairs into the date ordered filings of ticker 1 and ticker 2.
+        :return: None
+        '''
+        self.matches = np.asarray(matches, dtype=np.int32).reshape(-1, 2)
+        self.markers = None
+
+    '''-----------------------------------'''
+    @property
+    def pair_markers(self) -> list:
+        # The marker dicts are only built when they are asked for, and then kept.
+        if self.markers is None:
+            self.markers = []
+            for i, j in self.matches.tolist():
+                data1 = self.h1.filing(i)
+                data2 = self.h2.filing(j)
+                marker = {"Date1": data1["Filing Date"],
+                          "Date2": data2["Filing Date"],
+                          "Data1": data1,
+                          "Data2": data2}
+                if self.scored:
+                    marker["Positive Relationship"] = self.perc_pos
+                    marker["Negative Relationship"] = self.perc_neg
+                self.markers.append(marker)
+        return self.markers
+
+    @pair_markers.setter
+    def pair_markers(self, markers: list):
+        # Setting an empty list drops the markers. Ex: pair.pair_markers = []
+        # Otherwise the matches are found again from the filings of the markers, so calculate_relationship scores the new markers.
+        if not markers:
+            self.matches = np.empty((0, 2), dtype=np.int32)
+        else:
+            rows1 = self.h1.positions([m["Date1"] for m in markers], [m["Data1"]["Filing Type"] for m in markers])
+            rows2 = self.h2.positions([m["Date2"] for m in markers], [m["Data2"]["Filing Type"] for m in markers])
+            self.matches = np.stack([rows1, rows2], axis=1).astype(np.int32)
+        self.markers = markers
+
     '''-----------------------------------'''
     def get_markers(self):
         return self.pair_markers
@@ -74,38 +156,16 @@ class Pair:
     '''-----------------------------------'''
     def calculate_relationship(self):
 
-        # It is considered positive if the stock price of both companies moved in the same direction with the marker period.  
-        positive = 0
-        # It is considered negative if the stock price performed opposite of each other in the marker period. 
-        negative = 0
-        # Invalid markers are usually ones close to the current date. This is because the have not had a trading day, and therefore not enough price data. 
-        invalid = 0
+        changes1 = self.h1.values[self.column][self.matches[:, 0]]
+        changes2 = self.h2.values[self.column][self.matches[:, 1]]
+        positive, negative, invalid = count_relationships(changes1, changes2)
+        self.set_relationship(positive, negative, invalid)
+
+    '''-----------------------------------'''
+    def set_relationship(self, positive: int, negative: int, invalid: int):
         # Get the total number of markers.
-        num_markers = len(self.pair_markers)
+        num_markers = len(self.matches)
 
-        for i in self.pair_markers:
-            
-            try:
-                t1_change = float(i["Data1"]["1d % Change"])
-                t2_change = float(i["Data2"]["1d % Change"])
-                # If both companies increased in price during the marker period.
-                if t1_change >= 0 and t2_change >= 0:
-                    positive += 1
-                # If both companies decreased in price during the marker period.
-                elif t1_change < 0 and t2_change < 0:
-                    positive += 1
-                # If Company 1 increased in price, while Company 2 decreases in price.
-                elif t1_change >= 0 and t2_change < 0:
-                    negative += 1
-                # If Company 1 decreases in price, while Company 2 increases in price.
-                elif t1_change < 0 and t2_change >= 0:
-                    negative += 1
-            except TypeError:
-                invalid += 1
-            # This error is raised when, one of the % changes is "N/A". 
-            except ValueError:
-                invalid += 1
-            
         self.total_pos = positive
         self.total_neg = negative
         try:
@@ -117,107 +177,391 @@ class Pair:
         except ZeroDivisionError:
             self.perc_neg = 0.0
         self.total_markers = num_markers - invalid
-        
-        for i in self.pair_markers:
-            pos_rel = round((positive / (num_markers-invalid)) * 100, 2)
-            neg_rel = round((negative / (num_markers-invalid)) * 100, 2)
-            i["Positive Relationship"] = pos_rel
-            i["Negative Relationship"] = neg_rel
+        self.scored = True
 
-    '''-----------------------------------'''
-    
+        # Marker dicts that were already built get the relationship added. New ones get it when they are built.
+        for i in self.markers or []:
+            i["Positive Relationship"] = self.perc_pos
+            i["Negative Relationship"] = self.perc_neg
 
-    '''----------------------------------- Utilities -----------------------------------'''
-    def date_differences(self, date1: str, date2: str):
-        date1 = dt.datetime.strptime(date1, "%Y-%m-%d")
-        date2 = dt.datetime.strptime(date2, "%Y-%m-%d")
 
-        # We want the "greater" date to avoid negative differences. And chronologically it makes sense to compare the later date to the earlier date. 
-        if date1 > date2:
-            difference = date1 - date2
-        elif date1 < date2:
-            difference = date2 - date1
-        # If the dates are equal it will result in a difference of 0. 
-        elif date1 == date2:
-            difference = date1 - date2
 
-        return difference.days
-    '''-----------------------------------'''
-    
-    '''-----------------------------------'''
-    '''-----------------------------------'''
+def as_history(data) -> FilingHistory:
+    # Filing data can be given as a FilingHistory, or in the year -> list of filings layout of StockScraper.
+    if isinstance(data, FilingHistory):
+        return data
+    return FilingHistory.from_filing_data(data)
 
-        
+'''-----------------------------------'''
+def add_columns(history: FilingHistory, values: dict) -> None:
+    # The history gets its own column dict, so a dict shared with other objects is never changed.
+    history.values = dict(history.values)
+    history.values.update(values)
 
 
 
 class EarningsPairs: 
-    def __init__(self, data: dict) -> None:
-        self.data = data
+    def __init__(self, data: dict = None, max_days: int = 1, min_days: int = 0, column: str = "1d % Change", loader=None,
+                 tickers: list = None, cache_bytes: int = None) -> None:
+        '''
+        :param data: Ticker -> [filing data]. Not needed with a loader.
+        :param loader: Optional. Called with a ticker, returns its FilingHistory. Histories are then loaded when a pair needs them
+                       and only the most recently used ones are kept, so every ticker never has to be in memory at once.
+        :param tickers: The tickers to compare. Defaults to the tickers of data, or loader.tickers.
+        :param cache_bytes: The memory budget of the loaded histories. Defaults to DEFAULT_CACHE_BYTES. Only top_pairs and score_pairs
+                            keep to it, since the pairs of generate_pairs hold on to their histories.
+        '''
+        self.data = {} if data is None else data
+
+        # The window, in days, that two filings must be reported within to be a marker.
+        self.max_days = max_days
+        self.min_days = min_days
+        # The % change the pairs are compared on.
+        self.column = column
+        # Ticker -> FilingHistory. Filled when the pairs are generated.
+        self.histories = {}
+        # With a loader, the histories are kept here instead, within the memory budget.
+        self.history_cache = None
+        # Ticker -> columns added by add_event_returns. Added again each time the cache loads the history.
+        self.extra_values = {}
+        if loader is not None:
+            self.history_cache = HistoryCache(loader, DEFAULT_CACHE_BYTES if cache_bytes is None else cache_bytes, self.load_extra_values)
 
         # Get all of the tickers
-        self.tickers = list(self.data.keys())
+        if tickers is None:
+            tickers = loader.tickers if loader is not None and not self.data else self.data.keys()
+        self.tickers = list(tickers)
 
         # All of the pairs from the tickers being compared. 
         self.pairs = []
 
     '''-----------------------------------'''
-    def generate_pairs(self) -> list:
+    @classmethod
+    def from_store(cls, store, tickers: list = None, cache_bytes: int = None, **kwargs):
+        '''
+        :param store: A FilingStore holding the filing records.
+        :param tickers: The tickers to compare. Defaults to every ticker in the store.
+        :param cache_bytes: Optional. Read each ticker into memory only when a pair needs it, keeping at most this many bytes of histories.
+        :param kwargs: Passed on to EarningsPairs. Ex: max_days
+        :return: EarningsPairs object.
+        '''
+        if tickers is None:
+            tickers = store.tickers
+        if cache_bytes is not None:
+            return cls(loader=lambda t: FilingHistory.from_store(store, t).copy(), tickers=tickers, cache_bytes=cache_bytes, **kwargs)
+        # The histories are views into the store's memory mapped columns, so nothing is copied.
+        return cls({t: [FilingHistory.from_store(store, t)] for t in tickers}, **kwargs)
+
+    '''-----------------------------------'''
+    def generate_pairs(self, min_co_reports: int = 1) -> list:
+        '''
+        Every pair is kept in self.pairs with both of its histories, so the histories of every paired ticker stay in memory,
+        whatever the cache_bytes of a loader. With a loader, use top_pairs or score_pairs to stay within the budget.
+
+        :param min_co_reports: The fewest times two tickers must report within the window of each other to be paired.
+        :return: The pairs.
+        '''
+        with stage("pairs.generate"):
+            self.pairs.extend(self.iter_pairs(min_co_reports))
+        count("pairs.generated", len(self.pairs))
+        return self.pairs
+
+    '''-----------------------------------'''
+    def iter_pairs(self, min_co_reports: int = 1, blocked: bool = False):
+        '''
+        :param min_co_reports: The fewest times two tickers must report within the window of each other to be paired.
+        :param blocked: With a loader, yield the pairs grouped by blocks of tickers that fit in the cache together, instead of in
+                        ticker order, so each history is loaded a few times rather than once per pair.
+        :return: A generator of the pairs. Each Pair is only created when it is reached.
+        '''
+        days = {}
+        nbytes = 0
+        for t in self.tickers:
+            history = self.get_history(t)
+            # A copy, so the index does not keep an evicted history alive.
+            days[t] = history.days if self.history_cache is None else np.array(history.days)
+            nbytes += history.nbytes
+
+        # Only the unordered pairs that actually report together are created, instead of every ordered pair of tickers.
+        index = CalendarIndex(days, self.max_days, self.min_days)
+        pairs = index.pairs(min_co_reports)
+        if blocked and self.history_cache is not None and self.tickers:
+            average = max(1, nbytes // len(self.tickers))
+            pairs = blocked_order(pairs, self.tickers, self.history_cache.max_bytes // (2 * average))
+
+        for ticker1, ticker2 in pairs:
+            h1 = self.get_history(ticker1)
+            h2 = self.get_history(ticker2)
+            # Without filing data the histories are passed in, and the year layout is only built if it is asked for.
+            d1 = self.data[ticker1][0] if ticker1 in self.data else h1
+            d2 = self.data[ticker2][0] if ticker2 in self.data else h2
+            yield Pair(t1=ticker1, t2=ticker2, d1=d1, d2=d2, max_days=self.max_days, min_days=self.min_days,
+                       h1=h1, h2=h2, column=self.column)
+
+    '''-----------------------------------'''
+    def score_pairs(self, min_co_reports: int = 1, keep_markers: bool = False):
+        '''
+        :param min_co_reports: The fewest times two tickers must report within the window of each other to be paired.
+        :param keep_markers: Keep the markers of each pair. They are dropped by default, so only the scores stay in memory.
+        :return: A generator of the scored pairs. With a loader they come in the cache friendly order of iter_pairs.
+        '''
+        for pair in self.iter_pairs(min_co_reports, blocked=True):
+            pair.generate_markers()
+            pair.calculate_relationship()
+            count("pairs.evaluated")
+            count("pairs.markers", len(pair.matches))
+            if not keep_markers:
+                pair.pair_markers = []
+            yield pair
 
-        for i in range(len(self.tickers)):
-            for j in range(len(self.tickers)):
-                if i != j:
-                    ticker1 = self.tickers[i]
-                    ticker2 = self.tickers[j]
-                    ticker_pair = Pair(t1=ticker1, t2=ticker2, d1=self.data[ticker1][0], d2=self.data[ticker2][0])
-                    self.pairs.append(ticker_pair)
+    '''-----------------------------------'''
+    def top_pairs(self, top_k: int = 100, min_markers: int = 1, min_co_reports: int = 1, keep_markers: bool = False, output: str = None) -> list:
+        '''
+        :param top_k: The number of pairs to keep.
+        :param min_markers: Pairs with fewer valid markers are skipped.
+        :param min_co_reports: The fewest times two tickers must report within the window of each other to be paired.
+        :param keep_markers: Keep the markers of the returned pairs.
+        :param output: Optional .csv or .json file to write the results to.
+        :return: The top_k pairs by % positive, highest first.
+        '''
+        if top_k < 1:
+            raise ValueError(f"top_k must be at least 1, got {top_k}")
+        # A min-heap of the best pairs seen so far. The worst of them is always on top, ready to be replaced.
+        # Ties are broken by ticker order, so the result matches a stable sort of every pair whatever order they are scored in.
+        rank = {t: i for i, t in enumerate(self.tickers)}
+        heap = []
+        with stage("pairs.top_pairs"):
+            for pair in self.score_pairs(min_co_reports, keep_markers):
+                if pair.total_markers < min_markers:
+                    continue
+                entry = (pair.perc_pos, -rank[pair.t1], -rank[pair.t2], pair)
+                if len(heap) < top_k:
+                    heapq.heappush(heap, entry)
+                elif entry[:3] > heap[0][:3]:
+                    heapq.heapreplace(heap, entry)
+
+        pairs = [entry[3] for entry in sorted(heap, key=lambda x: x[:3], reverse=True)]
+
+        if output is not None:
+            write_results(pairs, output, include_markers=keep_markers)
+        return pairs
     
    
         
     '''-----------------------------------'''
+    def add_event_returns(self, prices: dict, benchmark, **kwargs) -> list:
+        '''
+        Adds the raw and market adjusted returns of every filing to the histories, computed for all tickers at once.
+        Compare the pairs on one of them by setting column. Ex: pairs.column = "1d Abnormal % Change"
+
+        :param prices: Ticker -> price history. Ex: PriceCache.get_many(pairs.tickers)
+        :param benchmark: The price history of the benchmark. Ex: SPY
+        :param kwargs: Passed on to compute_event_returns. Ex: windows, model, beta_cache
+        :return: The columns added to any ticker, in the order they were computed. Columns a history already has, Ex: the "1d % Change"
+                 of the CSV files, are kept as they are.
+        '''
+        dates = {}
+        columns = {}
+        for t in self.tickers:
+            history = self.get_history(t)
+            dates[t] = history.dates()
+            columns[t] = set(history.values)
+        with stage("pairs.event_returns"):
+            returns = compute_event_returns(prices, dates, benchmark, **kwargs)
+
+        added = {}
+        for ticker in self.tickers:
+            values = {c: returns[ticker][c] for c in returns[ticker] if c not in columns[ticker]}
+            added.update(dict.fromkeys(values))
+            if self.history_cache is None:
+                add_columns(self.histories[ticker], values)
+                continue
+            # Loaded histories are dropped and read again, so the columns are kept to be added on every load.
+            self.extra_values[ticker] = {**self.extra_values.get(ticker, {}), **values}
+            if ticker in self.history_cache:
+                add_columns(self.history_cache.get(ticker), values)
+                self.history_cache.resize(ticker)
+        return list(added)
+
+    '''-----------------------------------'''
+    def load_extra_values(self, ticker: str, history: FilingHistory) -> None:
+        # Called by the history cache on each load.
+        if ticker in self.extra_values:
+            add_columns(history, self.extra_values[ticker])
+
+    '''-----------------------------------'''
+    def get_history(self, ticker: str) -> FilingHistory:
+        if self.history_cache is not None:
+            return self.history_cache.get(ticker)
+        # Convert each ticker's filings once, no matter how many pairs it is in.
+        if ticker not in self.histories:
+            self.histories[ticker] = as_history(self.data[ticker][0])
+        return self.histories[ticker]
+
     '''-----------------------------------'''
-    def organize_pairs(self):
+    def organize_pairs(self, rank_by: str = "perc_pos"):
+        '''
+        :param rank_by: "perc_pos", "lower_bound", "p_value" or "permutation_p_value". The last three need score_significance to have run.
+        :return: None
+        '''
         organized_list = []
-        # Organize the list by the amount of markers that have a positive match. 
-        organized_list = sorted(self.pairs, key=lambda x: x.perc_pos, reverse=True)
+        if rank_by not in RANKINGS:
+            raise ValueError(f"Unknown ranking: {rank_by}")
+        if rank_by != "perc_pos" and any(getattr(p, rank_by, None) is None for p in self.pairs):
+            raise ValueError(f"The pairs have no {rank_by}. Run score_significance first")
+
+        # By default, organize the list by the amount of markers that have a positive match. P-values rank the least likely to be luck first.
+        organized_list = sorted(self.pairs, key=lambda x: getattr(x, rank_by), reverse=RANKINGS[rank_by])
 
         self.pairs = organized_list
 
+    '''-----------------------------------'''
+    def score_significance(self, base_rate: float = 0.5, confidence: float = 0.95, permutations: int = 0, bootstraps: int = 0, seed: int = 0):
+        '''
+        Scores how likely each pair's relationship is to be noise. The pairs must have been compared first.
+
+        :param base_rate: The chance of two tickers moving the same way by luck alone.
+        :param confidence: The confidence of the lower bounds.
+        :param permutations: Shuffles of the event dates for the permutation test. 0 skips it.
+        :param bootstraps: Resamples for a bootstrap lower bound, used instead of the Wilson bound. 0 skips it.
+        :param seed: The seed of the random generator.
+        :return: None
+        '''
+        with stage("pairs.significance"):
+            # Pairs are scored in name order, so the random draws of a pair do not depend on how the list is currently sorted.
+            pairs = sorted(self.pairs, key=lambda p: p.pair)
+            positive = [p.total_pos for p in pairs]
+            trials = [p.total_markers for p in pairs]
+            p_values = binomial_p_values(positive, trials, base_rate)
+
+            if bootstraps:
+                lower_bounds = bootstrap_lower_bounds(positive, trials, bootstraps, confidence, seed)
+            else:
+                lower_bounds = wilson_lower_bounds(positive, trials, confidence)
+
+            permutation_values = None
+            if permutations:
+                changes = [(p.h1.values[p.column][p.matches[:, 0]], p.h2.values[p.column][p.matches[:, 1]]) for p in pairs]
+                permutation_values = permutation_p_values(changes, permutations, seed)
+
+            for i, pair in enumerate(pairs):
+                pair.p_value = float(p_values[i])
+                pair.lower_bound = float(lower_bounds[i])
+                if permutation_values is not None:
+                    pair.permutation_p_value = float(permutation_values[i])
+
     '''-----------------------------------'''
     def delete_duplicates(self):
         
-        indexes_to_delete = []
+        # The tickers of each pair that has been kept, regardless of their order. Ex: {"KO", "PEP"}
+        seen = set()
+        unique_pairs = []
 
-        # Create a copy of the data. 
-        data = self.pairs
+        for i in self.pairs:
+            key = frozenset((i.t1, i.t2))
+            # Keep the first of "KO - PEP" and "PEP - KO".
+            if key not in seen:
+                seen.add(key)
+                unique_pairs.append(i)
 
+        self.pairs = unique_pairs
 
-        for i in data:
+    '''-----------------------------------'''
+    def comovement(self, column: str = None, correlation: str = None, bucket_days: int = None) -> dict:
+        '''
+        :param column: The return column to compare. Defaults to the one the pairs are compared on.
+        :param correlation: None, "pearson", "spearman" or "both".
+        :param bucket_days: Optional. Treat filings in the same fixed bucket of this many days as reported together instead of using
+                            the max_days and min_days window. Filings on either side of a bucket boundary are then never compared.
+                            The buckets form an aligned event matrix, which comovement_matrix scores with matrix products.
+                            The window has no aligned events, so its markers are summed per pair instead.
+        :return: The comovement_matrix results for every pair of tickers at once, plus "tickers" naming the rows and columns. With the
+                 window, the counts of each pair are the ones compare_pairs prints.
+        '''
+        histories = {t: self.get_history(t) for t in self.tickers}
+        with stage("pairs.comovement"):
+            if bucket_days is None:
+                return window_comovement(histories, column or self.column, self.max_days, self.min_days, correlation)
+            tickers, buckets, returns = event_return_matrix(histories, column or self.column, bucket_days)
+            results = comovement_matrix(returns, correlation)
+        results["tickers"] = tickers
+        return results
+
+    '''-----------------------------------'''
+    def rolling(self, window_years: float = None, window_events: int = None, min_co_reports: int = 1, column: str = None) -> dict:
+        '''
+        :param window_years: Trailing window in years. Ex: 5
+        :param window_events: Trailing window in markers, per pair. Ex: 12
+        :param min_co_reports: The fewest times two tickers must report within the window of each other to be paired.
+        :param column: The return column to compare. Defaults to the one the pairs are compared on.
+        :return: The rolling_relationships time series of every pair, computed in one pass.
+        '''
+        if window_years is None and window_events is None:
+            raise ValueError("Set window_years, window_events or both.")
+
+        pairs = []
+        for pair in self.iter_pairs(min_co_reports):
+            pair.generate_markers()
+            pairs.append(pair)
+
+        window_days = None if window_years is None else int(round(window_years * 365.25))
+        with stage("pairs.rolling"):
+            return rolling_relationships(pairs, window_days, window_events, column or self.column)
 
-            cur_pair = i.pair
+    '''-----------------------------------'''
+    def clusters(self, window_days: int = 2, min_occurrences: int = 4, min_size: int = 2, max_size: int = None, column: str = None) -> list:
+        '''
+        Finds groups of tickers that keep reporting together, Ex: KO, PEP and MDLZ within 2 days, from one pass over every filing
+        instead of from the pairs.
+
+        :param window_days: The most days a member's filing can be from the filing of the cluster's seed, the ticker that filed most
+                            often, to count as reported together. Two other members can be up to 2 * window_days apart.
+        :param min_occurrences: The fewest times every ticker of a cluster must have reported together.
+        :param min_size: The fewest tickers a cluster needs.
+        :param max_size: The most tickers a cluster can have. None means no limit.
+        :param column: The return column to compare. Defaults to the one the pairs are compared on.
+        :return: The Cluster objects, most occurrences first. Each ticker is in at most one cluster.
+        '''
+        days = {}
+        values = {}
+        for t in self.tickers:
+            history = self.get_history(t)
+            days[t] = history.days
+            values[t] = history.values[column or self.column]
+
+        with stage("pairs.clusters"):
+            clusters = find_clusters(days, values, window_days, min_occurrences, min_size, max_size)
+        count("pairs.clusters", len(clusters))
+        return clusters
 
-            
-            ticker1, ticker2 = cur_pair.replace(" ","").split("-")
-            rev_cur_pair  = f"{ticker2} - {ticker1}"
+    '''-----------------------------------'''
+    def evaluate_parallel(self, workers: int, pairs: list = None):
+        # The workers only receive ticker names and return index pairs, so the filings are never pickled per pair.
+        pairs = self.pairs if pairs is None else pairs
+        histories = {}
+        for i in pairs:
+            histories[i.t1] = i.h1
+            histories[i.t2] = i.h2
 
-            for j in data:
-                
-                compare_pair = j.pair
+        jobs = [(i.t1, i.t2, i.max_days, i.min_days, i.column) for i in pairs]
 
-                if cur_pair == compare_pair:
-                    pass
-                else:
-                    if rev_cur_pair == compare_pair:
-                        self.pairs.remove(j)
+        # Results come back in the same order as the pairs, so the outcome matches the serial path exactly.
+        for pair, (matches, counts) in zip(pairs, evaluate_pairs(jobs, histories, workers)):
+            pair.set_markers(matches)
+            pair.set_relationship(*counts)
 
     '''-----------------------------------'''
-    def compare_pairs(self):
-        for i in self.pairs:
-            i.generate_markers()
-            i.calculate_relationship()
-        
-        self.organize_pairs()
-        self.delete_duplicates()
+    def compare_pairs(self, workers: int = 1, rank_by: str = "perc_pos", cache: ResultCache = None):
+        '''
+        Ranks the pairs with rank_pairs and prints them.
+
+        :param workers: The number of processes to evaluate the pairs with. 1 evaluates them in this process.
+        :param rank_by: How to order the pairs. See organize_pairs. Significance rankings use the default score_significance settings,
+                        with 1000 shuffles for "permutation_p_value".
+        :param cache: Optional ResultCache. Only the pairs it has no result for are evaluated, and their results are added to it.
+        :return: None
+        '''
+        self.rank_pairs(workers, rank_by, cache)
         for j in self.pairs:
             print(f"""\n\n-----------------------------
 [{j.pair}]
@@ -227,6 +571,40 @@ Total Negative: {j.total_neg}
 Total Markers: {j.total_markers}
 Years Searched: {j.years_searched} ({j.num_of_years-1} years)""")
 
+    '''-----------------------------------'''
+    def rank_pairs(self, workers: int = 1, rank_by: str = "perc_pos", cache: ResultCache = None):
+        '''
+        Evaluates every pair, then orders them and removes duplicates. The same as compare_pairs, without printing.
+
+        :return: The ranked pairs.
+        '''
+        pairs = self.pairs
+        if cache is not None:
+            with stage("pairs.result_cache"):
+                pairs = cache.load(self.pairs)
+
+        with stage("pairs.evaluate"):
+            if workers > 1:
+                self.evaluate_parallel(workers, pairs)
+            else:
+                for i in pairs:
+                    i.generate_markers()
+                    i.calculate_relationship()
+        if tracer.enabled:
+            count("pairs.evaluated", len(pairs))
+            count("pairs.markers", sum(len(i.matches) for i in pairs))
+
+        if cache is not None:
+            with stage("pairs.result_cache"):
+                cache.store(pairs)
+        
+        if rank_by != "perc_pos":
+            self.score_significance(permutations=1000 if rank_by == "permutation_p_value" else 0)
+        with stage("pairs.rank"):
+            self.organize_pairs(rank_by)
+            self.delete_duplicates()
+        return self.pairs
+
         
 
     '''-----------------------------------'''
@@ -0,0 +1,146 @@
+from collections.abc import Mapping
+
+import numpy as np
+
+from FilingStore.filingstore import FILING_TYPES, DATE_COLUMN, TYPE_COLUMN, parse_value
+
+
+
+class FilingHistory:
+    '''
+    The filings of one ticker as a struct of arrays, in ascending date order.
+
+    days holds int32 day numbers (days since 1970-01-01), types an int8 index into FILING_TYPES, and values one
+    float64 array per numeric column, with NaN where the CSV had "N/A". A filing costs a few dozen bytes instead of
+    a dict of seven strings. years() gives the old year -> list of filing dicts layout as a lazy view.
+    '''
+    # __weakref__ lets caches remember a history without keeping it alive. Ex: ResultCache
+    __slots__ = ("days", "types", "values", "__weakref__")
+
+    def __init__(self, days: np.ndarray, types: np.ndarray, values: dict) -> None:
+        self.days = days
+        self.types = types
+        # Column name -> float64 array. Ex: {"Price": ..., "1d % Change": ...}
+        self.values = values
+
+    '''-----------------------------------'''
+    @classmethod
+    def from_filing_data(cls, filing_data: dict):
+        '''
+        :param filing_data: The year -> list of filings dict returned by StockScraper.get_filing_data.
+        :return: FilingHistory object.
+        '''
+        filings = [f for year in filing_data.values() for f in year]
+        filings.sort(key=lambda x: x[DATE_COLUMN])
+
+        columns = []
+        if filings:
+            columns = [c for c in filings[0].keys() if c not in (DATE_COLUMN, TYPE_COLUMN)]
+
+        days = np.array([f[DATE_COLUMN] for f in filings], dtype="datetime64[D]").astype(np.int32)
+        types = np.array([FILING_TYPES.index(f[TYPE_COLUMN]) for f in filings], dtype=np.int8)
+        values = {}
+        for c in columns:
+            # Values read from the CSV files are strings, values from the scraper are already numbers.
+            values[c] = np.array([parse_value(f[c]) if isinstance(f[c], str) else float(f[c]) for f in filings], dtype=np.float64)
+
+        return cls(days, types, values)
+
+    '''-----------------------------------'''
+    @classmethod
+    def from_store(cls, store, ticker: str):
+        '''
+        :param store: A FilingStore.
+        :param ticker: The ticker to read.
+        :return: FilingHistory object whose arrays are views into the store's memory mapped columns.
+        '''
+        columns = store.columns(ticker)
+        return cls(columns["days"], columns["types"], {c: columns[c] for c in store.value_columns})
+
+    '''-----------------------------------'''
+    def copy(self):
+        # A history with its own arrays. Ex: to read one out of the memory mapped store into memory.
+        return FilingHistory(np.array(self.days), np.array(self.types), {c: np.array(v) for c, v in self.values.items()})
+
+    '''-----------------------------------'''
+    def __len__(self) -> int:
+        return len(self.days)
+
+    '''-----------------------------------'''
+    def dates(self) -> np.ndarray:
+        # "YYYY-MM-DD" strings.
+        return np.datetime_as_string(self.days.astype("datetime64[D]"))
+
+    '''-----------------------------------'''
+    def years_of(self) -> np.ndarray:
+        return self.days.astype("datetime64[D]").astype("datetime64[Y]").astype(np.int64) + 1970
+
+    '''-----------------------------------'''
+    def filing(self, i: int) -> dict:
+        '''
+        :param i: The position of the filing.
+        :return: The filing as a dict, in the layout of the CSV files.
+        '''
+        filing = {DATE_COLUMN: str(self.days[i].astype("datetime64[D]")),
+                  TYPE_COLUMN: FILING_TYPES[self.types[i]]}
+        for c, column in self.values.items():
+            value = column[i]
+            filing[c] = "N/A" if np.isnan(value) else float(value)
+        return filing
+
+    '''-----------------------------------'''
+    def positions(self, dates: list, types: list) -> np.ndarray:
+        '''
+        :param dates: "YYYY-MM-DD" filing dates.
+        :param types: The filing type of each date. Ex: "10-Q"
+        :return: The position of each filing. A filing listed twice with the same date and type gets its first position.
+                 Raises ValueError if one of them is not in the history.
+        '''
+        # Day and type as one sortable key, since a 10-Q and a 10-K can be filed on the same day.
+        keys = self.days.astype(np.int64) * len(FILING_TYPES) + self.types
+        wanted = (np.array(dates, dtype="datetime64[D]").astype(np.int64) * len(FILING_TYPES)
+                  + np.array([FILING_TYPES.index(t) for t in types], dtype=np.int64))
+        order = np.argsort(keys, kind="stable")
+        found = np.minimum(np.searchsorted(keys[order], wanted), max(len(keys) - 1, 0))
+        if len(wanted) and (not len(keys) or (keys[order][found] != wanted).any()):
+            raise ValueError("Some of the filings are not in the history")
+        return order[found] if len(keys) else np.empty(0, dtype=np.int64)
+
+    '''-----------------------------------'''
+    def years(self):
+        return YearView(self)
+
+    '''-----------------------------------'''
+    @property
+    def nbytes(self) -> int:
+        return self.days.nbytes + self.types.nbytes + sum(v.nbytes for v in self.values.values())
+
+
+
+class YearView(Mapping):
+    '''
+    A read-only year -> list of filings view over a FilingHistory. Years are in descending order, and so are the filings
+    in each year, the same as StockScraper.filing_data. The dicts of a year are only built when that year is accessed.
+    '''
+    def __init__(self, history: FilingHistory) -> None:
+        self.history = history
+        years = history.years_of()
+        # Year -> positions of its filings, newest first.
+        self.positions = {}
+        for i in range(len(years) - 1, -1, -1):
+            self.positions.setdefault(str(years[i]), []).append(i)
+        self.cache = {}
+
+    '''-----------------------------------'''
+    def __getitem__(self, year: str) -> list:
+        if year not in self.cache:
+            self.cache[year] = [self.history.filing(i) for i in self.positions[year]]
+        return self.cache[year]
+
+    '''-----------------------------------'''
+    def __iter__(self):
+        return iter(self.positions)
+
+    '''-----------------------------------'''
+    def __len__(self) -> int:
+        return len(self.positions)
@@ -0,0 +1,106 @@
+from collections import OrderedDict
+
+from EarningsPairs.filinghistory import FilingHistory
+from Instrumentation.instrumentation import count
+
+
+# The memory budget of the histories when none is given.
+DEFAULT_CACHE_BYTES = 256 * 2**20
+
+
+class HistoryCache:
+    '''
+    Loads ticker histories on demand and keeps the most recently used ones, up to a memory budget.
+
+    The budget is measured with FilingHistory.nbytes. The history just loaded is always kept, even when it alone is over
+    the budget, so a lookup never fails because of it.
+    '''
+    def __init__(self, loader, max_bytes: int, on_load=None) -> None:
+        '''
+        :param loader: Called with a ticker, returns its FilingHistory.
+        :param max_bytes: The memory budget of the cached histories.
+        :param on_load: Optional. Called with (ticker, history) after each load, Ex: to add columns computed earlier.
+        '''
+        self.loader = loader
+        self.max_bytes = max_bytes
+        self.on_load = on_load
+
+        # Ticker -> FilingHistory, least recently used first.
+        self.histories = OrderedDict()
+        # Ticker -> the bytes its history was counted with, so a history that grew is taken off the total with its counted size.
+        self.sizes = {}
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    '''-----------------------------------'''
+    def get(self, ticker: str) -> FilingHistory:
+        history = self.histories.get(ticker)
+        if history is not None:
+            self.histories.move_to_end(ticker)
+            self.hits += 1
+            count("history_cache.hits")
+            return history
+
+        self.misses += 1
+        count("history_cache.misses")
+        history = self.loader(ticker)
+        if self.on_load is not None:
+            self.on_load(ticker, history)
+
+        self.histories[ticker] = history
+        self.sizes[ticker] = history.nbytes
+        self.nbytes += self.sizes[ticker]
+        self.evict()
+        return history
+
+    '''-----------------------------------'''
+    def resize(self, ticker: str) -> None:
+        # Counts a cached history again after it was changed in place, Ex: columns were added to it, and evicts if it is now over budget.
+        if ticker not in self.histories:
+            return
+        size = self.histories[ticker].nbytes
+        self.nbytes += size - self.sizes[ticker]
+        self.sizes[ticker] = size
+        # The resized history is the most recently used, so it is the one kept.
+        self.histories.move_to_end(ticker)
+        self.evict()
+
+    '''-----------------------------------'''
+    def evict(self) -> None:
+        # Drop the least recently used histories until the budget holds, always keeping the newest one.
+        while self.nbytes > self.max_bytes and len(self.histories) > 1:
+            ticker, history = self.histories.popitem(last=False)
+            self.nbytes -= self.sizes.pop(ticker)
+            self.evictions += 1
+            count("history_cache.evictions")
+
+    '''-----------------------------------'''
+    def __contains__(self, ticker: str) -> bool:
+        return ticker in self.histories
+
+    '''-----------------------------------'''
+    def __len__(self) -> int:
+        return len(self.histories)
+
+
+
+'''----------------------------------- Ordering -----------------------------------'''
+'''-----------------------------------'''
+def blocked_order(pairs: list, tickers: list, block_size: int) -> list:
+    '''
+    :param pairs: (ticker1, ticker2) pairs.
+    :param tickers: Every ticker, in the order that defines the blocks.
+    :param block_size: Tickers per block. Two blocks' histories should fit in the cache at once.
+    :return: The pairs grouped by (block of ticker1, block of ticker2), so the histories a group needs are loaded once
+             and stay cached while every pair between the two blocks is evaluated.
+    '''
+    rank = {ticker: i for i, ticker in enumerate(tickers)}
+    block_size = max(1, block_size)
+
+    def key(pair):
+        first, second = sorted((rank[pair[0]], rank[pair[1]]))
+        return (first // block_size, second // block_size, first, second)
+
+    return sorted(pairs, key=key)
@@ -0,0 +1,27 @@
+'''----------------------------------- Matching -----------------------------------'''
+'''-----------------------------------'''
+def match_filings(days1: list, days2: list, max_days: int = 1, min_days: int = 0) -> list:
+    '''
+    :param days1: Ascending day numbers of the first ticker's filings.
+    :param days2: Ascending day numbers of the second ticker's filings.
+    :param max_days: The largest number of days allowed between two filings.
+    :param min_days: The smallest number of days allowed between two filings. 0 includes same day reports.
+    :return: (i, j) index pairs of every days1[i], days2[j] within the window, in ascending order.
+    '''
+    matches = []
+    # The first filing of ticker 2 that can still be in the window of the current filing of ticker 1.
+    low = 0
+    num_days2 = len(days2)
+
+    # Both lists are sorted, so the start of the window only ever moves forward.
+    for i, day in enumerate(days1):
+        while low < num_days2 and days2[low] < day - max_days:
+            low += 1
+
+        j = low
+        while j < num_days2 and days2[j] <= day + max_days:
+            if abs(days2[j] - day) >= min_days:
+                matches.append((i, j))
+            j += 1
+
+    return matches
@@ -0,0 +1,58 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from EarningsPairs.matching import match_filings
+from EarningsPairs.scoring import count_relationships
+
+
+# Ticker -> FilingHistory. Set once in each worker process by init_worker and only ever read after that.
+shared_histories = {}
+
+
+
+'''----------------------------------- Worker -----------------------------------'''
+'''-----------------------------------'''
+def init_worker(histories: dict) -> None:
+    global shared_histories
+    shared_histories = histories
+
+'''-----------------------------------'''
+def evaluate_shard(shard: list) -> list:
+    '''
+    :param shard: (ticker1, ticker2, max_days, min_days, column) for each pair in the shard.
+    :return: (matches, (positive, negative, invalid)) for each pair, in the same order.
+    '''
+    results = []
+    for t1, t2, max_days, min_days, column in shard:
+        h1 = shared_histories[t1]
+        h2 = shared_histories[t2]
+
+        matches = np.asarray(match_filings(h1.days.tolist(), h2.days.tolist(), max_days, min_days), dtype=np.int32).reshape(-1, 2)
+        counts = count_relationships(h1.values[column][matches[:, 0]], h2.values[column][matches[:, 1]])
+        results.append((matches, counts))
+    return results
+
+'''----------------------------------- Pool -----------------------------------'''
+'''-----------------------------------'''
+def evaluate_pairs(jobs: list, histories: dict, workers: int, shards_per_worker: int = 4) -> list:
+    '''
+    :param jobs: (ticker1, ticker2, max_days, min_days, column) for each pair.
+    :param histories: Ticker -> FilingHistory for every ticker in jobs. Handed to each worker once, when it starts.
+    :param workers: The number of worker processes.
+    :param shards_per_worker: How many contiguous shards each worker gets on average. More shards balance the load better.
+    :return: (matches, (positive, negative, invalid)) for each job, in the same order as jobs.
+    '''
+    if not jobs:
+        return []
+
+    num_shards = min(len(jobs), workers * shards_per_worker)
+    shard_size = -(-len(jobs) // num_shards)
+    shards = [jobs[i:i + shard_size] for i in range(0, len(jobs), shard_size)]
+
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(histories,)) as executor:
+        # map returns the shards in submission order, regardless of which worker finishes first.
+        for shard_results in executor.map(evaluate_shard, shards):
+            results.extend(shard_results)
+    return results
@@ -0,0 +1,207 @@
+import hashlib
+import json
+import os
+import sqlite3
+import weakref
+
+import numpy as np
+
+from EarningsPairs.filinghistory import FilingHistory
+from Instrumentation.instrumentation import count
+
+
+# Bumped whenever matching or scoring changes, so results of older code are not reused.
+RESULT_VERSION = 1
+# The size budget of the cached results when none is given.
+DEFAULT_MAX_BYTES = 512 * 2**20
+# The bytes counted for each row on top of its matches, for the keys and counts.
+ROW_OVERHEAD = 200
+
+
+
+'''----------------------------------- Keys -----------------------------------'''
+'''-----------------------------------'''
+def history_digest(history: FilingHistory, column: str) -> str:
+    '''
+    :return: The sha256 of everything a pair's result depends on in one history: its filing days and the compared column.
+             It changes whenever the history is refreshed with new filings or backfilled % changes.
+    '''
+    digest = hashlib.sha256()
+    digest.update(np.ascontiguousarray(history.days, dtype=np.int32).tobytes())
+    digest.update(column.encode("utf-8") + b"\0")
+    digest.update(np.ascontiguousarray(history.values[column], dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+
+
+class ResultCache:
+    '''
+    Keeps the markers and relationship of each pair in a SQLite file, so pairs whose filings have not changed are not evaluated again.
+
+    A result is keyed by the unordered pair, the matching parameters and the history_digest of both tickers. Refreshing a ticker
+    changes its digest, so its old results are never used again and are deleted the next time the ticker is looked up.
+    When the results grow over max_bytes, the least recently used ones are evicted.
+    '''
+    def __init__(self, path: str, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        '''
+        :param path: The SQLite file. It is created if it does not exist.
+        :param max_bytes: The size budget of the cached results.
+        '''
+        self.path = path
+        self.max_bytes = max_bytes
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self.connection = sqlite3.connect(path)
+        with self.connection:
+            self.connection.execute("""CREATE TABLE IF NOT EXISTS results (
+                                           key TEXT PRIMARY KEY,
+                                           t1 TEXT, d1 TEXT, t2 TEXT, d2 TEXT, field TEXT, params TEXT,
+                                           positive INTEGER, negative INTEGER, invalid INTEGER,
+                                           matches BLOB, size INTEGER, used INTEGER)""")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS results_t1 ON results (t1)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS results_t2 ON results (t2)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS results_used ON results (used)")
+
+        # (Ticker, column) -> (weak reference to the history, number of filings, digest), for the histories already checked by this
+        # cache. A refreshed history, which is a new object or has more filings, is hashed again instead of reusing the old digest.
+        # The reference is weak, so histories evicted from a HistoryCache are not kept alive. They are hashed again if reloaded.
+        self.digests = {}
+        self.hits = 0
+        self.misses = 0
+
+    '''-----------------------------------'''
+    def params(self, pair) -> str:
+        return json.dumps({"version": RESULT_VERSION, "max_days": pair.max_days, "min_days": pair.min_days, "column": pair.column},
+                          sort_keys=True)
+
+    '''-----------------------------------'''
+    def digest(self, ticker: str, history: FilingHistory, column: str) -> str:
+        # Each version of a history is hashed once. Results of an older version of the history are deleted the first time it is seen.
+        known = self.digests.get((ticker, column))
+        if known is not None and known[0]() is history and known[1] == len(history.days):
+            return known[2]
+        digest = history_digest(history, column)
+        if known is None or known[2] != digest:
+            self.invalidate(ticker, digest, column)
+        self.digests[(ticker, column)] = (weakref.ref(history), len(history.days), digest)
+        return digest
+
+    '''-----------------------------------'''
+    def entry(self, pair) -> tuple:
+        '''
+        :return: (key, t1, d1, t2, d2, column, params, swapped). The tickers are in sorted order, so "KO - PEP" and "PEP - KO" share a result.
+        '''
+        params = self.params(pair)
+        first = (pair.t1, self.digest(pair.t1, pair.h1, pair.column))
+        second = (pair.t2, self.digest(pair.t2, pair.h2, pair.column))
+        swapped = pair.t1 > pair.t2
+        if swapped:
+            first, second = second, first
+        key = hashlib.sha256("\0".join([first[0], first[1], second[0], second[1], params]).encode("utf-8")).hexdigest()
+        return key, first[0], first[1], second[0], second[1], pair.column, params, swapped
+
+    '''----------------------------------- Lookups -----------------------------------'''
+    '''-----------------------------------'''
+    def load(self, pairs: list) -> list:
+        '''
+        Sets the markers and relationship of every pair that has a cached result.
+
+        :param pairs: The pairs to look up.
+        :return: The pairs without a cached result, in the same order. Evaluate them, then pass them to store.
+        '''
+        entries = [self.entry(pair) for pair in pairs]
+        found = {}
+        keys = [entry[0] for entry in entries]
+        # SQLite limits the number of parameters of a statement, so the keys are looked up in batches.
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            rows = self.connection.execute(f"SELECT key, positive, negative, invalid, matches FROM results WHERE key IN ({','.join('?' * len(batch))})",
+                                           batch)
+            found.update((row[0], row[1:]) for row in rows)
+
+        missing = []
+        for pair, entry in zip(pairs, entries):
+            result = found.get(entry[0])
+            if result is None:
+                missing.append(pair)
+                continue
+            positive, negative, invalid, matches = result
+            matches = np.frombuffer(matches, dtype=np.int32).reshape(-1, 2)
+            # Results are stored in sorted ticker order, so a pair listed the other way around gets its columns swapped.
+            pair.set_markers(matches[:, ::-1] if entry[7] else matches)
+            pair.set_relationship(positive, negative, invalid)
+
+        self.hits += len(pairs) - len(missing)
+        self.misses += len(missing)
+        count("result_cache.hits", len(pairs) - len(missing))
+        count("result_cache.misses", len(missing))
+
+        with self.connection:
+            used = self.next_use()
+            self.connection.executemany("UPDATE results SET used = ? WHERE key = ?", [(used, key) for key in found])
+        return missing
+
+    '''-----------------------------------'''
+    def store(self, pairs: list) -> None:
+        '''
+        :param pairs: Evaluated pairs. Their markers must not have been dropped yet.
+        '''
+        rows = []
+        for pair in pairs:
+            key, t1, d1, t2, d2, column, params, swapped = self.entry(pair)
+            matches = pair.matches[:, ::-1] if swapped else pair.matches
+            matches = np.ascontiguousarray(matches, dtype=np.int32).tobytes()
+            invalid = len(pair.matches) - pair.total_markers
+            rows.append((key, t1, d1, t2, d2, column, params, pair.total_pos, pair.total_neg, invalid, matches, len(matches) + ROW_OVERHEAD))
+
+        with self.connection:
+            used = self.next_use()
+            self.connection.executemany("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                        [row + (used,) for row in rows])
+        self.evict()
+
+    '''----------------------------------- Maintenance -----------------------------------'''
+    '''-----------------------------------'''
+    def invalidate(self, ticker: str, digest: str, column: str) -> None:
+        # Deletes the results computed from any other version of the ticker's history for the column.
+        with self.connection:
+            deleted = self.connection.execute("DELETE FROM results WHERE field = ? AND ((t1 = ? AND d1 != ?) OR (t2 = ? AND d2 != ?))",
+                                              (column, ticker, digest, ticker, digest)).rowcount
+        count("result_cache.invalidated", deleted)
+
+    '''-----------------------------------'''
+    def evict(self) -> None:
+        # Drops the least recently used results until the cache is within its budget.
+        total = self.nbytes
+        if total <= self.max_bytes:
+            return
+
+        evicted = []
+        for key, size in self.connection.execute("SELECT key, size FROM results ORDER BY used"):
+            if total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+
+        with self.connection:
+            self.connection.executemany("DELETE FROM results WHERE key = ?", evicted)
+        count("result_cache.evictions", len(evicted))
+
+    '''-----------------------------------'''
+    def next_use(self) -> int:
+        # Uses are numbered in order, so the least recently used results have the lowest number.
+        return self.connection.execute("SELECT COALESCE(MAX(used), 0) + 1 FROM results").fetchone()[0]
+
+    '''-----------------------------------'''
+    @property
+    def nbytes(self) -> int:
+        return self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+
+    '''-----------------------------------'''
+    def __len__(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    '''-----------------------------------'''
+    def close(self) -> None:
+        self.connection.close()
@@ -0,0 +1,100 @@
+import csv
+import json
+
+
+# The fields written for each pair. The significance fields are empty unless EarningsPairs.score_significance has run.
+PAIR_FIELDS = ["pair", "t1", "t2", "total_pos", "total_neg", "perc_pos", "perc_neg", "total_markers", "years_searched",
+               "p_value", "lower_bound", "permutation_p_value"]
+
+# The fields written for each cluster found by EarningsPairs.clusters.
+CLUSTER_FIELDS = ["name", "tickers", "occurrences", "total_markers", "total_same", "total_mixed", "perc_same", "mean_perc_pos",
+                  "mean_pearson", "mean_change", "years_searched"]
+
+# The fields pairs can be ranked by -> True when higher values rank first.
+RANKINGS = {"perc_pos": True,
+            "lower_bound": True,
+            "p_value": False,
+            "permutation_p_value": False}
+
+
+
+'''----------------------------------- Records -----------------------------------'''
+'''-----------------------------------'''
+def pair_record(pair, include_markers: bool = False) -> dict:
+    '''
+    :param pair: A scored Pair.
+    :param include_markers: Add the date and the compared % changes of each marker.
+    :return: The pair as a plain dict.
+    '''
+    record = {field: getattr(pair, field) for field in PAIR_FIELDS}
+    if include_markers:
+        record["markers"] = [{"Date1": m["Date1"],
+                              "Date2": m["Date2"],
+                              "Change1": m["Data1"][pair.column],
+                              "Change2": m["Data2"][pair.column]}
+                             for m in pair.get_markers()]
+    return record
+
+'''-----------------------------------'''
+def cluster_record(cluster, include_dates: bool = False) -> dict:
+    '''
+    :param cluster: A Cluster.
+    :param include_dates: Add the date of each time the cluster reported together.
+    :return: The cluster as a plain dict. Write it with write_records.
+    '''
+    record = {field: getattr(cluster, field) for field in CLUSTER_FIELDS}
+    record["tickers"] = " ".join(cluster.tickers)
+    if include_dates:
+        record["dates"] = cluster.dates().tolist()
+    return record
+
+'''----------------------------------- Writing -----------------------------------'''
+'''-----------------------------------'''
+def write_results(pairs: list, path: str, include_markers: bool = False) -> None:
+    '''
+    :param pairs: The scored pairs, in the order to write them.
+    :param path: A .csv or .json file. Markers are only written to JSON files.
+    :param include_markers: Add the markers of each pair.
+    :return: None
+    '''
+    write_records([pair_record(p, include_markers and path.endswith(".json")) for p in pairs], path)
+
+'''-----------------------------------'''
+def write_records(records: list, path: str, fields: list = PAIR_FIELDS) -> None:
+    '''
+    :param records: Pair records, as returned by pair_record.
+    :param path: A .csv or .json file. The CSV only holds the fields.
+    :param fields: The CSV columns. Ex: CLUSTER_FIELDS for cluster records.
+    :return: None
+    '''
+    if path.endswith(".json"):
+        with open(path, 'w') as file:
+            json.dump(records, file, indent=2)
+    elif path.endswith(".csv"):
+        with open(path, 'w', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=fields, extrasaction="ignore")
+            writer.writeheader()
+            for record in records:
+                writer.writerow(record)
+    else:
+        raise ValueError(f"Unsupported results file: {path}. Use .csv or .json")
+
+'''-----------------------------------'''
+def read_records(path: str) -> list:
+    # The records of a JSON results file.
+    with open(path, 'r') as file:
+        return json.load(file)
+
+'''----------------------------------- Ranking -----------------------------------'''
+'''-----------------------------------'''
+def rank_records(records: list, rank_by: str = "perc_pos") -> list:
+    '''
+    :param records: Pair records.
+    :param rank_by: A field of RANKINGS.
+    :return: The records, best first. The sort is stable, so ties keep their order.
+    '''
+    if rank_by not in RANKINGS:
+        raise ValueError(f"Unknown ranking: {rank_by}")
+    if any(r.get(rank_by) is None for r in records):
+        raise ValueError(f"The pairs have no {rank_by}. Run score_significance first")
+    return sorted(records, key=lambda x: x[rank_by], reverse=RANKINGS[rank_by])
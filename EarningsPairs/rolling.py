@@ -0,0 +1,142 @@
+from collections import deque
+
+import numpy as np
+
+
+'''----------------------------------- Events -----------------------------------'''
+'''-----------------------------------'''
+def marker_events(pairs: list, column: str = "1d % Change") -> tuple:
+    '''
+    :param pairs: Pairs whose markers have been generated.
+    :param column: The return column to compare.
+    :return: (days, pair_ids, changes1, changes2) of every valid marker across all pairs, sorted by day. A marker is dated by
+             the later of its two filings, the day it became known.
+    '''
+    days = []
+    pair_ids = []
+    changes1 = []
+    changes2 = []
+    for pair_id, pair in enumerate(pairs):
+        first = pair.matches[:, 0]
+        second = pair.matches[:, 1]
+        days.append(np.maximum(pair.h1.days[first], pair.h2.days[second]))
+        pair_ids.append(np.full(len(first), pair_id, dtype=np.int64))
+        changes1.append(pair.h1.values[column][first])
+        changes2.append(pair.h2.values[column][second])
+
+    if not pairs:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0), np.empty(0)
+
+    days = np.concatenate(days).astype(np.int64)
+    pair_ids = np.concatenate(pair_ids)
+    changes1 = np.concatenate(changes1)
+    changes2 = np.concatenate(changes2)
+
+    # "N/A" markers never count towards a relationship, so they are left out of the stream.
+    valid = ~(np.isnan(changes1) | np.isnan(changes2))
+    order = np.argsort(days[valid], kind="stable")
+    return days[valid][order], pair_ids[valid][order], changes1[valid][order], changes2[valid][order]
+
+'''----------------------------------- Rolling Window -----------------------------------'''
+'''-----------------------------------'''
+def rolling_relationships(pairs: list, window_days: int = None, window_events: int = None, column: str = "1d % Change") -> dict:
+    '''
+    :param pairs: Pairs whose markers have been generated.
+    :param window_days: Trailing window in calendar days. Ex: 365 * 5 for 5 years.
+    :param window_events: Trailing window in markers, per pair. Can be combined with window_days.
+    :param column: The return column to compare.
+    :return: Dict of arrays, one row each time a pair's window changes: "date", "pair" (index into "pairs"), "perc_pos",
+             "total_markers" and "correlation" (Pearson of the two tickers' changes in the window, NaN with fewer than 2 markers).
+             "pairs" holds the pair names.
+    '''
+    days, pair_ids, changes1, changes2 = marker_events(pairs, column)
+    num_pairs = len(pairs)
+
+    # Running sums for every pair. Markers are added as they enter the window and subtracted as they leave it,
+    # so nothing is recomputed from scratch.
+    count = np.zeros(num_pairs, dtype=np.int64)
+    positive = np.zeros(num_pairs, dtype=np.int64)
+    sum_x = np.zeros(num_pairs)
+    sum_y = np.zeros(num_pairs)
+    sum_xx = np.zeros(num_pairs)
+    sum_yy = np.zeros(num_pairs)
+    sum_xy = np.zeros(num_pairs)
+
+    def update(event: int, sign: int) -> None:
+        p = pair_ids[event]
+        x = changes1[event]
+        y = changes2[event]
+        count[p] += sign
+        # The same classification as count_relationships: a change of 0 counts as an increase.
+        positive[p] += sign * int((x >= 0) == (y >= 0))
+        sum_x[p] += sign * x
+        sum_y[p] += sign * y
+        sum_xx[p] += sign * x * x
+        sum_yy[p] += sign * y * y
+        sum_xy[p] += sign * x * y
+
+    # Markers in the window, in the order they entered. One queue for the whole universe when the window is in days,
+    # and one per pair when it is in markers.
+    in_window = deque()
+    per_pair = [deque() for i in range(num_pairs)] if window_events is not None else None
+    # Markers already removed through the per pair queue, so the day queue skips them.
+    removed = np.zeros(len(days), dtype=bool)
+
+    rows = {"date": [], "pair": [], "perc_pos": [], "total_markers": [], "correlation": []}
+
+    event = 0
+    num_events = len(days)
+    while event < num_events:
+        day = days[event]
+        touched = set()
+
+        # Every marker reported on this day enters together.
+        while event < num_events and days[event] == day:
+            p = pair_ids[event]
+            update(event, 1)
+            touched.add(p)
+            if window_days is not None:
+                in_window.append(event)
+            if per_pair is not None:
+                per_pair[p].append(event)
+                if len(per_pair[p]) > window_events:
+                    old = per_pair[p].popleft()
+                    update(old, -1)
+                    removed[old] = True
+            event += 1
+
+        # Markers older than the window leave it.
+        if window_days is not None:
+            while in_window and days[in_window[0]] <= day - window_days:
+                old = in_window.popleft()
+                if not removed[old]:
+                    update(old, -1)
+                    removed[old] = True
+                    touched.add(pair_ids[old])
+                    if per_pair is not None:
+                        per_pair[pair_ids[old]].popleft()
+
+        for p in sorted(touched):
+            rows["date"].append(day)
+            rows["pair"].append(p)
+            rows["total_markers"].append(count[p])
+            rows["perc_pos"].append(round(positive[p] / count[p] * 100, 2) if count[p] else 0.0)
+            rows["correlation"].append(correlation(count[p], sum_x[p], sum_y[p], sum_xx[p], sum_yy[p], sum_xy[p]))
+
+    return {"pairs": [p.pair for p in pairs],
+            "date": np.asarray(rows["date"], dtype=np.int64).astype("datetime64[D]"),
+            "pair": np.asarray(rows["pair"], dtype=np.int64),
+            "perc_pos": np.asarray(rows["perc_pos"], dtype=np.float64),
+            "total_markers": np.asarray(rows["total_markers"], dtype=np.int64),
+            "correlation": np.asarray(rows["correlation"], dtype=np.float64)}
+
+'''-----------------------------------'''
+def correlation(n: int, sum_x: float, sum_y: float, sum_xx: float, sum_yy: float, sum_xy: float) -> float:
+    # Pearson correlation from running sums. NaN with fewer than 2 markers or no variance.
+    if n < 2:
+        return np.nan
+    cov = n * sum_xy - sum_x * sum_y
+    var = (n * sum_xx - sum_x ** 2) * (n * sum_yy - sum_y ** 2)
+    if var <= 0:
+        return np.nan
+    return float(min(1.0, max(-1.0, cov / np.sqrt(var))))
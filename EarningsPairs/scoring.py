@@ -0,0 +1,23 @@
+import numpy as np
+
+
+'''----------------------------------- Relationship Scoring -----------------------------------'''
+'''-----------------------------------'''
+def count_relationships(changes1: np.ndarray, changes2: np.ndarray) -> tuple:
+    '''
+    :param changes1: The % change of ticker 1 at each marker. NaN where it is "N/A".
+    :param changes2: The % change of ticker 2 at each marker.
+    :return: (positive, negative, invalid) marker counts.
+    '''
+    # Invalid markers are usually ones close to the current date. This is because the have not had a trading day, and therefore not enough price data. 
+    valid = ~(np.isnan(changes1) | np.isnan(changes2))
+
+    # It is considered positive if the stock price of both companies moved in the same direction with the marker period. A change of 0 counts as an increase.
+    # It is considered negative if the stock price performed opposite of each other in the marker period. 
+    same_direction = (changes1 >= 0) == (changes2 >= 0)
+
+    positive = int(np.count_nonzero(valid & same_direction))
+    negative = int(np.count_nonzero(valid & ~same_direction))
+    invalid = len(valid) - positive - negative
+
+    return positive, negative, invalid
@@ -0,0 +1,139 @@
+from statistics import NormalDist
+
+import numpy as np
+
+
+# The most random draws held at once by the resampling tests. Larger universes are processed in batches of resamples.
+MAX_BATCH_ELEMENTS = 20_000_000
+
+
+
+'''----------------------------------- Analytic -----------------------------------'''
+'''-----------------------------------'''
+def binomial_p_values(successes, trials, base_rate: float = 0.5) -> np.ndarray:
+    '''
+    :param successes: Agreeing markers of each pair.
+    :param trials: Valid markers of each pair.
+    :param base_rate: The chance of two tickers agreeing by luck alone.
+    :return: One sided p-value of each pair, P(X >= successes) for X ~ Binomial(trials, base_rate). 1.0 for pairs without markers.
+    '''
+    # A base rate of 0 or 1 makes every outcome but one impossible, and its log is not finite.
+    if not 0 < base_rate < 1:
+        raise ValueError(f"base_rate must be between 0 and 1, exclusive, got {base_rate}")
+    successes = np.asarray(successes, dtype=np.int64)
+    trials = np.asarray(trials, dtype=np.int64)
+    if len(trials) == 0:
+        return np.empty(0)
+
+    max_trials = int(trials.max())
+    # log(k!) for every k up to the largest pair.
+    log_factorial = np.concatenate([[0.0], np.cumsum(np.log(np.arange(1, max_trials + 1)))])
+
+    # The binomial probability of every outcome k of every pair, as one pairs x outcomes matrix.
+    k = np.arange(max_trials + 1)
+    n = trials[:, None]
+    possible = k[None, :] <= n
+    with np.errstate(divide="ignore", invalid="ignore"):
+        log_pmf = (log_factorial[trials][:, None]
+                   - log_factorial[k][None, :]
+                   - log_factorial[np.where(possible, n - k[None, :], 0)]
+                   + k[None, :] * np.log(base_rate)
+                   + (n - k[None, :]) * np.log1p(-base_rate))
+    pmf = np.where(possible & (k[None, :] >= successes[:, None]), np.exp(log_pmf), 0.0)
+
+    return np.minimum(pmf.sum(axis=1), 1.0)
+
+'''-----------------------------------'''
+def wilson_lower_bounds(successes, trials, confidence: float = 0.95) -> np.ndarray:
+    '''
+    :return: The lower end of the Wilson score interval of each pair's agreement rate, in %. A pair with 3/3 agreeing markers scores
+             far lower than one with 45/60. 0.0 for pairs without markers.
+    '''
+    successes = np.asarray(successes, dtype=np.float64)
+    trials = np.asarray(trials, dtype=np.float64)
+    z = NormalDist().inv_cdf(1 - (1 - confidence) / 2)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rate = successes / trials
+        center = rate + z ** 2 / (2 * trials)
+        margin = z * np.sqrt(rate * (1 - rate) / trials + z ** 2 / (4 * trials ** 2))
+        bound = (center - margin) / (1 + z ** 2 / trials)
+
+    return np.where(trials > 0, np.round(bound * 100, 2), 0.0)
+
+'''----------------------------------- Resampling -----------------------------------'''
+'''-----------------------------------'''
+def direction_counts(changes: list) -> tuple:
+    '''
+    :param changes: (changes1, changes2) arrays for each pair. NaN marks an "N/A" change.
+    :return: (trials, up1, up2, agree). Per pair, the valid markers, how many of them each ticker moved up on, and how many agreed.
+    '''
+    counts = np.zeros((len(changes), 4), dtype=np.int64)
+    for row, (c1, c2) in enumerate(changes):
+        valid = ~(np.isnan(c1) | np.isnan(c2))
+        # The same classification as count_relationships: a change of 0 counts as an increase.
+        up1 = c1[valid] >= 0
+        up2 = c2[valid] >= 0
+        counts[row] = (len(up1), up1.sum(), up2.sum(), (up1 == up2).sum())
+    return tuple(counts.T)
+
+'''-----------------------------------'''
+def batches(total: int, num_pairs: int):
+    # Sizes of the resample batches, so no more than MAX_BATCH_ELEMENTS draws are held at once.
+    size = max(1, MAX_BATCH_ELEMENTS // max(num_pairs, 1))
+    for done in range(0, total, size):
+        yield min(size, total - done)
+
+'''-----------------------------------'''
+def permutation_p_values(changes: list, num_permutations: int = 1000, seed: int = 0) -> np.ndarray:
+    '''
+    :param changes: (changes1, changes2) arrays for each pair. NaN marks an "N/A" change.
+    :param num_permutations: How many times the event dates of the second ticker are shuffled.
+    :param seed: The seed of the random generator, so results are reproducible.
+    :return: The share of shuffles that agree at least as often as the real data, for each pair. 1.0 for pairs without markers.
+    '''
+    trials, up1, up2, observed = direction_counts(changes)
+    rng = np.random.default_rng(seed)
+
+    # Shuffling the second ticker's moves only changes how many of its ups land on the first ticker's ups, which is hypergeometric.
+    # Drawing that overlap directly runs every shuffle of every pair in one call instead of sorting each pair's markers.
+    as_extreme = np.zeros(len(trials), dtype=np.int64)
+    for batch in batches(num_permutations, len(trials)):
+        both_up = rng.hypergeometric(up2, trials - up2, up1, size=(batch, len(trials)))
+        agree = trials - up1 - up2 + 2 * both_up
+        as_extreme += (agree >= observed).sum(axis=0)
+
+    return (as_extreme + 1) / (num_permutations + 1)
+
+'''-----------------------------------'''
+def bootstrap_lower_bounds(successes, trials, num_resamples: int = 1000, confidence: float = 0.95, seed: int = 0) -> np.ndarray:
+    '''
+    :param successes: Agreeing markers of each pair.
+    :param trials: Valid markers of each pair.
+    :param num_resamples: How many times the markers of each pair are resampled with replacement. 0 gives every pair a bound of 0.0.
+    :param confidence: The one sided confidence of the bound.
+    :param seed: The seed of the random generator, so results are reproducible.
+    :return: The bootstrap lower bound of each pair's agreement rate, in %. 0.0 for pairs without markers. A pair whose markers all
+             agree resamples to 100% every time, which is why the Wilson bound is the default.
+    '''
+    if num_resamples < 0:
+        raise ValueError(f"num_resamples must be at least 0, got {num_resamples}")
+    successes = np.asarray(successes, dtype=np.int64)
+    trials = np.asarray(trials, dtype=np.int64)
+    # Without resamples there is no bound to estimate.
+    if num_resamples == 0:
+        return np.zeros(len(trials))
+    rng = np.random.default_rng(seed)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rate = np.where(trials > 0, successes / trials, 0.0)
+
+    # Resampling a pair's markers with replacement draws its agreeing markers from Binomial(trials, rate), for every pair at once.
+    rates = []
+    for batch in batches(num_resamples, len(trials)):
+        rates.append(rng.binomial(trials, rate, size=(batch, len(trials))))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rates = np.concatenate(rates) / trials
+
+    bounds = np.quantile(rates, 1 - confidence, axis=0)
+    return np.where(trials > 0, np.round(bounds * 100, 2), 0.0)
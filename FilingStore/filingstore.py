@@ -0,0 +1,203 @@
+import csv
+import json
+import os
+import re
+
+import numpy as np
+
+
+# The filing types kept by the scraper. Stored as a small integer code per row.
+FILING_TYPES = ["10-Q", "10-K"]
+
+# Every store holds the filing date and type. The remaining columns are the numeric CSV columns.
+DATE_COLUMN = "Filing Date"
+TYPE_COLUMN = "Filing Type"
+
+INDEX_FILE = "index.json"
+STORE_VERSION = 1
+
+
+
+class FilingStore:
+    '''
+    A columnar store of the filing records for many tickers.
+
+    Each column is a single NumPy file covering every ticker, with the rows of a ticker stored contiguously and
+    in ascending date order. index.json maps each ticker to its row range. Columns are memory mapped, so opening
+    a store only reads the index, and the arrays handed out for a ticker are views into the mapped files.
+    '''
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+        with open(os.path.join(self.path, INDEX_FILE), 'r') as file:
+            self.index = json.load(file)
+
+        if self.index["version"] != STORE_VERSION:
+            raise ValueError(f"Unsupported filing store version: {self.index['version']}")
+
+        # Ticker -> (start row, stop row).
+        self.ranges = {ticker: tuple(bounds) for ticker, bounds in self.index["tickers"].items()}
+        self.value_columns = self.index["columns"]
+
+        # Day numbers (days since 1970-01-01) and type codes.
+        self.days = self.load_column("days")
+        self.types = self.load_column("types")
+        # Column name -> float64 array. Values that were "N/A" in the CSV are NaN.
+        self.values = {c: self.load_column(self.index["files"][c]) for c in self.value_columns}
+
+    '''-----------------------------------'''
+    def load_column(self, name: str) -> np.ndarray:
+        return np.load(os.path.join(self.path, name + ".npy"), mmap_mode="r")
+
+    '''-----------------------------------'''
+    @property
+    def tickers(self) -> list:
+        return list(self.ranges.keys())
+
+    '''-----------------------------------'''
+    def __contains__(self, ticker: str) -> bool:
+        return ticker in self.ranges
+
+    '''-----------------------------------'''
+    def __len__(self) -> int:
+        return len(self.ranges)
+
+    '''-----------------------------------'''
+    def columns(self, ticker: str) -> dict:
+        '''
+        :param ticker: The ticker to read.
+        :return: Dict of array views for the ticker: "days", "types", and one float64 array per value column.
+        '''
+        start, stop = self.ranges[ticker]
+        columns = {"days": self.days[start:stop],
+                   "types": self.types[start:stop]}
+        for c in self.value_columns:
+            columns[c] = self.values[c][start:stop]
+        return columns
+
+    '''-----------------------------------'''
+    def filing_data(self, ticker: str) -> dict:
+        '''
+        :param ticker: The ticker to read.
+        :return: The filings in the same year -> list of filings layout StockScraper.get_filing_data returns.
+        '''
+        columns = self.columns(ticker)
+        dates = np.datetime_as_string(columns["days"].astype("datetime64[D]"))
+
+        filing_data = {}
+        # Descending order, matching the CSV files.
+        for i in range(len(dates) - 1, -1, -1):
+            filing = {DATE_COLUMN: str(dates[i]),
+                      TYPE_COLUMN: FILING_TYPES[columns["types"][i]]}
+            for c in self.value_columns:
+                value = columns[c][i]
+                filing[c] = "N/A" if np.isnan(value) else float(value)
+
+            year = filing[DATE_COLUMN].split("-")[0]
+            try:
+                filing_data[year].append(filing)
+            except KeyError:
+                filing_data[year] = [filing]
+
+        return filing_data
+
+    '''-----------------------------------'''
+    def earnings_data(self, tickers: list = None) -> dict:
+        '''
+        :param tickers: The tickers to read. Defaults to every ticker in the store.
+        :return: The {ticker: [filing_data]} dict EarningsPairs expects.
+        '''
+        if tickers is None:
+            tickers = self.tickers
+        return {t: [self.filing_data(t)] for t in tickers}
+
+
+
+'''----------------------------------- Writing -----------------------------------'''
+'''-----------------------------------'''
+def column_file(column: str) -> str:
+    # Ex: "1d % Change" -> "1d_change"
+    return re.sub(r"[^0-9a-z]+", "_", column.lower().replace("%", "")).strip("_")
+
+'''-----------------------------------'''
+def parse_value(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        return np.nan
+
+'''-----------------------------------'''
+def write_store(path: str, records: dict, value_columns: list) -> FilingStore:
+    '''
+    :param path: The directory to write the store to. It is created if it does not exist.
+    :param records: Ticker -> list of filing dicts, in the layout the CSV files use.
+    :param value_columns: The numeric columns to store.
+    :return: The written store, opened for reading.
+    '''
+    os.makedirs(path, exist_ok=True)
+
+    days = []
+    types = []
+    values = {c: [] for c in value_columns}
+    ranges = {}
+
+    for ticker, filings in records.items():
+        # Store each ticker in ascending date order.
+        filings = sorted(filings, key=lambda x: x[DATE_COLUMN])
+        start = len(days)
+        for filing in filings:
+            days.append(np.datetime64(filing[DATE_COLUMN], "D").astype(np.int64))
+            types.append(FILING_TYPES.index(filing[TYPE_COLUMN]))
+            for c in value_columns:
+                value = filing.get(c, "N/A")
+                values[c].append(parse_value(value) if isinstance(value, str) else float(value))
+        ranges[ticker] = [start, len(days)]
+
+    np.save(os.path.join(path, "days.npy"), np.asarray(days, dtype=np.int32))
+    np.save(os.path.join(path, "types.npy"), np.asarray(types, dtype=np.int8))
+    files = {}
+    for c in value_columns:
+        files[c] = column_file(c)
+        np.save(os.path.join(path, files[c] + ".npy"), np.asarray(values[c], dtype=np.float64))
+
+    # The index is written last, so a store is only readable once all of its columns exist.
+    index = {"version": STORE_VERSION,
+             "rows": len(days),
+             "columns": value_columns,
+             "files": files,
+             "tickers": ranges}
+    with open(os.path.join(path, INDEX_FILE), 'w') as file:
+        json.dump(index, file)
+
+    return FilingStore(path)
+
+'''-----------------------------------'''
+def import_csv_directory(csv_dir: str, path: str) -> FilingStore:
+    '''
+    :param csv_dir: A directory of <TICKER>.csv files written by StockScraper.write_to_csv. Ex: Filing_Records
+    :param path: The directory to write the store to.
+    :return: The written store, opened for reading.
+    '''
+    records = {}
+    value_columns = None
+
+    for name in sorted(os.listdir(csv_dir)):
+        if not name.endswith(".csv"):
+            continue
+        ticker = name[:-len(".csv")]
+
+        with open(os.path.join(csv_dir, name), 'r') as file:
+            reader = csv.reader(file)
+            header = next(reader, None)
+            if header is None:
+                continue
+
+            columns = [c for c in header if c not in (DATE_COLUMN, TYPE_COLUMN)]
+            if value_columns is None:
+                value_columns = columns
+            elif columns != value_columns:
+                raise ValueError(f"{name} has the columns {columns}, expected {value_columns}")
+
+            records[ticker] = [dict(zip(header, row)) for row in reader]
+
+    return write_store(path, records, value_columns or [])
@@ -0,0 +1,241 @@
+import cProfile
+import datetime as dt
+import json
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+
+# Capture modes of a traced run.
+PROFILERS = (None, "cprofile", "pyinstrument")
+
+
+
+class NullStage:
+    '''
+    What stage() returns while tracing is off. Entering and leaving it does nothing.
+    '''
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        return None
+
+
+
+class Stage:
+    '''
+    Times one call of a stage and, when memory is tracked, the peak memory allocated during it.
+    '''
+    def __init__(self, tracer, name: str) -> None:
+        self.tracer = tracer
+        self.name = name
+        self.peak = 0
+
+    '''-----------------------------------'''
+    def __enter__(self):
+        if self.tracer.track_memory:
+            stack = self.tracer.stack()
+            current, peak = tracemalloc.get_traced_memory()
+            # The outer stage keeps the peak reached so far, since resetting it below would lose it.
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, peak)
+            tracemalloc.reset_peak()
+            self.start_bytes = current
+            stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    '''-----------------------------------'''
+    def __exit__(self, *exc) -> None:
+        seconds = time.perf_counter() - self.start
+        peak_bytes = None
+        if self.tracer.track_memory:
+            stack = self.tracer.stack()
+            stack.pop()
+            peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, peak)
+            peak_bytes = peak - self.start_bytes
+            self.tracer.peak_bytes = max(self.tracer.peak_bytes, peak)
+        self.tracer.record(self.name, seconds, peak_bytes)
+
+
+
+class Tracer:
+    '''
+    Collects stage timers and counters for one run.
+
+    Tracing is off by default. While it is off, stage() hands back a shared no-op context manager and count() returns right away,
+    so the hooks left in the hot paths cost a single attribute check.
+    Memory is tracked with tracemalloc. The peak of a stage includes the stages nested in it. With several threads tracing at once,
+    stages running at the same time share one peak, so their memory figures are approximate.
+    '''
+    def __init__(self) -> None:
+        self.enabled = False
+        self.track_memory = False
+        # True when tracemalloc was started by the tracer, so it is only stopped again in that case.
+        self.owns_tracemalloc = False
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.reset()
+
+    '''-----------------------------------'''
+    def reset(self) -> None:
+        # Stage -> {"calls", "seconds", "max_seconds", "peak_bytes"}.
+        self.stages = {}
+        # Counter -> total.
+        self.counters = {}
+        self.started = None
+        self.start = None
+        # The highest memory in use at any point of the run. Stages reset the tracemalloc peak, so it is kept here.
+        self.peak_bytes = 0
+
+    '''----------------------------------- Hooks -----------------------------------'''
+    '''-----------------------------------'''
+    def stage(self, name: str):
+        '''
+        :param name: The stage to time. Ex: "scraper.create_browser"
+        :return: A context manager timing the block it wraps.
+        '''
+        if not self.enabled:
+            return NULL_STAGE
+        return Stage(self, name)
+
+    '''-----------------------------------'''
+    def count(self, name: str, amount: int = 1) -> None:
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    '''-----------------------------------'''
+    def record(self, name: str, seconds: float, peak_bytes: int = None) -> None:
+        with self.lock:
+            stats = self.stages.setdefault(name, {"calls": 0, "seconds": 0.0, "max_seconds": 0.0, "peak_bytes": None})
+            stats["calls"] += 1
+            stats["seconds"] += seconds
+            stats["max_seconds"] = max(stats["max_seconds"], seconds)
+            if peak_bytes is not None:
+                stats["peak_bytes"] = max(stats["peak_bytes"] or 0, peak_bytes)
+
+    '''-----------------------------------'''
+    def stack(self) -> list:
+        # The stages open in the calling thread, innermost last.
+        if not hasattr(self.local, "stack"):
+            self.local.stack = []
+        return self.local.stack
+
+    '''----------------------------------- Control -----------------------------------'''
+    '''-----------------------------------'''
+    def enable(self, track_memory: bool = False) -> None:
+        self.reset()
+        self.track_memory = track_memory
+        if track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.owns_tracemalloc = True
+        self.started = dt.datetime.now().isoformat(timespec="seconds")
+        self.start = time.perf_counter()
+        self.enabled = True
+
+    '''-----------------------------------'''
+    def disable(self) -> dict:
+        '''
+        :return: The report of the run.
+        '''
+        report = self.report()
+        self.enabled = False
+        if self.owns_tracemalloc:
+            tracemalloc.stop()
+            self.owns_tracemalloc = False
+        self.track_memory = False
+        return report
+
+    '''-----------------------------------'''
+    def report(self) -> dict:
+        with self.lock:
+            stages = {name: dict(stats, seconds=round(stats["seconds"], 6), max_seconds=round(stats["max_seconds"], 6))
+                      for name, stats in self.stages.items()}
+            counters = dict(self.counters)
+
+        report = {"started": self.started,
+                  "seconds": round(time.perf_counter() - self.start, 6) if self.start is not None else 0.0,
+                  "stages": stages,
+                  "counters": counters}
+        if self.track_memory:
+            report["peak_bytes"] = max(self.peak_bytes, tracemalloc.get_traced_memory()[1])
+        return report
+
+
+
+# The tracer every module reports to.
+tracer = Tracer()
+NULL_STAGE = NullStage()
+stage = tracer.stage
+count = tracer.count
+
+
+
+'''----------------------------------- Runs -----------------------------------'''
+'''-----------------------------------'''
+@contextmanager
+def tracing(path: str, track_memory: bool = False, profiler: str = None):
+    '''
+    Traces the block it wraps. Ex:
+
+        with tracing("trace.json", track_memory=True):
+            pairs.compare_pairs()
+
+    :param path: The JSON trace file to write when the block ends.
+    :param track_memory: Record the peak memory of each stage with tracemalloc. Slows the run down.
+    :param profiler: None, "cprofile" or "pyinstrument". Also profiles the block, into <path>.prof or <path>.html.
+    :return: The tracer.
+    '''
+    if profiler not in PROFILERS:
+        raise ValueError(f"Unknown profiler: {profiler}. Use one of {PROFILERS}")
+
+    profile = start_profiler(profiler)
+    tracer.enable(track_memory)
+    try:
+        yield tracer
+    finally:
+        report = tracer.disable()
+        report["profile"] = stop_profiler(profiler, profile, path)
+        with open(path, 'w') as file:
+            json.dump(report, file, indent=2)
+
+'''-----------------------------------'''
+def start_profiler(profiler: str):
+    if profiler == "cprofile":
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+    if profiler == "pyinstrument":
+        # pyinstrument is optional. It is only needed when it is asked for.
+        try:
+            from pyinstrument import Profiler
+        except ImportError as error:
+            raise ImportError("The pyinstrument profiler needs the pyinstrument package. pip install pyinstrument") from error
+        profile = Profiler()
+        profile.start()
+        return profile
+    return None
+
+'''-----------------------------------'''
+def stop_profiler(profiler: str, profile, path: str) -> str:
+    '''
+    :return: The file the profile was written to. None without a profiler.
+    '''
+    if profiler == "cprofile":
+        profile.disable()
+        profile_path = path + ".prof"
+        profile.dump_stats(profile_path)
+        return profile_path
+    if profiler == "pyinstrument":
+        profile.stop()
+        profile_path = path + ".html"
+        with open(profile_path, 'w') as file:
+            file.write(profile.output_html())
+        return profile_path
+    return None
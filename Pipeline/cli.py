@@ -0,0 +1,161 @@
+import argparse
+import os
+
+from EarningsPairs.results import RANKINGS, rank_records, write_records
+from Instrumentation.instrumentation import PROFILERS, tracing
+from Pipeline.pipeline import DEFAULT_CACHE_DIR, StageCache, refresh, build_store, score_pairs, read_tickers
+from Scraper.scraper import default_records_dir
+from Scraper.pricecache import PriceCache
+from Scraper.snapshots import import_snapshots
+from Scraper.eventreturns import DEFAULT_WINDOWS, abnormal_column
+
+
+# The columns only added by --benchmark.
+ABNORMAL_COLUMNS = [abnormal_column(label) for label in DEFAULT_WINDOWS]
+
+
+
+'''----------------------------------- Commands -----------------------------------'''
+'''-----------------------------------'''
+def run_refresh(args) -> None:
+    tickers = list(args.tickers)
+    if args.tickers_file:
+        tickers += read_tickers(args.tickers_file)
+
+    manifest = refresh(tickers, args.records, args.cache_dir, args.workers, args.user_agent, not args.full, args.manifest)
+    failed = sorted(t for t, entry in manifest.items() if entry["status"] == "failed")
+    print(f"Refreshed {len(manifest) - len(failed)} of {len(manifest)} tickers.")
+    for ticker in failed:
+        print(f"  {ticker}: {manifest[ticker]['error']}")
+
+'''-----------------------------------'''
+def run_build_store(args) -> None:
+    store, key = build_store(StageCache(args.cache_dir), args.records)
+    print(f"Store of {len(store)} tickers: {store.path}")
+
+'''-----------------------------------'''
+def run_import_snapshots(args) -> None:
+    price_cache = PriceCache(os.path.join(args.cache_dir, "prices")) if args.prices else None
+    store = import_snapshots(args.snapshots, args.output, args.workers, price_cache, year_cutoff=args.year_cutoff)
+    print(f"Store of {len(store)} tickers: {store.path}")
+
+'''-----------------------------------'''
+def run_pairs(args) -> None:
+    records, key = pair_records(args)
+    print(f"Scored {len(records)} pairs: {StageCache(args.cache_dir).path('pairs', key)}")
+    if args.output:
+        write_records(ranked(records, args), args.output)
+        print(f"Wrote {args.output}")
+
+'''-----------------------------------'''
+def run_report(args) -> None:
+    records, key = pair_records(args)
+    records = ranked(records, args)
+    if args.output:
+        write_records(records, args.output)
+        print(f"Wrote {args.output}")
+        return
+
+    for r in records:
+        print(f"""\n\n-----------------------------
+[{r['pair']}]
+Total Positive: {r['total_pos']}
+Total Negative: {r['total_neg']}
+% Positive:  {r['perc_pos']}%
+Total Markers: {r['total_markers']}
+Years Searched: {r['years_searched']}
+P-value: {r['p_value']:.4g}
+Lower Bound:  {r['lower_bound']}%""")
+
+'''----------------------------------- Helpers -----------------------------------'''
+'''-----------------------------------'''
+def pair_records(args) -> tuple:
+    return score_pairs(StageCache(args.cache_dir), args.records, args.max_days, args.min_days, args.min_co_reports,
+                       args.base_rate, args.confidence, args.permutations, args.seed, args.workers,
+                       args.column, args.benchmark, args.model)
+
+'''-----------------------------------'''
+def ranked(records: list, args) -> list:
+    records = [r for r in records if r["total_markers"] >= args.min_markers]
+    records = rank_records(records, args.rank_by)
+    return records if args.top is None else records[:args.top]
+
+'''-----------------------------------'''
+def add_pair_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--max-days", type=int, default=1, help="The most days apart two filings can be to form a marker.")
+    parser.add_argument("--min-days", type=int, default=0, help="The fewest days apart two filings must be to form a marker.")
+    parser.add_argument("--min-co-reports", type=int, default=1, help="The fewest markers two tickers need to be paired.")
+    parser.add_argument("--column", default="1d % Change", help='The %% change to compare. Ex: "1d Abnormal %% Change" with --benchmark.')
+    parser.add_argument("--benchmark", help="Add market adjusted event returns against this ticker. Ex: SPY")
+    parser.add_argument("--model", choices=["market", "beta"], default="beta", help="How the benchmark's return is subtracted.")
+    parser.add_argument("--base-rate", type=float, default=0.5, help="The chance of two tickers agreeing by luck, for the p-values.")
+    parser.add_argument("--confidence", type=float, default=0.95, help="The confidence of the lower bounds.")
+    parser.add_argument("--permutations", type=int, default=0, help="Shuffles for permutation p-values. 0 skips them.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=1, help="Processes to evaluate the pairs with.")
+    parser.add_argument("--rank-by", choices=list(RANKINGS), default="perc_pos")
+    parser.add_argument("--min-markers", type=int, default=1, help="Leave out pairs with fewer valid markers.")
+    parser.add_argument("--top", type=int, help="Only keep the best pairs.")
+    parser.add_argument("--output", help="Write the ranked pairs to a .csv or .json file.")
+
+'''-----------------------------------'''
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Find stocks that report earnings together and whose prices move together.")
+    parser.add_argument("--records", default=default_records_dir, help="The directory of the filing CSV files.")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Where stage outputs and prices are cached.")
+    parser.add_argument("--trace", help="Write a JSON trace of the run's stages and counters to this file.")
+    parser.add_argument("--track-memory", action="store_true", help="Add the peak memory of each stage to the trace.")
+    parser.add_argument("--profiler", choices=[p for p in PROFILERS if p], help="Also profile the run, next to the trace file.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    refresh_parser = commands.add_parser("refresh", help="Scrape new filings and prices into the CSV files.")
+    refresh_parser.add_argument("tickers", nargs="*", help="Defaults to every ticker in the records directory.")
+    refresh_parser.add_argument("--tickers-file", help="A file with one ticker per line.")
+    refresh_parser.add_argument("--workers", type=int, default=4)
+    refresh_parser.add_argument("--user-agent", default=os.environ.get("SEC_USER_AGENT"),
+                                help="Read filing indexes from the SEC API with this User-Agent instead of the browser.")
+    refresh_parser.add_argument("--full", action="store_true", help="Scrape out of date tickers again from scratch.")
+    refresh_parser.add_argument("--manifest", help="Where to write the per ticker status.")
+    refresh_parser.set_defaults(run=run_refresh)
+
+    store_parser = commands.add_parser("build-store", help="Build the columnar store from the CSV files.")
+    store_parser.set_defaults(run=run_build_store)
+
+    snapshots_parser = commands.add_parser("import-snapshots", help="Build a store from saved SEC filing index pages, without a browser.")
+    snapshots_parser.add_argument("snapshots", help="The directory of saved browse-edgar pages, named <TICKER>_<anything>.html.")
+    snapshots_parser.add_argument("output", help="The directory to write the store to.")
+    snapshots_parser.add_argument("--workers", type=int, default=4, help="Processes to parse the pages with.")
+    snapshots_parser.add_argument("--prices", action="store_true", help="Fill in the %% changes from the cache directory's prices.")
+    snapshots_parser.add_argument("--year-cutoff", type=int, default=2000, help="Leave out filings made before this year.")
+    snapshots_parser.set_defaults(run=run_import_snapshots)
+
+    pairs_parser = commands.add_parser("pairs", help="Score every pair of tickers that report together.")
+    add_pair_arguments(pairs_parser)
+    pairs_parser.set_defaults(run=run_pairs)
+
+    report_parser = commands.add_parser("report", help="Print or write the ranked pairs.")
+    add_pair_arguments(report_parser)
+    report_parser.set_defaults(run=run_report)
+
+    return parser
+
+'''-----------------------------------'''
+def main(argv: list = None) -> None:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.trace is None and (args.track_memory or args.profiler):
+        parser.error("--track-memory and --profiler need --trace")
+    if getattr(args, "rank_by", None) == "permutation_p_value" and args.permutations < 1:
+        parser.error("--rank-by permutation_p_value needs --permutations of at least 1")
+    if getattr(args, "column", None) in ABNORMAL_COLUMNS and args.benchmark is None:
+        parser.error(f'--column "{args.column}" needs --benchmark')
+
+    if args.trace is None:
+        args.run(args)
+        return
+    with tracing(args.trace, args.track_memory, args.profiler):
+        args.run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+import hashlib
+import json
+import os
+import shutil
+
+from FilingStore.filingstore import FilingStore, STORE_VERSION, import_csv_directory
+from EarningsPairs.earningspairs import EarningsPairs
+from EarningsPairs.results import pair_record, write_records, read_records
+from EarningsPairs.resultcache import ResultCache
+from Scraper.scraper import default_records_dir
+from Scraper.pricecache import PriceCache
+from Scraper.eventreturns import BetaCache, event_return_columns
+from Scraper.edgar import EdgarFetcher
+from Scraper.orchestrator import ScrapeOrchestrator
+from Instrumentation.instrumentation import count
+
+
+# Bumped whenever a stage changes what it writes, so older cached outputs are not reused.
+CACHE_VERSION = 1
+# The cache directory when none is given. Ignored by git.
+DEFAULT_CACHE_DIR = os.environ.get("PIPELINE_CACHE_DIR", os.path.join(os.path.dirname(default_records_dir), ".pipeline_cache"))
+# The file each pairs stage output is written to.
+PAIRS_FILE = "pairs.json"
+# The per pair results shared by every pairs stage, so a stage rerun after a refresh only evaluates the pairs whose filings changed.
+RESULTS_FILE = "pair_results.sqlite"
+
+
+
+class StageCache:
+    '''
+    Stores the output of each pipeline stage in a directory named by the hash of the stage's inputs.
+
+    Inputs are described as JSON, so the same inputs always map to the same directory, and changing any of them, Ex: the
+    contents of a record file or the matching tolerance, maps to a new one. A stage whose directory already exists is not run again.
+    '''
+    def __init__(self, root: str = DEFAULT_CACHE_DIR) -> None:
+        self.root = root
+
+    '''-----------------------------------'''
+    def key(self, stage: str, inputs: dict) -> str:
+        description = json.dumps({"stage": stage, "version": CACHE_VERSION, "inputs": inputs}, sort_keys=True)
+        return hashlib.sha256(description.encode("utf-8")).hexdigest()
+
+    '''-----------------------------------'''
+    def path(self, stage: str, key: str) -> str:
+        return os.path.join(self.root, stage, key)
+
+    '''-----------------------------------'''
+    def build(self, stage: str, inputs: dict, builder) -> tuple:
+        '''
+        :param stage: The name of the stage. Ex: "store"
+        :param inputs: Everything the output depends on, as JSON serializable values.
+        :param builder: Called with an empty directory to write the output into, only when it is not cached yet.
+        :return: (output directory, key).
+        '''
+        key = self.key(stage, inputs)
+        path = self.path(stage, key)
+        if os.path.isdir(path):
+            count("pipeline.cache_hits")
+            return path, key
+
+        count("pipeline.cache_misses")
+        # The output is written next to its final place and moved there once it is complete,
+        # so an interrupted stage never leaves a directory that looks finished.
+        partial = f"{path}.partial-{os.getpid()}"
+        shutil.rmtree(partial, ignore_errors=True)
+        os.makedirs(partial)
+        try:
+            builder(partial)
+            with open(os.path.join(partial, "inputs.json"), 'w') as file:
+                json.dump({"stage": stage, "inputs": inputs}, file, indent=2)
+            os.replace(partial, path)
+        except BaseException:
+            shutil.rmtree(partial, ignore_errors=True)
+            raise
+        return path, key
+
+
+
+'''----------------------------------- Inputs -----------------------------------'''
+'''-----------------------------------'''
+def hash_records(records_dir: str) -> str:
+    '''
+    :return: The sha256 of the names and contents of every CSV file in the directory.
+    '''
+    digest = hashlib.sha256()
+    for name in sorted(os.listdir(records_dir)):
+        if not name.endswith(".csv"):
+            continue
+        digest.update(name.encode("utf-8") + b"\0")
+        with open(os.path.join(records_dir, name), 'rb') as file:
+            for block in iter(lambda: file.read(1 << 20), b""):
+                digest.update(block)
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+'''-----------------------------------'''
+def read_tickers(path: str) -> list:
+    # One ticker per line. Blank lines and lines starting with # are skipped.
+    with open(path, 'r') as file:
+        return [line.strip() for line in file if line.strip() and not line.startswith("#")]
+
+'''----------------------------------- Stages -----------------------------------'''
+'''-----------------------------------'''
+def refresh(tickers: list, records_dir: str = None, cache_dir: str = DEFAULT_CACHE_DIR, workers: int = 4, user_agent: str = None,
+            incremental: bool = True, manifest_path: str = None) -> dict:
+    '''
+    Brings the CSV file of each ticker up to date. This stage depends on the SEC and Yahoo, so it is never cached. The stages
+    after it notice the changed files through their hash.
+
+    :param tickers: The tickers to refresh. Defaults to every ticker already in records_dir.
+    :param user_agent: Fetch the filing indexes from the SEC API with this User-Agent instead of the browser.
+    :return: The orchestrator's manifest.
+    '''
+    records_dir = default_records_dir if records_dir is None else records_dir
+    os.makedirs(records_dir, exist_ok=True)
+    if not tickers:
+        tickers = [name[:-len(".csv")] for name in sorted(os.listdir(records_dir)) if name.endswith(".csv")]
+
+    price_cache = PriceCache(os.path.join(cache_dir, "prices"))
+    edgar_fetcher = EdgarFetcher(user_agent) if user_agent else None
+    if manifest_path is None:
+        manifest_path = os.path.join(cache_dir, "refresh_manifest.json")
+    os.makedirs(os.path.dirname(os.path.abspath(manifest_path)), exist_ok=True)
+
+    orchestrator = ScrapeOrchestrator(tickers, workers=workers, price_cache=price_cache, edgar_fetcher=edgar_fetcher,
+                                      manifest_path=manifest_path, incremental=incremental, records_dir=records_dir)
+    orchestrator.run()
+    return orchestrator.manifest
+
+'''-----------------------------------'''
+def build_store(cache: StageCache, records_dir: str = None) -> tuple:
+    '''
+    :return: (FilingStore, key) of the columnar store built from the CSV files. Reused while the files are unchanged.
+    '''
+    records_dir = default_records_dir if records_dir is None else records_dir
+    inputs = {"records": hash_records(records_dir), "store_version": STORE_VERSION}
+    path, key = cache.build("store", inputs, lambda output: import_csv_directory(records_dir, output))
+    return FilingStore(path), key
+
+'''-----------------------------------'''
+def score_pairs(cache: StageCache, records_dir: str = None, max_days: int = 1, min_days: int = 0, min_co_reports: int = 1,
+                base_rate: float = 0.5, confidence: float = 0.95, permutations: int = 0, seed: int = 0, workers: int = 1,
+                column: str = "1d % Change", benchmark: str = None, model: str = "beta") -> tuple:
+    '''
+    :param column: The % change the pairs are compared on. Ex: "1d Abnormal % Change", which needs a benchmark.
+    :param benchmark: Add the event returns adjusted by this ticker's returns, Ex: SPY. Prices come from the cache directory's price cache.
+    :param model: "market" or "beta". See compute_event_returns.
+    :return: (pair records, key). Every pair with its relationship and significance, in % positive order. Reused while the
+             store and every parameter are unchanged. The ranking is applied afterwards, so changing it never scores again.
+    '''
+    store, store_key = build_store(cache, records_dir)
+    # Checked before anything is scored, so a misspelled or abnormal column without a benchmark fails at once.
+    columns = store.value_columns + (event_return_columns() if benchmark is not None else [])
+    if column not in columns:
+        raise ValueError(f"The pairs cannot be compared on {column!r}. The columns are {columns}"
+                         + ("" if benchmark is not None else ". Abnormal returns need a benchmark"))
+
+    prices = None
+    if benchmark is not None:
+        benchmark = benchmark.upper()
+        prices = PriceCache(os.path.join(cache.root, "prices")).get_many(store.tickers + [benchmark])
+        if prices[benchmark].empty:
+            raise ValueError(f"No prices for the benchmark {benchmark}")
+
+    inputs = {"store": store_key,
+              "column": column,
+              "benchmark": benchmark,
+              "model": model if benchmark is not None else None,
+              # New bars can complete returns that were missing, so the last session is part of the inputs.
+              "last_session": str(prices[benchmark].index[-1].date()) if benchmark is not None else None,
+              "max_days": max_days,
+              "min_days": min_days,
+              "min_co_reports": min_co_reports,
+              "base_rate": base_rate,
+              "confidence": confidence,
+              "permutations": permutations,
+              "seed": seed}
+
+    def builder(output: str) -> None:
+        pairs = EarningsPairs.from_store(store, max_days=max_days, min_days=min_days, column=column)
+        if benchmark is not None:
+            pairs.add_event_returns(prices, prices[benchmark], model=model, beta_cache=BetaCache(os.path.join(cache.root, "betas")))
+        pairs.generate_pairs(min_co_reports)
+        results = ResultCache(os.path.join(cache.root, RESULTS_FILE))
+        try:
+            pairs.rank_pairs(workers, cache=results)
+        finally:
+            results.close()
+        pairs.score_significance(base_rate, confidence, permutations, seed=seed)
+        write_records([pair_record(p) for p in pairs.pairs], os.path.join(output, PAIRS_FILE))
+
+    path, key = cache.build("pairs", inputs, builder)
+    return read_records(os.path.join(path, PAIRS_FILE)), key
@@ -0,0 +1,226 @@
+import asyncio
+import json
+import os
+import threading
+import time
+
+import aiohttp
+
+from Instrumentation.instrumentation import stage, count
+
+
+# Maps every ticker to its CIK.
+SEC_TICKERS_URL = "https://www.sec.gov/files/company_tickers.json"
+# The filing history of each company, as JSON.
+SEC_SUBMISSIONS_URL = "https://data.sec.gov/submissions"
+# The SEC fair access policy allows at most 10 requests per second.
+SEC_MAX_RATE = 10
+
+# Responses worth retrying. 429 is returned when the rate limit is exceeded.
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+
+class RateLimiter:
+    '''
+    Spaces requests out so no more than `rate` start per second.
+
+    A single limiter can be shared by every coroutine and every thread making requests, so the global rate holds
+    no matter how many fetchers or scrapers are running at once.
+    '''
+    def __init__(self, rate: float = SEC_MAX_RATE) -> None:
+        self.interval = 1 / rate
+        self.lock = threading.Lock()
+        # The earliest time the next request may start.
+        self.next_time = 0.0
+
+    '''-----------------------------------'''
+    def reserve(self) -> float:
+        '''
+        :return: How long the caller has to wait before its request may start.
+        '''
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_time)
+            self.next_time = start + self.interval
+            return start - now
+
+    '''-----------------------------------'''
+    async def acquire(self) -> None:
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    '''-----------------------------------'''
+    def wait(self) -> None:
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+
+
+class EdgarFetcher:
+    '''
+    Fetches the filing index of many tickers from the SEC submissions API.
+
+    Requests share one pooled HTTP session and one RateLimiter. Each finished ticker is appended to the checkpoint
+    file, so an interrupted run skips the tickers it already has when it is started again. The checkpoint is deleted once
+    every ticker has been fetched, so the next run reads new filings instead of the old ones.
+    '''
+    def __init__(self, user_agent: str, forms: tuple = ("10-Q", "10-K"), rate_limiter: RateLimiter = None, concurrency: int = 8,
+                 checkpoint_path: str = None, tickers_url: str = SEC_TICKERS_URL, submissions_url: str = SEC_SUBMISSIONS_URL,
+                 retries: int = 3, backoff: float = 1.0) -> None:
+        '''
+        :param user_agent: The SEC requires a User-Agent naming the requester. Ex: "Sample Company admin@sample.com"
+        :param forms: The form types to keep.
+        :param rate_limiter: The limiter to share. Defaults to one allowing the SEC maximum of 10 requests per second.
+        :param concurrency: The most requests in flight at once.
+        :param checkpoint_path: A JSON lines file recording each finished ticker. None disables resuming.
+        :param tickers_url: The ticker -> CIK map. Can point at a local server for testing.
+        :param submissions_url: The base URL of the submissions API. Can point at a local server for testing.
+        :param retries: How many times a request is retried after a transient failure.
+        :param backoff: Seconds to wait before the first retry. Doubles after each one.
+        '''
+        self.user_agent = user_agent
+        self.forms = set(forms)
+        self.rate_limiter = RateLimiter() if rate_limiter is None else rate_limiter
+        self.concurrency = concurrency
+        self.checkpoint_path = checkpoint_path
+        self.tickers_url = tickers_url
+        self.submissions_url = submissions_url.rstrip("/")
+        self.retries = retries
+        self.backoff = backoff
+
+        # Ticker -> CIK. Loaded with the first request.
+        self.ciks = {}
+        # Ticker -> error message for tickers that could not be fetched in the last run.
+        self.errors = {}
+
+    '''----------------------------------- Public -----------------------------------'''
+    '''-----------------------------------'''
+    def fetch(self, tickers: list) -> dict:
+        '''
+        :param tickers: The tickers to fetch. Yahoo style tickers are accepted. Ex: BRK.B
+        :return: Ticker -> filing index rows ({"Filing Type": ..., "Filing Date": ...}), newest first.
+        '''
+        with stage("edgar.fetch"):
+            return asyncio.run(self.fetch_all(tickers))
+
+    '''-----------------------------------'''
+    async def fetch_all(self, tickers: list) -> dict:
+        tickers = [t.upper().replace(".", "-") for t in tickers]
+        results = self.load_checkpoint()
+        remaining = [t for t in tickers if t not in results]
+        self.errors = {}
+
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        headers = {"User-Agent": self.user_agent, "Accept-Encoding": "gzip, deflate"}
+        async with aiohttp.ClientSession(connector=connector, headers=headers) as session:
+            if remaining and not self.ciks:
+                await self.load_ciks(session)
+
+            semaphore = asyncio.Semaphore(self.concurrency)
+
+            async def run(ticker):
+                async with semaphore:
+                    try:
+                        rows = await self.fetch_ticker(session, ticker)
+                    except (aiohttp.ClientError, asyncio.TimeoutError, KeyError, ValueError) as error:
+                        self.errors[ticker] = f"{type(error).__name__}: {error}"
+                        return
+                results[ticker] = rows
+                self.save_checkpoint(ticker, rows)
+
+            await asyncio.gather(*(run(t) for t in remaining))
+
+        if all(t in results for t in tickers):
+            self.clear_checkpoint()
+        return {t: results[t] for t in tickers if t in results}
+
+    '''----------------------------------- Requests -----------------------------------'''
+    '''-----------------------------------'''
+    async def get_json(self, session: aiohttp.ClientSession, url: str):
+        delay = self.backoff
+        attempt = 0
+        while True:
+            await self.rate_limiter.acquire()
+            count("edgar.requests")
+            try:
+                async with session.get(url) as response:
+                    if response.status not in RETRY_STATUSES:
+                        response.raise_for_status()
+                        return await response.json(content_type=None)
+                    error = aiohttp.ClientResponseError(response.request_info, response.history, status=response.status)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as connection_error:
+                error = connection_error
+
+            attempt += 1
+            if attempt > self.retries:
+                raise error
+            count("edgar.retries")
+            await asyncio.sleep(delay)
+            delay *= 2
+
+    '''-----------------------------------'''
+    async def load_ciks(self, session: aiohttp.ClientSession) -> None:
+        data = await self.get_json(session, self.tickers_url)
+        # Ex: {"0": {"cik_str": 320193, "ticker": "AAPL", "title": "Apple Inc."}, ...}
+        self.ciks = {row["ticker"].upper(): int(row["cik_str"]) for row in data.values()}
+
+    '''-----------------------------------'''
+    async def fetch_ticker(self, session: aiohttp.ClientSession, ticker: str) -> list:
+        cik = self.ciks[ticker]
+        data = await self.get_json(session, f"{self.submissions_url}/CIK{cik:010d}.json")
+
+        filings = data["filings"]
+        rows = self.read_filings(filings["recent"])
+        # Companies with a long history have their older filings split into extra pages.
+        for page in filings.get("files", []):
+            rows += self.read_filings(await self.get_json(session, f"{self.submissions_url}/{page['name']}"))
+
+        # Newest first, the same order as the browse-edgar table.
+        return sorted(rows, key=lambda x: x["Filing Date"], reverse=True)
+
+    '''-----------------------------------'''
+    def read_filings(self, filings: dict) -> list:
+        # The submissions API stores each field as a column. Ex: {"form": [...], "filingDate": [...], ...}
+        return [{"Filing Type": form, "Filing Date": date}
+                for form, date in zip(filings["form"], filings["filingDate"])
+                if form in self.forms]
+
+    '''----------------------------------- Checkpoint -----------------------------------'''
+    '''-----------------------------------'''
+    def load_checkpoint(self) -> dict:
+        results = {}
+        if self.checkpoint_path is None or not os.path.exists(self.checkpoint_path):
+            return results
+
+        line = ""
+        with open(self.checkpoint_path, 'r') as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                # The last line can be cut off if the previous run was killed while writing it.
+                except json.JSONDecodeError:
+                    continue
+                results[entry["ticker"]] = entry["filings"]
+
+        # A cut off line is ended, so the next ticker saved is not appended to it and lost.
+        if line and not line.endswith("\n"):
+            with open(self.checkpoint_path, 'a') as file:
+                file.write("\n")
+        return results
+
+    '''-----------------------------------'''
+    def clear_checkpoint(self) -> None:
+        # Called when the run is complete. Only an interrupted or partly failed run is resumed.
+        if self.checkpoint_path is not None and os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+    '''-----------------------------------'''
+    def save_checkpoint(self, ticker: str, rows: list) -> None:
+        if self.checkpoint_path is None:
+            return
+
+        with open(self.checkpoint_path, 'a') as file:
+            file.write(json.dumps({"ticker": ticker, "filings": rows}) + "\n")
@@ -0,0 +1,248 @@
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+from Scraper.tradingcalendar import TradingCalendar
+from Scraper.returns import change_column
+
+
+# Event windows, as (first, last) sessions relative to the filing's trading day. The return runs from the close of the first
+# session to the close of the last one, so "1d" matches the "1d % Change" of the CSV files and "pre1w" is the week before the filing.
+DEFAULT_WINDOWS = {"pre1w": (-5, 0), "1d": (0, 1), "1w": (0, 5)}
+# Sessions of daily returns each beta is estimated from. About one year.
+DEFAULT_BETA_WINDOW = 252
+# Betas estimated from fewer overlapping returns than this are not trusted, and the event falls back to a beta of 1.
+MIN_BETA_OBSERVATIONS = 60
+# How the expected return of an event is modelled.
+MODELS = ("market", "beta")
+
+
+
+'''----------------------------------- Column Names -----------------------------------'''
+'''-----------------------------------'''
+def abnormal_column(label: str) -> str:
+    return f"{label} Abnormal % Change"
+
+'''-----------------------------------'''
+def event_return_columns(windows: dict = None) -> list:
+    # The columns compute_event_returns adds for the windows. Ex: "1d % Change", "1d Abnormal % Change"
+    if windows is None:
+        windows = DEFAULT_WINDOWS
+    return [column for label in windows for column in (change_column(label), abnormal_column(label))]
+
+'''----------------------------------- Prices -----------------------------------'''
+'''-----------------------------------'''
+def price_matrix(prices: dict, calendar: TradingCalendar, price_field: str = "Adj Close") -> np.ndarray:
+    '''
+    :param prices: Ticker -> price history.
+    :return: Tickers x sessions matrix of closes on the calendar, in the order of prices. NaN where a ticker has no bar.
+    '''
+    closes = np.full((len(prices), len(calendar)), np.nan)
+    for row, frame in enumerate(prices.values()):
+        if frame is not None and not frame.empty:
+            closes[row] = calendar.align(frame, price_field)
+    return closes
+
+'''-----------------------------------'''
+def daily_returns(closes: np.ndarray) -> np.ndarray:
+    # The return of each session from the close before it. The first session has none.
+    closes = np.atleast_2d(closes)
+    returns = np.full(closes.shape, np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns[:, 1:] = closes[:, 1:] / closes[:, :-1] - 1
+    return returns
+
+'''----------------------------------- Betas -----------------------------------'''
+'''-----------------------------------'''
+def rolling_betas(closes: np.ndarray, benchmark: np.ndarray, window: int = DEFAULT_BETA_WINDOW,
+                  min_observations: int = MIN_BETA_OBSERVATIONS) -> np.ndarray:
+    '''
+    :param closes: Tickers x sessions matrix of closes.
+    :param benchmark: The benchmark's closes at the same sessions.
+    :param window: The sessions of daily returns each beta is estimated from.
+    :param min_observations: The fewest returns both the ticker and the benchmark need in the window.
+    :return: Tickers x sessions matrix. The beta at a session is estimated from the returns up to and including that session.
+             NaN where there are too few returns.
+    '''
+    returns = daily_returns(closes)
+    market = daily_returns(benchmark)[0]
+
+    # Only the sessions where both the ticker and the benchmark have a return count.
+    valid = ~(np.isnan(returns) | np.isnan(market)[None, :])
+    x = np.where(valid, market[None, :], 0.0)
+    y = np.where(valid, returns, 0.0)
+
+    def window_sums(values: np.ndarray) -> np.ndarray:
+        # Sums over the trailing window of every session at once, as the difference of two running sums.
+        running = np.concatenate([np.zeros((values.shape[0], 1)), np.cumsum(values, axis=1)], axis=1)
+        ends = np.arange(1, values.shape[1] + 1)
+        return running[:, ends] - running[:, np.maximum(ends - window, 0)]
+
+    n = window_sums(valid.astype(np.float64))
+    sum_x = window_sums(x)
+    sum_y = window_sums(y)
+    sum_xx = window_sums(x * x)
+    sum_xy = window_sums(x * y)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        variance = n * sum_xx - sum_x ** 2
+        betas = (n * sum_xy - sum_x * sum_y) / variance
+    betas[(n < min_observations) | (variance <= 0)] = np.nan
+    return betas
+
+
+
+class BetaCache:
+    '''
+    Keeps the rolling betas of each ticker in <cache_dir>/<TICKER>.npz, so scoring pairs again does not estimate them again.
+
+    Each file records a hash of the closes, benchmark and settings it was computed from, and is recomputed when any of them change,
+    Ex: after new bars are downloaded.
+    '''
+    def __init__(self, cache_dir: str, window: int = DEFAULT_BETA_WINDOW, min_observations: int = MIN_BETA_OBSERVATIONS) -> None:
+        self.cache_dir = cache_dir
+        self.window = window
+        self.min_observations = min_observations
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    '''-----------------------------------'''
+    def get(self, tickers: list, closes: np.ndarray, benchmark: np.ndarray, calendar: TradingCalendar) -> np.ndarray:
+        '''
+        :return: The rolling_betas matrix. Only the tickers without a valid cached file are computed, together.
+        '''
+        betas = np.empty(closes.shape)
+        digests = [self.digest(closes[row], benchmark, calendar) for row in range(len(tickers))]
+
+        missing = []
+        for row, ticker in enumerate(tickers):
+            cached = self.load(ticker, digests[row])
+            if cached is None:
+                missing.append(row)
+            else:
+                betas[row] = cached
+
+        if missing:
+            betas[missing] = rolling_betas(closes[missing], benchmark, self.window, self.min_observations)
+            for row in missing:
+                np.savez(self.path(tickers[row]), digest=digests[row], betas=betas[row])
+        return betas
+
+    '''-----------------------------------'''
+    def digest(self, closes: np.ndarray, benchmark: np.ndarray, calendar: TradingCalendar) -> str:
+        digest = hashlib.sha256()
+        for array in (closes, benchmark, calendar.days):
+            digest.update(np.ascontiguousarray(array).tobytes())
+        digest.update(f"{self.window}:{self.min_observations}".encode("utf-8"))
+        return digest.hexdigest()
+
+    '''-----------------------------------'''
+    def load(self, ticker: str, digest: str) -> np.ndarray:
+        path = self.path(ticker)
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as cached:
+            if str(cached["digest"]) != digest:
+                return None
+            return cached["betas"]
+
+    '''-----------------------------------'''
+    def path(self, ticker: str) -> str:
+        return os.path.join(self.cache_dir, ticker + ".npz")
+
+
+
+'''----------------------------------- Event Returns -----------------------------------'''
+'''-----------------------------------'''
+def window_returns(closes: np.ndarray, benchmark: np.ndarray, rows: np.ndarray, positions: np.ndarray, windows: dict,
+                   betas: np.ndarray = None) -> dict:
+    '''
+    :param closes: Tickers x sessions matrix of closes.
+    :param benchmark: The benchmark's closes at the same sessions.
+    :param rows: The ticker row of each event.
+    :param positions: The session of each event. len(sessions) when it has not happened yet.
+    :param windows: Label -> (first, last) sessions relative to the event.
+    :param betas: The rolling_betas matrix. None measures abnormal returns against the benchmark with a beta of 1.
+    :return: Dict of arrays over the events: "{label} % Change" and "{label} Abnormal % Change" for each window, in %, and
+             "Beta" when betas are given. NaN where a window is not complete yet or a close is missing.
+    '''
+    num_sessions = closes.shape[1]
+    results = {}
+
+    if betas is not None:
+        listed = positions < num_sessions
+        beta = np.full(len(positions), np.nan)
+        beta[listed] = betas[rows[listed], positions[listed]]
+        results["Beta"] = beta
+
+    for label, (first, last) in windows.items():
+        start = positions + first
+        end = positions + last
+        complete = (positions < num_sessions) & (start >= 0) & (end < num_sessions)
+        start = np.where(complete, start, 0)
+        end = np.where(complete, end, 0)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            stock = np.where(complete, closes[rows, end] / closes[rows, start] - 1, np.nan)
+            market = np.where(complete, benchmark[end] / benchmark[start] - 1, np.nan)
+
+        if betas is None:
+            expected = market
+        else:
+            # The beta known when the window opens, so the window's own returns never shape it. Untrusted betas fall back to 1.
+            window_beta = betas[rows, start]
+            expected = np.where(np.isnan(window_beta), 1.0, window_beta) * market
+
+        results[change_column(label)] = stock * 100
+        results[abnormal_column(label)] = (stock - expected) * 100
+
+    return results
+
+'''-----------------------------------'''
+def compute_event_returns(prices: dict, filing_dates: dict, benchmark: pd.DataFrame, windows: dict = None, model: str = "beta",
+                          beta_window: int = DEFAULT_BETA_WINDOW, beta_cache: BetaCache = None, calendar: TradingCalendar = None,
+                          price_field: str = "Adj Close") -> dict:
+    '''
+    Computes the raw and abnormal returns of every ticker's filings at once.
+
+    :param prices: Ticker -> price history.
+    :param filing_dates: Ticker -> filing dates as "YYYY-MM-DD" strings, in any order.
+    :param benchmark: The price history of the benchmark. Ex: SPY
+    :param windows: Label -> (first, last) sessions relative to the filing. Ex: {"pre1w": (-5, 0), "1d": (0, 1)}
+    :param model: "market" subtracts the benchmark's return. "beta" subtracts it scaled by the ticker's rolling beta.
+    :param beta_window: Sessions of daily returns each beta is estimated from. A beta_cache uses its own window instead.
+    :param beta_cache: Reuses betas computed by earlier runs. Only used by the beta model.
+    :param calendar: The sessions to align everything on. Defaults to the benchmark's.
+    :param price_field: The price column to calculate the returns from.
+    :return: Ticker -> dict of arrays aligned with its filing dates. See window_returns.
+    '''
+    if windows is None:
+        windows = DEFAULT_WINDOWS
+    if model not in MODELS:
+        raise ValueError(f"Unknown model: {model}. Use one of {MODELS}")
+    if calendar is None:
+        calendar = TradingCalendar.from_prices(benchmark)
+
+    tickers = list(filing_dates.keys())
+    closes = price_matrix({t: prices.get(t) for t in tickers}, calendar, price_field)
+    benchmark_closes = calendar.align(benchmark, price_field)
+
+    betas = None
+    if model == "beta":
+        if beta_cache is None:
+            betas = rolling_betas(closes, benchmark_closes, beta_window)
+        else:
+            betas = beta_cache.get(tickers, closes, benchmark_closes, calendar)
+
+    # Every event of every ticker in one batch.
+    counts = [len(filing_dates[t]) for t in tickers]
+    rows = np.repeat(np.arange(len(tickers)), counts)
+    dates = np.concatenate([np.asarray(filing_dates[t], dtype="datetime64[D]") for t in tickers]) if tickers else np.empty(0, dtype="datetime64[D]")
+    positions = calendar.next_session(dates)
+
+    results = window_returns(closes, benchmark_closes, rows, positions, windows, betas)
+
+    # Split the batch back up by ticker.
+    bounds = np.concatenate([[0], np.cumsum(counts)])
+    return {t: {column: values[bounds[i]:bounds[i + 1]] for column, values in results.items()} for i, t in enumerate(tickers)}
@@ -0,0 +1,172 @@
+import datetime as dt
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from Scraper.scraper import StockScraper
+from Scraper.pricecache import PriceCache
+from Scraper.tradingcalendar import TradingCalendar
+from Scraper.edgar import EdgarFetcher, RateLimiter
+from Instrumentation.instrumentation import stage, count
+
+
+
+class ScrapeOrchestrator:
+    '''
+    Builds the {ticker: filing_data} dataset EarningsPairs expects for a whole list of tickers.
+
+    Tickers are scraped concurrently by a bounded pool of threads. Every scraper shares one PriceCache and one RateLimiter,
+    so prices are downloaded once per batch and the SEC sees the same request rate no matter how many workers run.
+    A ticker that keeps failing is recorded in the manifest and left out of the results, without stopping the others.
+    '''
+    def __init__(self, tickers: list, workers: int = 4, price_cache: PriceCache = None, edgar_fetcher: EdgarFetcher = None,
+                 rate_limiter: RateLimiter = None, horizons: dict = None, calendar: TradingCalendar = None, retries: int = 2,
+                 backoff: float = 2.0, manifest_path: str = None, incremental: bool = True, records_dir: str = None) -> None:
+        '''
+        :param tickers: The tickers to scrape.
+        :param workers: The most tickers scraped at once. Each one running through the browser opens its own Chrome window.
+        :param price_cache: The price cache shared by every scraper. Without one, each scraper downloads its own prices.
+        :param edgar_fetcher: Fetches every filing index from the SEC API before scraping. Tickers it cannot fetch fall back to the browser.
+        :param rate_limiter: Spaces out the browser's page loads on the SEC website. Defaults to the fetcher's limiter, or a new one.
+        :param horizons: The forward return horizons. See StockScraper.
+        :param calendar: A shared TradingCalendar. See StockScraper.
+        :param retries: How many times a failed ticker is tried again.
+        :param backoff: Seconds to wait before the first retry of a ticker. Doubles after each one.
+        :param manifest_path: A JSON file recording the status, time and error of every ticker. Rewritten as tickers finish.
+        :param incremental: Only add what is new to existing CSV files. See StockScraper.get_filing_data.
+        :param records_dir: The directory of the CSV files. Defaults to the scraper's.
+        '''
+        # The same normalization as StockScraper and EdgarFetcher. Ex: BRK.B -> BRK-B
+        self.tickers = list(dict.fromkeys(t.upper().replace(".", "-") for t in tickers))
+        self.workers = workers
+        self.price_cache = price_cache
+        self.edgar_fetcher = edgar_fetcher
+        if rate_limiter is None:
+            rate_limiter = edgar_fetcher.rate_limiter if edgar_fetcher is not None else RateLimiter()
+        self.rate_limiter = rate_limiter
+        self.horizons = horizons
+        self.calendar = calendar
+        self.retries = retries
+        self.backoff = backoff
+        self.manifest_path = manifest_path
+        self.incremental = incremental
+        self.records_dir = records_dir
+
+        # Ticker -> {"status", "source", "attempts", "seconds", "filings", "error"}.
+        self.manifest = {}
+        # Why the prices could not be prefetched, written to the manifest. None when they were.
+        self.prefetch_error = None
+
+    '''----------------------------------- Public -----------------------------------'''
+    '''-----------------------------------'''
+    def run(self) -> dict:
+        '''
+        :return: Ticker -> filing data, for every ticker that was scraped.
+        '''
+        started = dt.datetime.now().isoformat(timespec="seconds")
+        self.manifest = {}
+        self.prefetch_error = None
+
+        filing_indexes = self.fetch_filing_indexes()
+        self.prefetch_prices()
+
+        dataset = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(self.scrape_with_retries, t, filing_indexes.get(t)): t for t in self.tickers}
+            for future in as_completed(futures):
+                ticker = futures[future]
+                filing_data, entry = future.result()
+                self.manifest[ticker] = entry
+                if filing_data is not None:
+                    dataset[ticker] = filing_data
+                self.write_manifest(started)
+
+        # The same order as the ticker list.
+        return {t: dataset[t] for t in self.tickers if t in dataset}
+
+    '''-----------------------------------'''
+    def failed(self) -> list:
+        return [t for t, entry in self.manifest.items() if entry["status"] == "failed"]
+
+    '''----------------------------------- Stages -----------------------------------'''
+    '''-----------------------------------'''
+    def fetch_filing_indexes(self) -> dict:
+        if self.edgar_fetcher is None:
+            return {}
+        return self.edgar_fetcher.fetch(self.tickers)
+
+    '''-----------------------------------'''
+    def prefetch_prices(self) -> None:
+        # One grouped download for every ticker, so the workers read their prices from the cache.
+        if self.price_cache is None:
+            return
+        try:
+            with stage("orchestrator.prefetch_prices"):
+                self.price_cache.get_many(self.tickers)
+        # Tickers whose prices could not be prefetched download them again in their own worker, where failures are retried.
+        # The error is kept for the manifest, so a failing price source is not hidden by the retries.
+        except Exception as error:
+            count("orchestrator.prefetch_failures")
+            self.prefetch_error = f"{type(error).__name__}: {error}"
+
+    '''-----------------------------------'''
+    def scrape_with_retries(self, ticker: str, filing_index: list = None) -> tuple:
+        '''
+        :return: (filing data, manifest entry). The filing data is None if every attempt failed.
+        '''
+        entry = {"status": "failed",
+                 "source": "edgar" if filing_index is not None else "browser",
+                 "attempts": 0,
+                 "seconds": 0.0,
+                 "filings": 0,
+                 "error": None}
+
+        start = time.perf_counter()
+        delay = self.backoff
+        filing_data = None
+        while entry["attempts"] <= self.retries:
+            entry["attempts"] += 1
+            try:
+                filing_data = self.scrape(ticker, filing_index)
+            except Exception as error:
+                count("orchestrator.failed_attempts")
+                entry["error"] = f"{type(error).__name__}: {error}"
+                if entry["attempts"] <= self.retries:
+                    time.sleep(delay)
+                    delay *= 2
+                continue
+
+            entry["status"] = "ok"
+            entry["error"] = None
+            entry["filings"] = sum(len(filings) for filings in filing_data.values())
+            break
+
+        entry["seconds"] = round(time.perf_counter() - start, 3)
+        return filing_data, entry
+
+    '''-----------------------------------'''
+    def scrape(self, ticker: str, filing_index: list = None) -> dict:
+        scraper = StockScraper(ticker, horizons=self.horizons, price_cache=self.price_cache, calendar=self.calendar,
+                               rate_limiter=self.rate_limiter, records_dir=self.records_dir)
+        try:
+            with stage("orchestrator.scrape_ticker"):
+                return scraper.get_filing_data(filing_index=filing_index, incremental=self.incremental)
+        finally:
+            # Every scrape opens its own Chrome window. Close it so long runs do not pile them up.
+            scraper.close_browser()
+
+    '''----------------------------------- Manifest -----------------------------------'''
+    '''-----------------------------------'''
+    def write_manifest(self, started: str) -> None:
+        if self.manifest_path is None:
+            return
+
+        manifest = {"started": started,
+                    "updated": dt.datetime.now().isoformat(timespec="seconds"),
+                    "tickers": self.manifest}
+        if self.edgar_fetcher is not None:
+            manifest["edgar_errors"] = self.edgar_fetcher.errors
+        if self.prefetch_error is not None:
+            manifest["prefetch_error"] = self.prefetch_error
+        with open(self.manifest_path, 'w') as file:
+            json.dump(manifest, file, indent=2)
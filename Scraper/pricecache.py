@@ -0,0 +1,228 @@
+import datetime as dt
+import json
+import os
+import threading
+from abc import ABC, abstractmethod
+from contextlib import ExitStack
+
+import pandas as pd
+import yfinance as yf
+
+from Instrumentation.instrumentation import stage, count
+
+
+COVERAGE_FILE = "coverage.json"
+
+
+
+'''----------------------------------- Price Sources -----------------------------------'''
+class PriceSource(ABC):
+    '''
+    Where the PriceCache gets the bars it does not have yet. Subclasses download the daily OHLCV history of several tickers at once.
+    '''
+    @abstractmethod
+    def download(self, tickers: list, start: str = None, end: str = None) -> dict:
+        '''
+        :param tickers: The tickers to download.
+        :param start: The first date to download. None downloads from the start of each ticker's history.
+        :param end: The day after the last date to download. None downloads up to the most recent bar.
+        :return: Ticker -> DataFrame indexed by date. Tickers without any bars in the range can be left out.
+        '''
+
+
+
+class YahooSource(PriceSource):
+    def download(self, tickers: list, start: str = None, end: str = None) -> dict:
+        # A single grouped request for every ticker in the batch.
+        if start is None:
+            data = yf.download(tickers, period="max", end=end, group_by="ticker", auto_adjust=False)
+        else:
+            data = yf.download(tickers, start=start, end=end, group_by="ticker", auto_adjust=False)
+
+        prices = {}
+        for ticker in tickers:
+            try:
+                frame = data[ticker].dropna(how="all")
+            except KeyError:
+                continue
+            if not frame.empty:
+                prices[ticker] = frame
+        return prices
+
+
+
+class FixtureSource(PriceSource):
+    '''
+    Reads prices from a directory of <TICKER>.csv files instead of the network. Used by tests and offline runs.
+    '''
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+
+    '''-----------------------------------'''
+    def download(self, tickers: list, start: str = None, end: str = None) -> dict:
+        prices = {}
+        for ticker in tickers:
+            path = os.path.join(self.directory, ticker + ".csv")
+            if not os.path.exists(path):
+                continue
+            frame = read_prices(path)
+            frame = slice_prices(frame, start, end)
+            if not frame.empty:
+                prices[ticker] = frame
+        return prices
+
+
+
+'''----------------------------------- Cache -----------------------------------'''
+class PriceCache:
+    '''
+    A persistent on-disk cache of daily price history.
+
+    The bars of each ticker are kept in <cache_dir>/<TICKER>.csv, and coverage.json records the date range that has
+    been downloaded for it. Requests only go to the source for the parts of a range that are not covered yet, and
+    tickers missing the same range are downloaded together in one call.
+
+    The cache can be shared between threads. Each ticker has a lock held while its bars are downloaded, so threads reading different
+    tickers download at the same time while a ticker is never downloaded twice. The shared coverage and bars have their own lock,
+    which is never held during a download.
+    '''
+    def __init__(self, cache_dir: str, source: PriceSource = None) -> None:
+        self.cache_dir = cache_dir
+        self.source = YahooSource() if source is None else source
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        # Ticker -> [start, end). A start of None means the ticker's full history has been downloaded.
+        self.coverage = {}
+        coverage_path = os.path.join(self.cache_dir, COVERAGE_FILE)
+        if os.path.exists(coverage_path):
+            with open(coverage_path, 'r') as file:
+                self.coverage = json.load(file)
+
+        # Bars read from disk during this run.
+        self.frames = {}
+        # Guards coverage, frames and the files on disk.
+        self.lock = threading.RLock()
+        # Ticker -> the lock held while its missing bars are found, downloaded and stored.
+        self.ticker_locks = {}
+
+    '''-----------------------------------'''
+    def get(self, ticker: str, start: str = None, end: str = None) -> pd.DataFrame:
+        '''
+        :param ticker: The ticker to read.
+        :param start: The first date needed. None means the full history.
+        :param end: The day after the last date needed. None means up to the most recent bar.
+        :return: The bars in the range.
+        '''
+        return self.get_many([ticker], start, end)[ticker]
+
+    '''-----------------------------------'''
+    def get_many(self, tickers: list, start: str = None, end: str = None) -> dict:
+        '''
+        :param tickers: The tickers to read.
+        :param start: The first date needed. None means the full history.
+        :param end: The day after the last date needed. None means up to the most recent bar.
+        :return: Ticker -> bars in the range. Tickers with no bars get an empty DataFrame.
+        '''
+        # The most recent bar can still change until the day is over, so coverage never extends past today.
+        today = dt.date.today().isoformat()
+        end = today if end is None else min(end, today)
+
+        with ExitStack() as locks:
+            # Always taken in sorted order, so two threads waiting on each other's tickers cannot deadlock.
+            for lock in self.locks_of(sorted(set(tickers))):
+                locks.enter_context(lock)
+
+            with self.lock:
+                # (missing start, missing end) -> tickers missing that range.
+                batches = {}
+                for ticker in tickers:
+                    missing_ranges = self.missing_ranges(ticker, start, end)
+                    count("price_cache.misses" if missing_ranges else "price_cache.hits")
+                    for missing in missing_ranges:
+                        batches.setdefault(missing, []).append(ticker)
+
+            for (missing_start, missing_end), batch in batches.items():
+                count("price_cache.downloads")
+                with stage("price_cache.download"):
+                    downloaded = self.source.download(batch, missing_start, None if missing_end == today else missing_end)
+                with self.lock:
+                    for ticker in batch:
+                        self.store(ticker, downloaded.get(ticker), missing_start, missing_end)
+                    self.save_coverage()
+
+            with self.lock:
+                return {t: slice_prices(self.load(t), start, end if end != today else None) for t in tickers}
+
+    '''-----------------------------------'''
+    def locks_of(self, tickers: list) -> list:
+        with self.lock:
+            return [self.ticker_locks.setdefault(t, threading.Lock()) for t in tickers]
+
+    '''-----------------------------------'''
+    def missing_ranges(self, ticker: str, start: str, end: str) -> list:
+        if ticker not in self.coverage:
+            return [(start, end)]
+
+        covered_start, covered_end = self.coverage[ticker]
+        missing = []
+        # Before the covered range. A covered start of None already holds everything before it.
+        if covered_start is not None and (start is None or start < covered_start):
+            missing.append((start, covered_start))
+        # After the covered range.
+        if end > covered_end:
+            missing.append((covered_end, end))
+        return missing
+
+    '''-----------------------------------'''
+    def store(self, ticker: str, frame: pd.DataFrame, start: str, end: str) -> None:
+        cached = self.load(ticker)
+        if frame is not None and not frame.empty:
+            # Newly downloaded bars replace cached bars for the same day.
+            cached = pd.concat([cached, frame])
+            cached = cached[~cached.index.duplicated(keep="last")].sort_index()
+            cached.to_csv(self.path(ticker))
+        self.frames[ticker] = cached
+
+        if ticker in self.coverage:
+            covered_start, covered_end = self.coverage[ticker]
+            if covered_start is not None and (start is None or start < covered_start):
+                covered_start = start
+            self.coverage[ticker] = [covered_start, max(covered_end, end)]
+        else:
+            self.coverage[ticker] = [start, end]
+
+    '''-----------------------------------'''
+    def load(self, ticker: str) -> pd.DataFrame:
+        if ticker not in self.frames:
+            path = self.path(ticker)
+            self.frames[ticker] = read_prices(path) if os.path.exists(path) else pd.DataFrame()
+        return self.frames[ticker]
+
+    '''-----------------------------------'''
+    def path(self, ticker: str) -> str:
+        return os.path.join(self.cache_dir, ticker + ".csv")
+
+    '''-----------------------------------'''
+    def save_coverage(self) -> None:
+        with open(os.path.join(self.cache_dir, COVERAGE_FILE), 'w') as file:
+            json.dump(self.coverage, file)
+
+
+
+'''----------------------------------- Utilities -----------------------------------'''
+'''-----------------------------------'''
+def read_prices(path: str) -> pd.DataFrame:
+    return pd.read_csv(path, index_col=0, parse_dates=True)
+
+'''-----------------------------------'''
+def slice_prices(frame: pd.DataFrame, start: str = None, end: str = None) -> pd.DataFrame:
+    '''
+    :return: The bars from start up to, but not including, end.
+    '''
+    if frame.empty:
+        return frame
+    if start is not None:
+        frame = frame[frame.index >= pd.Timestamp(start)]
+    if end is not None:
+        frame = frame[frame.index < pd.Timestamp(end)]
+    return frame
@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+
+from Scraper.tradingcalendar import TradingCalendar
+
+
+# Forward horizons, measured in trading sessions after the filing date.
+DEFAULT_HORIZONS = {"1d": 1, "1w": 5}
+
+# The CSV names the price columns of the original horizons. Any other horizon uses "<label> Price".
+PRICE_COLUMNS = {"1d": "Next Price", "1w": "Next Week Price"}
+
+
+
+'''----------------------------------- Column Names -----------------------------------'''
+'''-----------------------------------'''
+def price_column(label: str) -> str:
+    return PRICE_COLUMNS.get(label, f"{label} Price")
+
+'''-----------------------------------'''
+def change_column(label: str) -> str:
+    return f"{label} % Change"
+
+'''-----------------------------------'''
+def csv_columns(horizons: dict = None) -> list:
+    '''
+    :param horizons: Mapping of horizon label -> trading sessions after the filing date.
+    :return: The CSV header for the horizons, in the same order the original file uses.
+    '''
+    if horizons is None:
+        horizons = DEFAULT_HORIZONS
+
+    columns = ["Filing Date", "Filing Type", "Price"]
+    for label in horizons:
+        columns += [price_column(label), change_column(label)]
+    return columns
+
+'''----------------------------------- Forward Returns -----------------------------------'''
+'''-----------------------------------'''
+def compute_forward_returns(price_data: pd.DataFrame, filing_dates: list, horizons: dict = None, price_field: str = "Adj Close",
+                            calendar: TradingCalendar = None) -> dict:
+    '''
+    :param price_data: Price history indexed by date (the frame returned by yf.download).
+    :param filing_dates: Filing dates as "YYYY-MM-DD" strings, in any order.
+    :param horizons: Mapping of horizon label -> trading sessions after the filing date. Ex: {"1d": 1, "1w": 5, "1m": 21}
+    :param price_field: The price column to calculate the returns from.
+    :param calendar: A shared TradingCalendar. Defaults to one built from price_data, so every row is a session.
+    :return: Dict of NumPy arrays aligned with filing_dates. "Position" holds the calendar session of the first trading day on or after
+             each filing date (-1 if there is none), "Price" the close at that session, and each horizon has a price and a % change column.
+             Values that do not exist yet are NaN.
+    '''
+    if horizons is None:
+        horizons = DEFAULT_HORIZONS
+    if calendar is None:
+        calendar = TradingCalendar.from_prices(price_data)
+
+    # The ticker's closes at every session of the calendar.
+    closes = calendar.align(price_data, price_field)
+    num_sessions = len(calendar)
+
+    # Companies sometimes file on a non-trading day. The calendar resolves every filing to the
+    # first trading session on or after its date with one table lookup.
+    positions = calendar.next_session(filing_dates)
+    listed = positions < num_sessions
+
+    price = np.full(len(positions), np.nan)
+    price[listed] = closes[positions[listed]]
+
+    results = {"Position": np.where(listed, positions, -1),
+               "Price": price}
+
+    for label, offset in horizons.items():
+        target = positions + offset
+        # Horizons past the most recent session have not traded yet.
+        traded = listed & (target < num_sessions)
+
+        future_price = np.full(len(positions), np.nan)
+        future_price[traded] = closes[target[traded]]
+
+        results[price_column(label)] = future_price
+        results[change_column(label)] = ((future_price / price) - 1) * 100
+
+    return results
+
+'''-----------------------------------'''
+def format_forward_returns(results: dict, index: int, horizons: dict = None) -> dict:
+    '''
+    :param results: The arrays returned by compute_forward_returns.
+    :param index: The filing to format.
+    :param horizons: The horizons results was computed with.
+    :return: The CSV fields of one filing. Prices are rounded to 3 places, % changes to 2, and missing values are "N/A".
+    '''
+    if horizons is None:
+        horizons = DEFAULT_HORIZONS
+
+    row = {"Price": round_or_na(results["Price"][index], 3)}
+    for label in horizons:
+        row[price_column(label)] = round_or_na(results[price_column(label)][index], 3)
+        row[change_column(label)] = round_or_na(results[change_column(label)][index], 2)
+    return row
+
+'''-----------------------------------'''
+def round_or_na(value, places: int):
+    if np.isnan(value):
+        return "N/A"
+    return round(float(value), places)
@@ -1,4 +1,5 @@
 import csv
+import os
 import pandas as pd
 import datetime as dt
 
@@ -7,12 +8,22 @@ import yfinance as yf
 
 # Webscraping 
 from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
 from selenium.common.exceptions import NoSuchElementException
 from itertools import zip_longest
 
+from Scraper.pricecache import PriceCache
+from Scraper.tradingcalendar import TradingCalendar
+from Scraper.edgar import RateLimiter
+from Instrumentation.instrumentation import stage, count
+from Scraper.returns import DEFAULT_HORIZONS, compute_forward_returns, format_forward_returns, csv_columns, change_column
 
 
-chrome_driver = "D:\\ChromeDriver\\chromedriver.exe"
+
+# The chromedriver executable. When it is not set, Selenium looks for a driver on the PATH.
+chrome_driver = os.environ.get("CHROMEDRIVER_PATH")
+# Where the CSV file of each ticker is kept. Defaults to the Filing_Records directory of the repository.
+default_records_dir = os.environ.get("FILING_RECORDS_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Filing_Records"))
 chrome_options = webdriver.ChromeOptions()
 chrome_options.add_argument("--no-sandbox")
 #chrome_options.add_argument("--headless")
@@ -21,7 +32,8 @@ chrome_options.add_argument("--disable-gpu")
 
 
 class StockScraper:
-    def __init__(self, ticker: str) -> None:
+    def __init__(self, ticker: str, horizons: dict = None, price_cache: PriceCache = None, calendar: TradingCalendar = None,
+                 rate_limiter: RateLimiter = None, records_dir: str = None) -> None:
 
         self.ticker = ticker.upper()
 
@@ -32,15 +44,43 @@ class StockScraper:
         self.sec_quarterly_url = f"https://www.sec.gov/cgi-bin/browse-edgar?action=getcompany&CIK={self.ticker}&type=10-q&dateb=&owner=include&count=100&search_text="
         self.sec_annual_url = f"https://www.sec.gov/cgi-bin/browse-edgar?action=getcompany&CIK={self.ticker}&type=10-k&dateb=&owner=include&count=100&search_text="
         self.csv_file = self.ticker + f".csv"
-        self.file_path = f"D:\\Coding\\VisualStudioCode\\Projects\\Python\\Historical_Earnings_Correlation\\Filing_Records\\" + self.csv_file
+        self.file_path = os.path.join(default_records_dir if records_dir is None else records_dir, self.csv_file)
         
         self.filing_data = {}
         self.stock_data = pd.DataFrame()
+
+        # The forward returns calculated for each filing. Label -> trading days after the filing. Ex: {"1d": 1, "1w": 5, "1m": 21}
+        self.horizons = DEFAULT_HORIZONS if horizons is None else horizons
+        # Optional shared on-disk price cache. Without one, prices are downloaded from Yahoo every time.
+        self.price_cache = price_cache
+        # The trading sessions used to resolve filing dates. Pass one in to share it between scrapers, otherwise it is built from the price data.
+        self.calendar = calendar
+        # (price data, calendar built from it) when no calendar is shared.
+        self.price_calendar = None
+        # Optional limiter shared with other scrapers, so the SEC pages are not requested faster than it allows.
+        self.rate_limiter = rate_limiter
+        # The Chrome window of the last page read.
+        self.browser = None
         
     '''----------------------------------- Yahoo Data -----------------------------------'''
     '''-----------------------------------'''
-    def set_stock_data(self, period: str = "Max") -> None:
-        self.stock_data = yf.download(self.ticker, period=period)
+    def set_stock_data(self, period: str = "Max", start: str = None) -> None:
+        '''
+        :param period: How much history to download.
+        :param start: Only download the bars on or after this date. Overrides period. Ex: "2023-01-31"
+        :return: None
+        '''
+        if self.price_cache is not None:
+            # The cache always holds the full history, so period does not apply.
+            self.stock_data = self.price_cache.get(self.ticker, start=start)
+            return
+
+        count("yahoo.requests")
+        with stage("scraper.yahoo_download"):
+            if start is None:
+                self.stock_data = yf.download(self.ticker, period=period)
+            else:
+                self.stock_data = yf.download(self.ticker, start=start)
     
     '''-----------------------------------'''
     def get_stock_data(self) -> pd.DataFrame:
@@ -50,7 +90,14 @@ class StockScraper:
     '''-----------------------------------'''
     '''----------------------------------- SEC Data -----------------------------------'''
     '''-----------------------------------'''
-    def set_filing_data(self, f_type: str = "10-Q", year_cutoff: int = 2000) -> None:
+    def set_filing_data(self, f_type: str = "10-Q", year_cutoff: int = 2000, filing_index: list = None) -> None:
+        '''
+        :param f_type: The type of filing to collect.
+        :param year_cutoff: Filings made before this year are not collected.
+        :param filing_index: Rows of the filing index ({"Filing Type": ..., "Filing Date": ...}), such as the ones EdgarFetcher returns.
+                             When given, they are used instead of scraping the SEC website with the browser.
+        :return: None
+        '''
         
         # Allowable parameters
         quarterly_paramters = ["10-Q", "10-q", "Quarterly", "quarterly", "Q", "q"]
@@ -58,157 +105,194 @@ class StockScraper:
         price_data = self.get_stock_data()
         
 
-        # Create a browser object
-        if f_type in quarterly_paramters:
-            self.create_browser()
-        elif f_type in annual_parameters:
-            self.create_browser(self.sec_annual_url)
+        if filing_index is None:
+            # Read the filing table with the browser.
+            if f_type in quarterly_paramters:
+                filing_index = self.scrape_filing_index(self.sec_quarterly_url)
+            elif f_type in annual_parameters:
+                filing_index = self.scrape_filing_index(self.sec_annual_url)
+        else:
+            # The index holds every form type, so only keep the one requested.
+            if f_type in quarterly_paramters:
+                filing_index = [f for f in filing_index if f["Filing Type"] == "10-Q"]
+            elif f_type in annual_parameters:
+                filing_index = [f for f in filing_index if f["Filing Type"] == "10-K"]
+
+        # The filings kept from the index. The price data for all of them is calculated at once.
+        filings = []
+
+        for row in filing_index:
+            filing_type = row["Filing Type"]
+            filing_date = row["Filing Date"]
+
+            # Split the filing date to get the year.
+            year, month, day = filing_date.split("-")
+
+            # We only want the filing dates of 10-q not any ammendments like 10-Q/A. 
+            if filing_type == "10-Q" or filing_type == "10-K":
+                # If we want to cutoff at the year 2000, it will not collect any years prior. 
+                if int(year) < year_cutoff:
+                    pass
+                else:
+                    # Set the filing date and type based off the data from the scraper.
+                    filings.append({"Filing Type": filing_type,
+                                    "Filing Date": filing_date})
+
+        self.add_filings(filings, price_data)
+        self.sort_filing_data()
+    
+        # Insert the filings into a csv file. 
+        self.write_to_csv()
+            
+
+    '''-----------------------------------'''
+    def scrape_filing_index(self, url: str, since: str = None) -> list:
+        '''
+        :param url: The SEC browse-edgar page to read.
+        :param since: Stop reading once a filing on or before this date is reached. Ex: "2023-02-03"
+        :return: The "Filing Type" and "Filing Date" of every row in the filing table.
+        '''
+        with stage("scraper.create_browser"):
+            self.create_browser(url)
 
-        
         # Loop control.
         running = True
         filing_index = 2
         date_index = 2
+        rows = []
         
-        while running:
+        with stage("scraper.read_filing_table"):
+            while running:
 
-            try:
-                filing = {"Filing Type": "",
-                        "Filing Date": ""}
-                # Xpaths to the elements.
+                try:
+                    # Xpaths to the elements.
                 
-                filing_type_xpath = f"/html/body/div[4]/div[4]/table/tbody/tr[{filing_index}]/td[1]"
-                date_xpath = f"/html/body/div[4]/div[4]/table/tbody/tr[{date_index}]/td[4]"
-                # Extract the data.
-                filing_type = self.read_data(filing_type_xpath)
-                filing_date = self.read_data(date_xpath)
+                    filing_type_xpath = f"/html/body/div[4]/div[4]/table/tbody/tr[{filing_index}]/td[1]"
+                    date_xpath = f"/html/body/div[4]/div[4]/table/tbody/tr[{date_index}]/td[4]"
+                    # Extract the data.
+                    row = {"Filing Type": self.read_data(filing_type_xpath),
+                           "Filing Date": self.read_data(date_xpath)}
+
+                    # The table is in descending order, so everything after this row is already stored.
+                    if since is not None and row["Filing Date"] <= since:
+                        running = False
+                        continue
+                    rows.append(row)
+
+                    filing_index += 1
+                    date_index += 1
+                except NoSuchElementException:
+                    running = False
+
+        count("scraper.rows_read", len(rows))
+        return rows
 
-                # Split the filing date to get the year.
-                year, month, day = filing_date.split("-")
+    '''-----------------------------------'''
+    def add_filings(self, filings: list, price_data: pd.DataFrame) -> None:
+        '''
+        :param filings: Dicts holding the "Filing Type" and "Filing Date" of each filing.
+        :param price_data: The price history used to calculate the % changes.
+        :return: None
+        '''
+        # Resolve the trading day and forward returns of every filing in one pass.
+        with stage("scraper.forward_returns"):
+            results = compute_forward_returns(price_data, [f["Filing Date"] for f in filings], self.horizons, calendar=self.get_calendar(price_data))
+        count("scraper.filings_parsed", len(filings))
 
-                
-                # We only want the filing dates of 10-q not any ammendments like 10-Q/A. 
-                if filing_type == "10-Q" or filing_type == "10-K":
-                    # If we want to cutoff at the year 2000, it will not collect any years prior. 
-                    if int(year) < year_cutoff:
-                        pass
-                    else:
-
-                        # Set the filing date and type based off the data from the scraper.
-                        filing["Filing Type"] = filing_type
-                        filing["Filing Date"] = filing_date
-
-
-                        try:
-                            price = price_data.loc[filing_date]["Adj Close"]
-                            index_at_date = self.get_index(filing_date, price_data)
-                            # Get the next price by taking the index of the current row and adding 1.
-                            try:
-                                next_price = price_data.iloc[index_at_date+1]["Adj Close"]
-                                # Calculate the percent change between the price at close, and the following days price at close. Note: the first price at close is based off of when a form is filed. 
-                                percent_change = round(((next_price/price) - 1) * 100,2)
-                                filing["1d % Change"] = percent_change
-                            except IndexError:
-                                next_price = "N/A"
-                                filing["1d % Change"] = "N/A"
-
-                            # Get the price after 1 week.
-                            try:
-                                next_week_price = price_data.iloc[index_at_date+5]["Adj Close"]
-                                week_percent_change = round(((next_week_price/price) - 1) * 100,2)
-                                filing["1w % Change"] = week_percent_change
-                            except IndexError:
-                                next_week_price = "N/A"
-                                filing["1w % Change"] = "N/A"
-
-                            # Format the price to save it. 
-                            try:
-                                price = round(price, 3)
-                            except TypeError:
-                                pass
-                            try:
-                                next_price = round(next_price, 3)
-                            except TypeError:
-                                pass
-                            try:
-                                next_week_price = round(next_week_price, 3)
-                            except TypeError:
-                                pass
-                            filing["Price"] = price
-                            filing["Next Price"] = next_price
-                            filing["Next Week Price"] = next_week_price
-                        except KeyError:
-                            new_date = self.find_next_trading_day(filing_date, price_data)
-                            price = price_data.loc[new_date]["Adj Close"]
-                            # Gets the index of the row that matches the date.
-                            index_at_date = self.get_index(new_date, price_data)
-
-                            # Get the next price by taking the index of the current row.
-                            try:
-                                next_price = price_data.iloc[index_at_date+1]["Adj Close"]
-                                percent_change = round(((next_price/price) - 1) * 100,2)
-                                filing["1d % Change"] = percent_change
-                            except IndexError:
-                                next_price = "N/A"
-                                filing["1d % Change"] = "N/A"
-
-                            # Get the price after 1 week.
-                            try:
-                                next_week_price = price_data.iloc[index_at_date+5]["Adj Close"]
-                                week_percent_change = round(((next_week_price/price) - 1) * 100,2)
-                                filing["1w % Change"] = week_percent_change
-                            except IndexError:
-                                next_week_price = "N/A"
-                                filing["1w % Change"] = "N/A"
-                            
-                            # Format the price to save it. 
-                            try:
-                                price = round(price, 3)
-                            except TypeError:
-                                pass
-                            try:
-                                next_price = round(next_price, 3)
-                            except TypeError:
-                                pass
-                            try:
-                                next_week_price = round(next_week_price, 3)
-                            except TypeError:
-                                pass
-                            filing["Price"] = price
-                            filing["Next Price"] = next_price
-                            filing["Next Week Price"] = next_week_price
-
-                        try:
-                            self.filing_data[year].append(filing)
-                        except KeyError:
-                            self.filing_data[year] = [filing]
-
-
-                filing_index += 1
-                date_index += 1
-            except NoSuchElementException:
-                running = False
-      
+        for i, filing in enumerate(filings):
+            filing.update(format_forward_returns(results, i, self.horizons))
+            year = filing["Filing Date"].split("-")[0]
+
+            try:
+                self.filing_data[year].append(filing)
+            except KeyError:
+                self.filing_data[year] = [filing]
+
+    '''-----------------------------------'''
+    def sort_filing_data(self) -> None:
         # Sort the data, so each year will have the quarters in order. In descending order from Q4 -> Q1.
         for key, val in self.filing_data.items():
             self.filing_data[key] = sorted(val, key=lambda x: x['Filing Date'], reverse=True)
         
         # Sort the years.
         self.filing_data = dict(sorted(self.filing_data.items(),reverse=True))
-    
-        # Insert the filings into a csv file. 
+
+    '''-----------------------------------'''
+    def refresh_filing_data(self, filing_index: list = None, year_cutoff: int = 2000) -> None:
+        '''
+        Brings the CSV file up to date without scraping it again from scratch. Only filings newer than the last stored one are read,
+        only the price bars needed by those filings and by stored filings whose % changes were still "N/A" are downloaded, and
+        those "N/A" values are backfilled. "N/A" filings older than the newest filing with every % change can never be filled, and
+        are left as they are.
+
+        :param filing_index: Optional filing index rows to use instead of the browser. See set_filing_data.
+        :param year_cutoff: Filings made before this year are not collected.
+        :return: None
+        '''
+        if self.filing_data == {}:
+            self.read_from_csv()
+
+        stored = [f for year in self.filing_data.values() for f in year]
+        last_date = max(f["Filing Date"] for f in stored)
+
+        # The new filings, from both the quarterly and the annual table.
+        if filing_index is None:
+            filing_index = self.scrape_filing_index(self.sec_quarterly_url, since=last_date)
+            filing_index += self.scrape_filing_index(self.sec_annual_url, since=last_date)
+        new_filings = [{"Filing Type": f["Filing Type"], "Filing Date": f["Filing Date"]}
+                       for f in filing_index
+                       if f["Filing Type"] in ("10-Q", "10-K")
+                       and f["Filing Date"] > last_date
+                       and int(f["Filing Date"].split("-")[0]) >= year_cutoff]
+
+        # Filings made shortly before the last refresh did not have the following trading days yet.
+        change_columns = [change_column(label) for label in self.horizons]
+        missing = [any(f.get(c, "N/A") == "N/A" for c in change_columns) for f in stored]
+        # A filing older than one whose % changes are all filled already had every bar its horizons need, so when it is still "N/A"
+        # the bars do not exist, Ex: a trading halt. Only the filings after the newest complete one are backfilled, so those never
+        # pull the download back to an old start date on every run.
+        newest_complete = max((f["Filing Date"] for f, m in zip(stored, missing) if not m), default="")
+        incomplete = [f for f, m in zip(stored, missing) if m and f["Filing Date"] > newest_complete]
+        count("scraper.unfillable", sum(missing) - len(incomplete))
+
+        if not new_filings and not incomplete:
+            return
+
+        # Every horizon is counted from the filing's own trading day, so no bars before the oldest filing are needed.
+        start = min(f["Filing Date"] for f in new_filings + incomplete)
+        if self.stock_data.empty:
+            self.set_stock_data(start=start)
+        price_data = self.get_stock_data()
+
+        if incomplete:
+            results = compute_forward_returns(price_data, [f["Filing Date"] for f in incomplete], self.horizons, calendar=self.get_calendar(price_data))
+            for i, filing in enumerate(incomplete):
+                filing.update(format_forward_returns(results, i, self.horizons))
+
+        self.add_filings(new_filings, price_data)
+        self.sort_filing_data()
         self.write_to_csv()
-            
 
     '''-----------------------------------'''
-    def get_filing_data(self) -> dict:
+    def get_filing_data(self, filing_index: list = None, incremental: bool = True) -> dict:
+        '''
+        :param filing_index: Optional filing index rows to use instead of the browser. See set_filing_data.
+        :param incremental: When a CSV file exists, only add what is new to it on every call, and backfill its "N/A" % changes,
+                            instead of scraping everything again once it is out of date.
+        :return: The filing data.
+        '''
+        # An incremental refresh only reads what is new, so it runs every time rather than waiting for the file to be months old.
+        if incremental and self.has_records():
+            self.refresh_filing_data(filing_index)
+            return self.filing_data
+
         # Check if there is an existing CSV file. 
         update_needed = self.is_update_needed()
 
         if update_needed:
             if self.filing_data == {}:
-                self.set_filing_data(f_type="10-Q")
-                self.set_filing_data(f_type="10-K")
+                self.set_filing_data(f_type="10-Q", filing_index=filing_index)
+                self.set_filing_data(f_type="10-K", filing_index=filing_index)
         
         elif not update_needed:
             self.read_from_csv()
@@ -220,10 +304,11 @@ class StockScraper:
     def write_to_csv(self):
         with open (self.file_path, 'w', newline='') as file:
             writer = csv.writer(file)
-            writer.writerow(['Filing Date', 'Filing Type',"Price", "Next Price", "1d % Change", "Next Week Price", "1w % Change"])
+            columns = csv_columns(self.horizons)
+            writer.writerow(columns)
             for key, val in self.filing_data.items():
                 for i in val:
-                    writer.writerow([i['Filing Date'], i['Filing Type'], i["Price"], i["Next Price"], i["1d % Change"], i["Next Week Price"], i['1w % Change']])
+                    writer.writerow([i[c] for c in columns])
 
     '''-----------------------------------'''
     def read_from_csv(self):
@@ -231,20 +316,12 @@ class StockScraper:
         with open(self.file_path, 'r') as file:
             # Read the data into csv.reader object.
             reader = csv.reader(file)
-            # Skip the header.
-            next(reader)
+            # The header names the columns, so files written with other horizons can be read as well.
+            header = next(reader)
             for row in reader:
-                filing_date, filing_type, price, next_price, percent_change, next_week_price, week_percent_change = row
-
-                filing = {"Filing Date": filing_date,
-                          "Filing Type": filing_type,
-                          "Price": price,
-                          "Next Price": next_price,
-                          "1d % Change": percent_change,
-                          "Next Week Price": next_week_price,
-                          "1w % Change": week_percent_change}
+                filing = dict(zip(header, row))
                 
-                year, month, day = filing_date.split("-")
+                year, month, day = filing["Filing Date"].split("-")
 
                 try:
                     self.filing_data[year].append(filing)
@@ -252,6 +329,18 @@ class StockScraper:
                     self.filing_data[year] = [filing]
 
 
+    '''-----------------------------------'''
+    def has_records(self) -> bool:
+        # True if the CSV file exists and holds at least one filing.
+        try:
+            with open(self.file_path, 'r') as file:
+                reader = csv.reader(file)
+                next(reader)
+                next(reader)
+                return True
+        except (FileNotFoundError, StopIteration):
+            return False
+
     '''-----------------------------------'''
     def is_update_needed(self, month_diff: int = 6) -> bool:
         '''
@@ -297,8 +386,16 @@ class StockScraper:
         :param url: The website to visit.
         :return: None
         '''
-        self.browser = webdriver.Chrome(
-            executable_path=chrome_driver, chrome_options=chrome_options)
+        # Only one window is kept open per scraper.
+        self.close_browser()
+        if self.rate_limiter is not None:
+            self.rate_limiter.wait()
+        count("webdriver.browsers")
+        # Selenium 4 takes the options and the driver's path through options= and a Service.
+        if chrome_driver is None:
+            self.browser = webdriver.Chrome(options=chrome_options)
+        else:
+            self.browser = webdriver.Chrome(service=Service(chrome_driver), options=chrome_options)
         # Default browser route
         if url == None:
             self.browser.get(url=self.sec_quarterly_url)
@@ -306,6 +403,12 @@ class StockScraper:
         else:
             self.browser.get(url=url)
 
+    '''-----------------------------------'''
+    def close_browser(self) -> None:
+        if self.browser is not None:
+            self.browser.quit()
+            self.browser = None
+
     '''-----------------------------------'''
     def read_data(self, xpath: str):
         '''
@@ -313,38 +416,35 @@ class StockScraper:
         :return: None
         '''
 
+        count("webdriver.calls")
         data = self.browser.find_element("xpath", xpath).text
         return data
     
     '''----------------------------------- Python Utilities -----------------------------------'''
     '''--------------------------------------'''
-    def get_index(self, date: str, data) -> int:
-        index = 0
-        for d in data.iterrows():
-            df_date = str(d[0]).split(" ")[0]
+    def get_calendar(self, data: pd.DataFrame) -> TradingCalendar:
+        # A shared calendar is used as is. Otherwise one is built from the price data, once per price history.
+        if self.calendar is not None:
+            return self.calendar
+        if self.price_calendar is None or self.price_calendar[0] is not data:
+            self.price_calendar = (data, TradingCalendar.from_prices(data))
+        return self.price_calendar[1]
 
-            if date == df_date:
-                return index
-            index += 1
+    '''--------------------------------------'''
+    def get_index(self, date: str, data) -> int:
+        # The session of the calendar that holds the date, or None if it was not a trading day.
+        count("scraper.get_index")
+        calendar = self.get_calendar(data)
+        position = int(calendar.next_session([date])[0])
+        if calendar.date_at(position) == date:
+            return position
+        return None
 
     '''--------------------------------------'''
     # Sometimes companies will file their reports on a non-trading day. 
-    # So we will keep adding to the date until we find the next trading day
+    # So we find the next trading day after the date.
     def find_next_trading_day(self, filing_date, data):
-
-        running = True
-        index = 1
-        # Turn date into datetime object so we can add to it. 
-        date_obj = dt.datetime.strptime(filing_date, "%Y-%m-%d")
-        
-        while running:
-            new_date_obj = date_obj + dt.timedelta(days=index)
-
-            new_date_str = new_date_obj.strftime("%Y-%m-%d")
-            # Try to access the trading day. If it does not exist, continue on.
-            try:
-                data = data.loc[new_date_str]
-                return new_date_str
-            except KeyError:
-                pass
-            index += 1
+        calendar = self.get_calendar(data)
+        date_obj = dt.datetime.strptime(filing_date, "%Y-%m-%d") + dt.timedelta(days=1)
+        position = int(calendar.next_session([date_obj.strftime("%Y-%m-%d")])[0])
+        return calendar.date_at(position)
@@ -0,0 +1,225 @@
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from html.parser import HTMLParser
+
+from FilingStore.filingstore import FilingStore, FILING_TYPES, DATE_COLUMN, TYPE_COLUMN, write_store
+from Scraper.returns import DEFAULT_HORIZONS, compute_forward_returns, format_forward_returns, csv_columns
+from Instrumentation.instrumentation import stage, count
+
+# lxml is optional. Without it the pages are read with the slower parser of the standard library.
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+
+# The endings of saved browse-edgar pages.
+SNAPSHOT_EXTENSIONS = (".htm", ".html")
+# The filing date column of the browse-edgar table. Ex: "2023-05-05"
+FILING_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+# Bytes read from a page at a time by the fallback parser.
+READ_SIZE = 1 << 16
+
+
+
+'''----------------------------------- Files -----------------------------------'''
+'''-----------------------------------'''
+def snapshot_paths(snapshot_dir: str) -> list:
+    '''
+    :param snapshot_dir: A directory of saved browse-edgar pages. Subdirectories are searched too.
+    :return: The path of every page, in sorted order.
+    '''
+    paths = []
+    for root, dirs, files in os.walk(snapshot_dir):
+        paths += [os.path.join(root, name) for name in files if name.lower().endswith(SNAPSHOT_EXTENSIONS)]
+    return sorted(paths)
+
+'''-----------------------------------'''
+def snapshot_ticker(path: str) -> str:
+    # Pages are named <TICKER>.html or <TICKER>_<anything>.html. Ex: AAPL_10-Q.html, AAPL_10-K_page2.html
+    # The same normalization as StockScraper and EdgarFetcher, so the store keys match. Ex: BRK.B -> BRK-B
+    name = os.path.splitext(os.path.basename(path))[0]
+    return name.split("_")[0].upper().replace(".", "-")
+
+'''----------------------------------- Parsing -----------------------------------'''
+'''-----------------------------------'''
+def filing_row(cells: list, forms: tuple) -> dict:
+    '''
+    :param cells: The text of each cell of a table row.
+    :return: The row as {"Filing Type": ..., "Filing Date": ...}, or None when it is not a filing of one of the forms.
+    '''
+    # The filing table has the form type in the first cell and the filing date in the fourth, the same cells StockScraper reads.
+    # Header rows and the rows of the page's other tables do not match both.
+    if len(cells) < 4:
+        return None
+    form = cells[0].strip()
+    date = cells[3].strip()
+    if form not in forms or not FILING_DATE.match(date):
+        return None
+    return {TYPE_COLUMN: form, DATE_COLUMN: date}
+
+'''-----------------------------------'''
+def parse_snapshot(path: str, forms: tuple = tuple(FILING_TYPES)) -> list:
+    '''
+    :param path: A saved browse-edgar page.
+    :param forms: The form types to keep.
+    :return: The filing rows of the page, in page order. See filing_row.
+    '''
+    if etree is None:
+        return parse_snapshot_stdlib(path, forms)
+
+    rows = []
+    # One streaming pass. Each row is read when its closing tag is reached and then freed, so a page is never held in memory whole.
+    for event, element in etree.iterparse(path, events=("end",), tag="tr", html=True, recover=True):
+        row = filing_row(["".join(cell.itertext()) for cell in element if cell.tag in ("td", "th")], forms)
+        if row is not None:
+            rows.append(row)
+        element.clear()
+        # The emptied rows before it are removed as well, so the table does not keep growing.
+        while element.getprevious() is not None:
+            del element.getparent()[0]
+    return rows
+
+'''-----------------------------------'''
+def parse_snapshot_stdlib(path: str, forms: tuple = tuple(FILING_TYPES)) -> list:
+    # The same as parse_snapshot, with html.parser. The page is fed in blocks, so it is still read in one pass.
+    parser = RowParser(forms)
+    with open(path, 'r', encoding="utf-8", errors="replace") as file:
+        for block in iter(lambda: file.read(READ_SIZE), ""):
+            parser.feed(block)
+    parser.close()
+    return parser.rows
+
+
+
+class RowParser(HTMLParser):
+    '''
+    Collects the filing rows of a page as it is fed, for when lxml is not installed.
+    '''
+    def __init__(self, forms: tuple) -> None:
+        super().__init__()
+        self.forms = forms
+        self.rows = []
+        # The text of the cells of the current row, and of the current cell. None outside of them.
+        self.cells = None
+        self.cell = None
+
+    '''-----------------------------------'''
+    def handle_starttag(self, tag: str, attrs: list) -> None:
+        if tag == "tr":
+            self.end_row()
+            self.cells = []
+        elif tag in ("td", "th") and self.cells is not None:
+            self.end_cell()
+            self.cell = []
+
+    '''-----------------------------------'''
+    def handle_endtag(self, tag: str) -> None:
+        if tag in ("td", "th"):
+            self.end_cell()
+        elif tag in ("tr", "table"):
+            self.end_row()
+
+    '''-----------------------------------'''
+    def handle_data(self, data: str) -> None:
+        if self.cell is not None:
+            self.cell.append(data)
+
+    '''-----------------------------------'''
+    def end_cell(self) -> None:
+        if self.cell is not None:
+            self.cells.append("".join(self.cell))
+            self.cell = None
+
+    '''-----------------------------------'''
+    def end_row(self) -> None:
+        # Rows are also ended by the next row or the end of the table, since closing tags are optional in HTML.
+        if self.cells is None:
+            return
+        self.end_cell()
+        row = filing_row(self.cells, self.forms)
+        if row is not None:
+            self.rows.append(row)
+        self.cells = None
+
+'''----------------------------------- Pool -----------------------------------'''
+'''-----------------------------------'''
+def parse_job(job: tuple) -> tuple:
+    path, forms = job
+    return snapshot_ticker(path), parse_snapshot(path, forms)
+
+'''-----------------------------------'''
+def parse_snapshots(paths: list, workers: int = 4, forms: tuple = tuple(FILING_TYPES), chunks_per_worker: int = 8) -> dict:
+    '''
+    :param paths: Saved browse-edgar pages. A ticker can have several, Ex: its 10-Q and 10-K pages.
+    :param workers: The number of processes to parse with. 1 parses in this process.
+    :param forms: The form types to keep.
+    :param chunks_per_worker: How many batches of pages each worker gets on average. Pages are small, so they are sent in batches.
+    :return: Ticker -> filing rows, newest first, the same as EdgarFetcher.fetch. Rows found on more than one page are kept once.
+    '''
+    jobs = [(path, tuple(forms)) for path in paths]
+    with stage("snapshots.parse"):
+        if workers > 1 and len(jobs) > 1:
+            chunk_size = max(1, len(jobs) // (workers * chunks_per_worker))
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(parse_job, jobs, chunksize=chunk_size))
+        else:
+            results = [parse_job(job) for job in jobs]
+
+    index = {}
+    for ticker, rows in results:
+        index.setdefault(ticker, set()).update((row[TYPE_COLUMN], row[DATE_COLUMN]) for row in rows)
+    count("snapshots.pages", len(jobs))
+    count("snapshots.rows", sum(len(rows) for ticker, rows in results))
+
+    return {ticker: [{TYPE_COLUMN: form, DATE_COLUMN: date} for form, date in sorted(rows, key=lambda x: (x[1], x[0]), reverse=True)]
+            for ticker, rows in sorted(index.items())}
+
+'''----------------------------------- Store -----------------------------------'''
+'''-----------------------------------'''
+def filing_records(index: dict, price_cache=None, horizons: dict = None, year_cutoff: int = 2000) -> dict:
+    '''
+    :param index: Ticker -> filing rows. See parse_snapshots.
+    :param price_cache: Optional PriceCache. When given, the prices and % changes of each filing are filled in, the same way StockScraper
+                        does. Otherwise they are left as "N/A".
+    :param horizons: The horizons to calculate. Defaults to the ones of the CSV files.
+    :param year_cutoff: Filings made before this year are left out.
+    :return: Ticker -> list of filing dicts, in the layout of the CSV files.
+    '''
+    if horizons is None:
+        horizons = DEFAULT_HORIZONS
+
+    records = {ticker: [dict(row) for row in rows if int(row[DATE_COLUMN][:4]) >= year_cutoff] for ticker, rows in index.items()}
+    if price_cache is None:
+        return records
+
+    prices = price_cache.get_many(list(records))
+    with stage("snapshots.forward_returns"):
+        for ticker, filings in records.items():
+            price_data = prices.get(ticker)
+            if not filings or price_data is None or price_data.empty:
+                continue
+            results = compute_forward_returns(price_data, [f[DATE_COLUMN] for f in filings], horizons)
+            for i, filing in enumerate(filings):
+                filing.update(format_forward_returns(results, i, horizons))
+    return records
+
+'''-----------------------------------'''
+def import_snapshots(snapshot_dir: str, path: str, workers: int = 4, price_cache=None, horizons: dict = None,
+                     year_cutoff: int = 2000) -> FilingStore:
+    '''
+    Rebuilds a filing store from saved browse-edgar pages, without a browser.
+
+    :param snapshot_dir: A directory of saved browse-edgar pages. See snapshot_ticker for how they are named.
+    :param path: The directory to write the store to.
+    :param workers: The number of processes to parse the pages with.
+    :param price_cache: Optional PriceCache to calculate the % changes from. See filing_records.
+    :return: The written store, opened for reading.
+    '''
+    index = parse_snapshots(snapshot_paths(snapshot_dir), workers)
+    records = filing_records(index, price_cache, horizons, year_cutoff)
+    # The same value columns as a store imported from the CSV files.
+    value_columns = [c for c in csv_columns(horizons) if c not in (DATE_COLUMN, TYPE_COLUMN)]
+    with stage("snapshots.write_store"):
+        return write_store(path, records, value_columns)
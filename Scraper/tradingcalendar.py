@@ -0,0 +1,114 @@
+import numpy as np
+import pandas as pd
+
+
+
+class TradingCalendar:
+    '''
+    The trading sessions of a market, with an O(1) lookup from any calendar day to the next session.
+
+    Build it once, Ex: from a benchmark's price history, and share it between every ticker and every forward return horizon.
+    Positions returned by the calendar index into `sessions`. A position equal to len(sessions) means the session has not happened yet.
+    '''
+    def __init__(self, sessions) -> None:
+        '''
+        :param sessions: The trading days, in any order. Dates, strings or a DatetimeIndex.
+        '''
+        # Day numbers (days since 1970-01-01) of each session, ascending and unique.
+        self.days = np.unique(day_numbers(sessions))
+        self.sessions = self.days.astype("datetime64[D]")
+
+        if len(self.days):
+            self.first_day = int(self.days[0])
+            self.last_day = int(self.days[-1])
+            # Day offset from first_day -> position of the first session on or after that day. Built once with a single search.
+            self.next_position = np.searchsorted(self.days, np.arange(self.first_day, self.last_day + 1), side="left")
+        else:
+            self.first_day = 0
+            self.last_day = -1
+            self.next_position = np.empty(0, dtype=np.int64)
+
+    '''-----------------------------------'''
+    @classmethod
+    def from_prices(cls, price_data: pd.DataFrame):
+        '''
+        :param price_data: Price history indexed by date (the frame returned by yf.download).
+        :return: TradingCalendar object with one session per row.
+        '''
+        return cls(price_data.index)
+
+    '''-----------------------------------'''
+    def __len__(self) -> int:
+        return len(self.days)
+
+    '''----------------------------------- Lookups -----------------------------------'''
+    '''-----------------------------------'''
+    def next_session(self, dates) -> np.ndarray:
+        '''
+        :param dates: A batch of dates. "YYYY-MM-DD" strings or datetime64 values.
+        :return: The position of the first session on or after each date.
+        '''
+        days = np.asarray(dates, dtype="datetime64[D]").astype(np.int64)
+        positions = np.empty(days.shape, dtype=np.int64)
+
+        before = days < self.first_day
+        after = days > self.last_day
+        inside = ~(before | after)
+
+        positions[before] = 0
+        positions[after] = len(self.days)
+        positions[inside] = self.next_position[days[inside] - self.first_day]
+        return positions
+
+    '''-----------------------------------'''
+    def session_after(self, dates, k: int) -> np.ndarray:
+        '''
+        :param dates: A batch of dates.
+        :param k: Sessions to move forward from the first session on or after each date. 0 is that session itself.
+        :return: The positions. len(sessions) where the session has not happened yet.
+        '''
+        return np.minimum(self.next_session(dates) + k, len(self.days))
+
+    '''-----------------------------------'''
+    def date_at(self, position: int) -> str:
+        '''
+        :return: The session at the position as "YYYY-MM-DD". None if it has not happened yet.
+        '''
+        if position >= len(self.days):
+            return None
+        return str(self.sessions[position])
+
+    '''-----------------------------------'''
+    def align(self, price_data: pd.DataFrame, price_field: str = "Adj Close") -> np.ndarray:
+        '''
+        :param price_data: The price history of one ticker.
+        :param price_field: The price column to align.
+        :return: The ticker's prices at every session of the calendar. NaN for sessions the ticker has no bar for, Ex: before it listed.
+        '''
+        closes = price_data[price_field]
+        # Newer versions of yfinance return a column per ticker, even when only one ticker is downloaded.
+        if isinstance(closes, pd.DataFrame):
+            closes = closes.iloc[:, 0]
+
+        ticker_days = day_numbers(price_data.index)
+        aligned = np.full(len(self.days), np.nan)
+        if len(self.days) == 0:
+            return aligned
+
+        positions = np.searchsorted(self.days, ticker_days)
+        found = (positions < len(self.days)) & (self.days[np.minimum(positions, len(self.days) - 1)] == ticker_days)
+        # Rows are written in order, so a duplicated date keeps its last bar.
+        aligned[positions[found]] = closes.to_numpy(dtype=np.float64)[found]
+        return aligned
+
+
+
+'''----------------------------------- Utilities -----------------------------------'''
+'''-----------------------------------'''
+def day_numbers(dates) -> np.ndarray:
+    # Days since 1970-01-01 as int64.
+    index = pd.DatetimeIndex(dates)
+    # Yahoo sometimes returns timezone aware timestamps. Only the calendar day matters here.
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    return index.normalize().values.astype("datetime64[D]").astype(np.int64)
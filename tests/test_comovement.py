@@ -0,0 +1,54 @@
+import os
+
+import numpy as np
+import pytest
+
+from FilingStore.filingstore import import_csv_directory
+from EarningsPairs.earningspairs import EarningsPairs
+
+
+RECORDS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Filing_Records")
+
+
+
+@pytest.fixture(scope="module")
+def store(tmp_path_factory):
+    return import_csv_directory(RECORDS_DIR, str(tmp_path_factory.mktemp("store")))
+
+'''-----------------------------------'''
+@pytest.mark.parametrize("max_days, min_days", [(1, 0), (3, 1)])
+def test_comovement_matches_rank_pairs(store, max_days, min_days):
+    # Every pair of the matrix must have the counts compare_pairs prints for it.
+    results = EarningsPairs.from_store(store, max_days=max_days, min_days=min_days).comovement(correlation="pearson")
+    rows = {t: i for i, t in enumerate(results["tickers"])}
+
+    pairs = EarningsPairs.from_store(store, max_days=max_days, min_days=min_days)
+    pairs.generate_pairs()
+    ranked = pairs.rank_pairs()
+    assert ranked
+
+    for pair in ranked:
+        a, b = rows[pair.t1], rows[pair.t2]
+        for i, j in ((a, b), (b, a)):
+            assert results["total_pos"][i, j] == pair.total_pos
+            assert results["total_neg"][i, j] == pair.total_neg
+            assert results["total_markers"][i, j] == pair.total_markers
+            assert results["perc_pos"][i, j] == pair.perc_pos
+
+    # Pairs that never reported together have no markers.
+    assert results["total_markers"].sum() == 2 * sum(p.total_markers for p in ranked)
+
+'''-----------------------------------'''
+def test_comovement_pearson_matches_markers(store):
+    pairs = EarningsPairs.from_store(store, max_days=3)
+    results = pairs.comovement(correlation="pearson")
+    rows = {t: i for i, t in enumerate(results["tickers"])}
+
+    pairs.generate_pairs()
+    for pair in pairs.rank_pairs()[:200]:
+        x = pair.h1.values[pair.column][pair.matches[:, 0]]
+        y = pair.h2.values[pair.column][pair.matches[:, 1]]
+        valid = ~(np.isnan(x) | np.isnan(y))
+        if valid.sum() < 3 or np.std(x[valid]) == 0 or np.std(y[valid]) == 0:
+            continue
+        assert results["pearson"][rows[pair.t1], rows[pair.t2]] == pytest.approx(np.corrcoef(x[valid], y[valid])[0, 1])
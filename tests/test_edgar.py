@@ -0,0 +1,185 @@
+import asyncio
+import json
+import os
+import threading
+import time
+
+import pytest
+from aiohttp import web
+
+from Scraper.edgar import EdgarFetcher, RateLimiter
+
+
+CIKS = {"AAPL": 320193, "MSFT": 789019, "BRK-B": 1067983}
+
+
+
+class StubEdgar:
+    '''
+    A local stand-in for the SEC ticker map and submissions API, run on its own event loop in a background thread,
+    since EdgarFetcher.fetch starts its own loop.
+    '''
+    def __init__(self) -> None:
+        # Path -> statuses to answer with before the real response. Ex: {"/submissions/CIK0000320193.json": [429, 500]}
+        self.failures = {}
+        # (path, monotonic time) of every request, in the order they arrived.
+        self.requests = []
+        self.loop = asyncio.new_event_loop()
+        self.started = threading.Event()
+        self.thread = threading.Thread(target=self.serve, daemon=True)
+
+    '''-----------------------------------'''
+    def serve(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        app = web.Application()
+        app.router.add_get("/{path:.*}", self.handle)
+        self.runner = web.AppRunner(app)
+        self.loop.run_until_complete(self.runner.setup())
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        self.loop.run_until_complete(site.start())
+        self.port = site._server.sockets[0].getsockname()[1]
+        self.started.set()
+        self.loop.run_forever()
+
+    '''-----------------------------------'''
+    async def handle(self, request: web.Request) -> web.Response:
+        path = request.path
+        self.requests.append((path, time.monotonic()))
+        failures = self.failures.get(path)
+        if failures:
+            return web.Response(status=failures.pop(0))
+
+        if path == "/tickers.json":
+            return web.json_response({str(i): {"cik_str": cik, "ticker": t, "title": t} for i, (t, cik) in enumerate(CIKS.items())})
+        if path == "/submissions/CIK0000320193.json":
+            return web.json_response({"filings": {"recent": {"form": ["10-Q", "8-K", "10-K"], "filingDate": ["2023-05-05", "2023-04-01", "2022-10-28"]},
+                                                  "files": [{"name": "CIK0000320193-submissions-001.json"}]}})
+        if path == "/submissions/CIK0000320193-submissions-001.json":
+            return web.json_response({"form": ["10-Q"], "filingDate": ["2001-02-12"]})
+        for ticker, cik in CIKS.items():
+            if path == f"/submissions/CIK{cik:010d}.json":
+                return web.json_response({"filings": {"recent": {"form": ["10-Q"], "filingDate": ["2023-04-25"]}}})
+        return web.Response(status=404)
+
+    '''-----------------------------------'''
+    def url(self, path: str) -> str:
+        return f"http://127.0.0.1:{self.port}{path}"
+
+    '''-----------------------------------'''
+    def paths(self) -> list:
+        return [path for path, when in self.requests]
+
+    '''-----------------------------------'''
+    def start(self) -> None:
+        self.thread.start()
+        self.started.wait(10)
+
+    '''-----------------------------------'''
+    def stop(self) -> None:
+        asyncio.run_coroutine_threadsafe(self.runner.cleanup(), self.loop).result(10)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(10)
+
+
+
+@pytest.fixture
+def server():
+    stub = StubEdgar()
+    stub.start()
+    yield stub
+    stub.stop()
+
+'''-----------------------------------'''
+def make_fetcher(server: StubEdgar, **kwargs) -> EdgarFetcher:
+    kwargs.setdefault("backoff", 0.01)
+    return EdgarFetcher("Tests tests@example.com", tickers_url=server.url("/tickers.json"), submissions_url=server.url("/submissions"), **kwargs)
+
+'''-----------------------------------'''
+def test_fetch_reads_forms_and_extra_pages(server):
+    results = make_fetcher(server).fetch(["AAPL", "BRK.B"])
+
+    assert list(results) == ["AAPL", "BRK-B"]
+    assert results["AAPL"] == [{"Filing Type": "10-Q", "Filing Date": "2023-05-05"},
+                               {"Filing Type": "10-K", "Filing Date": "2022-10-28"},
+                               {"Filing Type": "10-Q", "Filing Date": "2001-02-12"}]
+    assert results["BRK-B"] == [{"Filing Type": "10-Q", "Filing Date": "2023-04-25"}]
+
+'''-----------------------------------'''
+def test_rate_limiter_spaces_requests(server):
+    rate = 20
+    make_fetcher(server, rate_limiter=RateLimiter(rate), concurrency=8).fetch(list(CIKS))
+
+    times = sorted(when for path, when in server.requests)
+    assert len(times) == 5
+    # The limiter lets the first request through at once and starts each later one a full interval after the one before.
+    # A little slack is left for the server's clock being read after the request arrived.
+    assert times[-1] - times[0] >= (len(times) - 1) / rate - 0.02
+
+'''-----------------------------------'''
+def test_transient_errors_are_retried(server):
+    server.failures["/submissions/CIK0000789019.json"] = [429, 500]
+    fetcher = make_fetcher(server, retries=3, backoff=0.05)
+    start = time.monotonic()
+    results = fetcher.fetch(["MSFT"])
+
+    assert results["MSFT"] == [{"Filing Type": "10-Q", "Filing Date": "2023-04-25"}]
+    assert fetcher.errors == {}
+    assert server.paths().count("/submissions/CIK0000789019.json") == 3
+    # Two retries, waiting 0.05 and then 0.1 seconds.
+    assert time.monotonic() - start >= 0.15
+
+'''-----------------------------------'''
+def test_retries_give_up_and_record_the_error(server):
+    server.failures["/submissions/CIK0000789019.json"] = [503] * 3
+    fetcher = make_fetcher(server, retries=2)
+    results = fetcher.fetch(["MSFT", "BRK-B"])
+
+    assert list(results) == ["BRK-B"]
+    assert "503" in fetcher.errors["MSFT"]
+    assert server.paths().count("/submissions/CIK0000789019.json") == 3
+
+'''-----------------------------------'''
+def test_checkpoint_resumes_without_refetching(server, tmp_path):
+    checkpoint = str(tmp_path / "edgar.jsonl")
+    server.failures["/submissions/CIK0000789019.json"] = [404]
+    first = make_fetcher(server, checkpoint_path=checkpoint, retries=0).fetch(["AAPL", "MSFT"])
+    assert list(first) == ["AAPL"]
+
+    # A run killed while writing leaves a cut off last line, which is skipped.
+    with open(checkpoint, 'a') as file:
+        file.write('{"ticker": "BRK-B", "fil')
+
+    server.requests.clear()
+    second = make_fetcher(server, checkpoint_path=checkpoint).fetch(["AAPL", "MSFT"])
+    assert second["AAPL"] == first["AAPL"]
+    assert list(second) == ["AAPL", "MSFT"]
+    # Only the ticker that failed is requested again.
+    assert server.paths() == ["/tickers.json", "/submissions/CIK0000789019.json"]
+
+'''-----------------------------------'''
+def test_partial_checkpoint_ends_cut_off_line(server, tmp_path):
+    checkpoint = str(tmp_path / "edgar.jsonl")
+    server.failures["/submissions/CIK0000789019.json"] = [404, 404]
+    make_fetcher(server, checkpoint_path=checkpoint, retries=0).fetch(["AAPL", "MSFT"])
+    with open(checkpoint, 'a') as file:
+        file.write('{"ticker": "BRK-B", "fil')
+
+    # MSFT still fails, so the checkpoint is kept. The BRK-B entry saved after the cut off line must be readable.
+    make_fetcher(server, checkpoint_path=checkpoint, retries=0).fetch(["BRK-B", "MSFT"])
+    with open(checkpoint, 'r') as file:
+        tickers = [json.loads(line)["ticker"] for line in file if line.endswith("}\n")]
+    assert tickers == ["AAPL", "BRK-B"]
+
+'''-----------------------------------'''
+def test_completed_run_fetches_again(server, tmp_path):
+    checkpoint = str(tmp_path / "edgar.jsonl")
+    first = make_fetcher(server, checkpoint_path=checkpoint).fetch(["AAPL", "MSFT"])
+    assert list(first) == ["AAPL", "MSFT"]
+    # Every ticker finished, so nothing is left to resume.
+    assert not os.path.exists(checkpoint)
+
+    server.requests.clear()
+    second = make_fetcher(server, checkpoint_path=checkpoint).fetch(["AAPL", "MSFT"])
+    assert second == first
+    assert sorted(server.paths()) == ["/submissions/CIK0000320193-submissions-001.json", "/submissions/CIK0000320193.json",
+                                      "/submissions/CIK0000789019.json", "/tickers.json"]